@@ -10,4 +10,8 @@ cd /workspace && \
 export PIPENV_VENV_IN_PROJECT=1 && \
 pipenv uninstall querybuilder && \
 pipenv install --ignore-pipfile --dev && \
-pipenv install -e git+https://${_GIT_AUTH_TOKEN}@github.com/advance-tools/django-querybuilder.git#egg=querybuilder
\ No newline at end of file
+pipenv install -e git+https://${_GIT_AUTH_TOKEN}@github.com/advance-tools/django-querybuilder.git#egg=querybuilder && \
+
+# the schema is generated once here and copied into the image, the secret is fetched outside of the build context.
+cd /workspace/serverlessWorkflow && \
+ENV_FILE=/tmp/build.env SECRET_NAME=${_SECRET_NAME} pipenv run python manage.py build_schema
@@ -27,4 +27,8 @@ pipenv run python manage.py migrate --database=default && \
 echo "Test REVERSE MIGRATION" && \
 pipenv run python manage.py migrate task_services $(cat last_migration.txt) && \
 echo "Re Migrate" && \
-pipenv run python manage.py migrate --database=default
\ No newline at end of file
+pipenv run python manage.py migrate --database=default && \
+echo "Tests" && \
+pipenv run python manage.py test task_services --no-input && \
+echo "Startup imports" && \
+pipenv run python manage.py profile_startup --runs 1 --check
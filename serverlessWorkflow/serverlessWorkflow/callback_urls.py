@@ -0,0 +1,12 @@
+from django.urls import path, include
+
+from task_services.urls import callback_urlpatterns
+from task_services.views.payload import PayloadAPIView
+
+
+# the URLconf of the task callbacks, it holds every name reversed while serving one of them.
+urlpatterns = [
+    path('api/', include(callback_urlpatterns)),
+    # signed urls of offloaded payloads.
+    path('api/payloads/<str:name>', PayloadAPIView.as_view(), name="payload"),
+]
@@ -16,4 +16,8 @@ class EmailValidationError(APIException):
 class EmailPasswordValidationError(APIException):
     status_code = status.HTTP_400_BAD_REQUEST
     default_detail = 'Invalid Email or Password (Err Code: 4070)'
-    default_code = 'service_unavailable'
\ No newline at end of file
+    default_code = 'service_unavailable'
+
+
+class PayloadTooLarge(ValueError):
+    pass
@@ -0,0 +1,37 @@
+import threading
+from typing import Dict
+
+
+class Counters:
+    """
+    Thread-safe, process-local counters. Every instance of the service keeps its own values.
+    """
+
+    def __init__(self):
+
+        self._values: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: int = 1):
+
+        with self._lock:
+
+            self._values[name] = self._values.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+
+        # count / sum / max summary, enough to compare averages and worst cases.
+        with self._lock:
+
+            self._values[f"{name}_count"]   = self._values.get(f"{name}_count", 0) + 1
+            self._values[f"{name}_sum"]     = self._values.get(f"{name}_sum", 0) + int(value)
+            self._values[f"{name}_max"]     = max(self._values.get(f"{name}_max", 0), int(value))
+
+    def snapshot(self) -> Dict[str, int]:
+
+        with self._lock:
+
+            return dict(self._values)
+
+
+counters = Counters()
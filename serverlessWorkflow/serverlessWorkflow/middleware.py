@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+
+# the paths of `callback_urls`, only Cloud Tasks and the workers call them, with JSON.
+CALLBACK_PREFIXES = (
+    "/api/tasks/init/",
+    "/api/tasks/complete/",
+    "/api/tasks/check/",
+)
+
+
+class CallbackURLconfMiddleware(MiddlewareMixin):
+    """
+    Resolves the task callbacks with `TASK_CALLBACK_URLCONF`, which only has their routes, instead
+    of `ROOT_URLCONF`. First in `MIDDLEWARE` when `TASK_CALLBACK_FAST_PATH` is set.
+    """
+
+    def process_request(self, request):
+
+        if request.path_info.startswith(CALLBACK_PREFIXES):
+
+            # Django resolves the request, and reverses while serving it, with this URLconf.
+            request.urlconf = settings.TASK_CALLBACK_URLCONF
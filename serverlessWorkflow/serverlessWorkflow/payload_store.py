@@ -0,0 +1,362 @@
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+
+from serverlessWorkflow.metrics import counters
+
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple, Union
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+
+CHUNK_SIZE = 64 * 1024
+
+NAME_RE = re.compile(r"^([0-9a-f]{64})\.([a-z]+)$")
+
+SIGNING_SALT = "serverlessWorkflow.payload"
+
+# file extension of every encoding, it is part of the stored name.
+EXTENSIONS: Dict[str, str] = {
+    "gzip": "gz",
+    "zstd": "zst",
+    "identity": "bin",
+}
+
+
+class LocalPayloadStore:
+    """
+    Stores payloads as files under `root`, the local stand-in for an object store.
+    """
+
+    def __init__(self, root: str):
+
+        self.root = root
+
+    def path(self, name: str) -> str:
+
+        # two levels of fan out, no directory holds every payload.
+        return os.path.join(self.root, name[:2], name)
+
+    def exists(self, name: str) -> bool:
+
+        return os.path.isfile(self.path(name))
+
+    def touch(self, name: str) -> bool:
+
+        try:
+
+            os.utime(self.path(name))
+
+        except FileNotFoundError:
+
+            return False
+
+        return True
+
+    def purge(self, before: float) -> int:
+
+        removed = 0
+
+        for directory, _, files in os.walk(self.root):
+
+            for file in files:
+
+                path = os.path.join(directory, file)
+
+                try:
+
+                    if os.path.getmtime(path) < before:
+
+                        os.unlink(path)
+
+                        removed += 1
+
+                except FileNotFoundError:
+
+                    pass
+
+        return removed
+
+    def write(self, name: str, data: bytes):
+
+        path = self.path(name)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write to a temporary file first, a reader never sees a partial payload.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+
+        try:
+
+            with os.fdopen(fd, "wb") as f:
+
+                f.write(data)
+
+            os.replace(tmp, path)
+
+        except BaseException:
+
+            os.unlink(tmp)
+
+            raise
+
+    def open(self, name: str) -> BinaryIO:
+
+        return open(self.path(name), "rb")
+
+
+class GCSPayloadStore:
+    """
+    Stores payloads as objects of a Cloud Storage bucket, needs `google-cloud-storage`.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "payloads/"):
+
+        try:
+
+            from google.cloud import storage
+
+        except ImportError as exc:
+
+            raise ImproperlyConfigured("PAYLOAD_STORE_BACKEND=gcs requires the google-cloud-storage package.") from exc
+
+        self.bucket = storage.Client().bucket(bucket)
+        self.prefix = prefix
+
+    def exists(self, name: str) -> bool:
+
+        return self.bucket.blob(self.prefix + name).exists()
+
+    def touch(self, name: str) -> bool:
+
+        from google.api_core.exceptions import NotFound
+
+        blob            = self.bucket.blob(self.prefix + name)
+        blob.metadata   = {"touched_at": str(int(time.time()))}
+
+        try:
+
+            # a metadata write moves `updated`, which `purge` reads.
+            blob.patch()
+
+        except NotFound:
+
+            return False
+
+        return True
+
+    def purge(self, before: float) -> int:
+
+        removed = 0
+
+        for blob in self.bucket.client.list_blobs(self.bucket, prefix=self.prefix):
+
+            if blob.updated.timestamp() < before:
+
+                blob.delete()
+
+                removed += 1
+
+        return removed
+
+    def write(self, name: str, data: bytes):
+
+        self.bucket.blob(self.prefix + name).upload_from_string(data, content_type="application/octet-stream")
+
+    def open(self, name: str) -> BinaryIO:
+
+        return self.bucket.blob(self.prefix + name).open("rb")
+
+
+_store: Optional[Union[LocalPayloadStore, GCSPayloadStore]] = None
+_store_lock = threading.Lock()
+
+
+def get_payload_store() -> Union[LocalPayloadStore, GCSPayloadStore]:
+
+    global _store
+
+    if _store is None:
+
+        with _store_lock:
+
+            if _store is None:
+
+                if settings.PAYLOAD_STORE_BACKEND == "gcs":
+
+                    _store = GCSPayloadStore(settings.PAYLOAD_STORE_BUCKET)
+
+                else:
+
+                    _store = LocalPayloadStore(settings.PAYLOAD_STORE_ROOT)
+
+    return _store
+
+
+def _reset_after_fork():
+
+    global _store, _store_lock
+
+    # storage clients hold connections of the parent process.
+    _store      = None
+    _store_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+
+    if encoding == "gzip":
+
+        # mtime=0, identical payloads give identical bytes.
+        return gzip.compress(data, mtime=0)
+
+    if encoding == "zstd":
+
+        try:
+
+            import zstandard
+
+        except ImportError as exc:
+
+            raise ImproperlyConfigured("PAYLOAD_COMPRESSION=zstd requires the zstandard package.") from exc
+
+        return zstandard.ZstdCompressor().compress(data)
+
+    return data
+
+
+def decompressed_stream(f: BinaryIO, encoding: str) -> BinaryIO:
+
+    if encoding == "gzip":
+
+        return gzip.GzipFile(fileobj=f, mode="rb")
+
+    if encoding == "zstd":
+
+        import zstandard
+
+        return zstandard.ZstdDecompressor().stream_reader(f)
+
+    return f
+
+
+def split_name(name: str) -> Tuple[str, str]:
+    """
+    Returns the content hash and the encoding of a stored payload name, `<sha256>.<extension>`.
+    """
+
+    match = NAME_RE.match(name)
+
+    if match is not None:
+
+        for encoding, ext in EXTENSIONS.items():
+
+            if ext == match.group(2):
+
+                return match.group(1), encoding
+
+    raise ValueError(f"Invalid payload name {name!r}.")
+
+
+def payload_url(name: str) -> str:
+    """
+    URL of a stored payload, signed so that only the receivers of the envelope can read it, for
+    `PAYLOAD_TTL` seconds.
+    """
+
+    token = signing.TimestampSigner(salt=SIGNING_SALT).sign(name)
+
+    return settings.CURRENT_HOST + reverse("payload", kwargs={"name": name}) + "?signature=" + token[len(name) + 1:]
+
+
+def check_signature(name: str, signature: str):
+    """
+    Raises `signing.BadSignature` unless `signature` has been made by `payload_url` for `name`
+    less than `PAYLOAD_TTL` seconds ago.
+    """
+
+    signing.TimestampSigner(salt=SIGNING_SALT).unsign(f"{name}:{signature}", max_age=settings.PAYLOAD_TTL)
+
+
+def purge_payloads() -> int:
+    """
+    Removes the payloads which have not been offloaded again for `PAYLOAD_TTL` seconds, their
+    signed URLs have expired. Returns the number of removed payloads.
+    """
+
+    return get_payload_store().purge(time.time() - settings.PAYLOAD_TTL)
+
+
+def offload_payload(body: Optional[bytes]) -> Optional[bytes]:
+    """
+    Returns `body` unchanged when it is smaller than `PAYLOAD_OFFLOAD_THRESHOLD`, otherwise stores
+    it compressed under its sha256 and returns a small JSON reference envelope instead. Identical
+    payloads share one stored copy, which is kept for `PAYLOAD_TTL` seconds after the last offload.
+    """
+
+    threshold: int = settings.PAYLOAD_OFFLOAD_THRESHOLD
+
+    if body is None or threshold <= 0 or len(body) < threshold:
+
+        return body
+
+    encoding: str   = settings.PAYLOAD_COMPRESSION
+    key             = hashlib.sha256(body).hexdigest()
+    name            = f"{key}.{EXTENSIONS[encoding]}"
+
+    store = get_payload_store()
+
+    # a stored copy is touched, the purge keeps it as long as the newest envelope is valid.
+    if store.touch(name):
+
+        counters.incr("payloads_deduplicated")
+
+    else:
+
+        store.write(name, compress(body, encoding))
+
+        counters.incr("payloads_offloaded")
+
+    counters.observe("payload_offload_bytes", len(body))
+
+    return json.dumps({
+        "payload_ref": {
+            "key": key,
+            "size": len(body),
+            "encoding": encoding,
+            "url": payload_url(name),
+        }
+    }).encode()
+
+
+def iter_payload(name: str) -> Iterator[bytes]:
+    """
+    Yields the original bytes of a stored payload in chunks of `CHUNK_SIZE`.
+    """
+
+    _, encoding = split_name(name)
+
+    with get_payload_store().open(name) as f:
+
+        stream = decompressed_stream(f, encoding)
+
+        while True:
+
+            chunk = stream.read(CHUNK_SIZE)
+
+            if not chunk:
+
+                break
+
+            yield chunk
@@ -0,0 +1,207 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+from typing import Dict, NamedTuple, Optional, Tuple
+import functools
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+# the formats served by `api/schema/`, by renderer format.
+RENDERERS = {
+    "yaml": OpenApiYamlRenderer,
+    "json": OpenApiJsonRenderer,
+}
+
+MANIFEST = "manifest.json"
+
+
+class BuiltSchema(NamedTuple):
+    etag: str
+    body: bytes
+    gzipped: bytes
+
+
+@functools.lru_cache(maxsize=None)
+def schema_version() -> str:
+
+    # a new version is a new deploy, the process reads it once.
+    return str(settings.SPECTACULAR_SETTINGS["VERSION"]).strip()
+
+
+def build_schema(body: bytes) -> BuiltSchema:
+
+    # no timestamp in the gzip header, the same schema always compresses to the same bytes.
+    return BuiltSchema(f'"{hashlib.sha256(body).hexdigest()[:32]}"', body, gzip.compress(body, compresslevel=9, mtime=0))
+
+
+def render_schema() -> Dict[str, BuiltSchema]:
+    """
+    Generates the public schema once and renders it in every served format.
+    """
+
+    generator   = spectacular_settings.DEFAULT_GENERATOR_CLASS(urlconf=spectacular_settings.SERVE_URLCONF)
+    schema      = generator.get_schema(request=None, public=spectacular_settings.SERVE_PUBLIC)
+
+    return {name: build_schema(renderer().render(schema, renderer.media_type)) for name, renderer in RENDERERS.items()}
+
+
+def write_schema(root: str, built: Dict[str, BuiltSchema]) -> Dict[str, str]:
+    """
+    Writes every format, plain and gzipped, and the manifest naming the version they have been
+    built for. Returns the manifest.
+    """
+
+    os.makedirs(root, exist_ok=True)
+
+    manifest = {"version": schema_version(), "etags": {name: schema.etag for name, schema in built.items()}}
+
+    files = {MANIFEST: json.dumps(manifest, indent=4).encode()}
+
+    for name, schema in built.items():
+
+        files[f"schema.{name}"]     = schema.body
+        files[f"schema.{name}.gz"]  = schema.gzipped
+
+    # the manifest is written last, a reader never pairs it with the files of another build.
+    for filename in sorted(files, key=lambda filename: filename == MANIFEST):
+
+        fd, tmp = tempfile.mkstemp(dir=root)
+
+        with os.fdopen(fd, "wb") as f:
+
+            f.write(files[filename])
+
+        os.replace(tmp, os.path.join(root, filename))
+
+    return manifest
+
+
+def read_schema(root: str) -> Optional[Dict[str, BuiltSchema]]:
+    """
+    Reads the schema written by `manage.py build_schema`, or None when there is none or it has
+    been built for another version.
+    """
+
+    try:
+
+        with open(os.path.join(root, MANIFEST)) as f:
+
+            manifest = json.load(f)
+
+        if manifest.get("version") != schema_version():
+
+            return None
+
+        built = {}
+
+        for name, etag in manifest["etags"].items():
+
+            with open(os.path.join(root, f"schema.{name}"), "rb") as f:
+
+                body = f.read()
+
+            with open(os.path.join(root, f"schema.{name}.gz"), "rb") as f:
+
+                gzipped = f.read()
+
+            built[name] = BuiltSchema(etag, body, gzipped)
+
+        return built
+
+    except (OSError, ValueError, KeyError):
+
+        return None
+
+
+class SchemaCache:
+    """
+    The schema of the running version, read from `SCHEMA_ROOT` when it has been built for it and
+    generated on the first request otherwise. Process-local, like the metrics counters.
+    """
+
+    def __init__(self):
+
+        self._built: Dict[Tuple[str, str], BuiltSchema] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> BuiltSchema:
+
+        key = (schema_version(), name)
+
+        if key not in self._built:
+
+            with self._lock:
+
+                if key not in self._built:
+
+                    built = read_schema(settings.SCHEMA_ROOT) or render_schema()
+
+                    self._built.update({(key[0], built_name): schema for built_name, schema in built.items()})
+
+        return self._built[key]
+
+    def clear(self):
+
+        with self._lock:
+
+            self._built.clear()
+
+
+schema_cache = SchemaCache()
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """
+    Serves the prebuilt schema with an ETag, gzipped when the client accepts it, instead of
+    generating it on every request.
+    """
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+
+        # a schema for another language or version is still generated on demand.
+        if request.GET.get("lang") or request.GET.get("version") or request.version or self.custom_settings or request.accepted_renderer.format not in RENDERERS:
+
+            return super().get(request, *args, **kwargs)
+
+        schema  = schema_cache.get(request.accepted_renderer.format)
+        gzipped = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+        etag    = f'{schema.etag[:-1]}-gzip"' if gzipped else schema.etag
+
+        if etag in [tag.strip() for tag in request.META.get("HTTP_IF_NONE_MATCH", "").split(",")]:
+
+            response = HttpResponseNotModified()
+
+        else:
+
+            content_type = request.accepted_media_type
+
+            if request.accepted_renderer.charset:
+
+                content_type = f"{content_type}; charset={request.accepted_renderer.charset}"
+
+            response = HttpResponse(schema.gzipped if gzipped else schema.body, content_type=content_type)
+
+            response["Content-Disposition"] = f'inline; filename="{self._get_filename(request, None)}"'
+
+            if gzipped:
+
+                response["Content-Encoding"] = "gzip"
+
+        response["ETag"]            = etag
+        response["Cache-Control"]   = "public, no-cache"
+
+        patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+
+        return response
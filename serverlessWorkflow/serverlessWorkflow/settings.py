@@ -12,15 +12,18 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 import os
 import environ
 
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.functional import lazy
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
-env_file = os.path.join(BASE_DIR, ".env")
+# a local copy of the secret, e.g. the secret mounted as a file by Cloud Run, is read without calling Secret Manager.
+env_file = os.environ.get('ENV_FILE', os.path.join(BASE_DIR, ".env"))
 
 os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = os.path.join(os.path.dirname(BASE_DIR), 'credentials.json')
 
-if not os.path.isfile('.env'):
+if not os.path.isfile(env_file):
 
     # Import the Secret Manager client library.
     from google.cloud import secretmanager
@@ -47,10 +50,14 @@ if not os.path.isfile('.env'):
     # decode secret
     payload = response.payload.data.decode("UTF-8")
 
-    # write payload
-    with open(env_file, "w") as f:
+    # write payload, renamed into place so a worker starting at the same time never reads half of it.
+    tmp_file = f"{env_file}.{os.getpid()}.tmp"
+
+    with open(tmp_file, "w") as f:
         f.write(payload)
 
+    os.replace(tmp_file, env_file)
+
 env = environ.Env()
 env.read_env(env_file)
 
@@ -139,7 +146,7 @@ MANAGERS = (
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'task_services.pagination.KeysetPagination',
     'DEFAULT_FILTER_BACKENDS': ['rest_framework.filters.OrderingFilter'],
-    'DEFAULT_AUTHENTICATION_CLASSES':('rest_framework.authentication.TokenAuthentication',),
+    'DEFAULT_AUTHENTICATION_CLASSES':('task_services.authentication.CachedTokenAuthentication',),
     'PAGE_SIZE': 10,
     'DEFAULT_RENDERER_CLASSES': (
         'rest_framework.renderers.JSONRenderer',
@@ -148,18 +155,25 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# authenticated tokens kept per process, and for how many seconds another instance may still accept a revoked one.
+TOKEN_CACHE_SIZE    = env('TOKEN_CACHE_SIZE', cast=int, default=10000)
+TOKEN_CACHE_TTL     = env('TOKEN_CACHE_TTL', cast=int, default=60)
+# alias of a Django cache shared by every instance, e.g. a Redis configured in CACHES, unset keeps the tokens per process.
+TOKEN_CACHE_BACKEND = env('TOKEN_CACHE_BACKEND', default=None)
+
 #################################################################################
 # Documentation
 #################################################################################
-read_me = ""
+def read_file(path: str) -> str:
 
-with open("../README.md", encoding='utf-8') as f:
-    read_me = f.read()
+    with open(path, encoding='utf-8') as f:
 
-version = ""
+        return f.read()
 
-with open("../version", encoding='utf-8') as f:
-    version = f.read()
+# read when the schema is generated, a cold start does not pay for them.
+read_me = lazy(read_file, str)("../README.md")
+
+version = lazy(read_file, str)("../version")
 
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Advancedware Books-ServerlessWorkFlow API',
@@ -171,10 +185,15 @@ SPECTACULAR_SETTINGS = {
         {"name": "Profile"},
         {"name": "Choices"},
         {"name": "Task"},
+        {"name": "Metrics"},
+        {"name": "Payload"},
     ],
     # OTHER SETTINGS
 }
 
+# output of `manage.py build_schema`, served by `api/schema/` when it has been built for the running version.
+SCHEMA_ROOT = env('SCHEMA_ROOT', default=os.path.join(BASE_DIR, 'schema'))
+
 #################################################################################
 # Databases
 #################################################################################
@@ -190,6 +209,71 @@ DATABASES = {
 ###########################################
 CURRENT_HOST   = os.environ.get('CURRENT_HOST', env('CURRENT_HOST'))
 
+# "cloud_tasks" calls Cloud Tasks directly, "outbox" writes OutboxTask rows drained by `manage.py dispatch_outbox`.
+TASK_DISPATCHER_BACKEND     = env('TASK_DISPATCHER_BACKEND', default='cloud_tasks')
+
+CLOUD_TASKS_PROJECT         = env('CLOUD_TASKS_PROJECT', default='advancedware')
+CLOUD_TASKS_REGION          = env('CLOUD_TASKS_REGION', default='europe-west1')
+CLOUD_TASKS_QUEUE           = env('CLOUD_TASKS_QUEUE', default='serverless-workflow-q')
+CLOUD_TASKS_SERVICE_ACCOUNT = env('CLOUD_TASKS_SERVICE_ACCOUNT', default='books-356@advancedware.iam.gserviceaccount.com')
+# host:port of a local Cloud Tasks emulator / fake gRPC server, talked to over an insecure channel.
+CLOUD_TASKS_EMULATOR_HOST   = env('CLOUD_TASKS_EMULATOR_HOST', default=None)
+# max number of immediate_next / sub_task_next entries enqueued in parallel, 1 dispatches them one by one.
+CLOUD_TASKS_DISPATCH_CONCURRENCY = env('CLOUD_TASKS_DISPATCH_CONCURRENCY', cast=int, default=16)
+
+# seconds between a completion and the check of its parent.
+TASK_CHECK_DELAY            = env('TASK_CHECK_DELAY', cast=int, default=5)
+# checks of the same task scheduled within this many seconds are coalesced into one, 0 disables it.
+TASK_CHECK_COALESCE_WINDOW  = env('TASK_CHECK_COALESCE_WINDOW', cast=int, default=5)
+# "async" enqueues one check per level, "inline" checks the ancestors in the completing request's transaction.
+TASK_CHECK_PROPAGATION      = env('TASK_CHECK_PROPAGATION', default='async')
+# SUB_TASK_RESPONSE payloads: only the `data` of each child's response, and the largest array built, bodies above the offload threshold are sent by reference.
+SUB_TASK_RESPONSE_DATA_ONLY = env('SUB_TASK_RESPONSE_DATA_ONLY', cast=bool, default=False)
+SUB_TASK_RESPONSE_MAX_BYTES = env('SUB_TASK_RESPONSE_MAX_BYTES', cast=int, default=64000000)
+
+# attempts of a compare-and-swap write of a Task, re-reading the row after every conflict.
+TASK_CAS_RETRIES            = env('TASK_CAS_RETRIES', cast=int, default=10)
+# children registered by one `tasks/bulk-init` request, and rows per INSERT.
+TASK_BULK_INIT_MAX_ITEMS    = env('TASK_BULK_INIT_MAX_ITEMS', cast=int, default=10000)
+TASK_BULK_INIT_BATCH_SIZE   = env('TASK_BULK_INIT_BATCH_SIZE', cast=int, default=1000)
+# tasks completed by one `tasks/bulk-complete` request, and rows per UPDATE.
+TASK_BULK_COMPLETE_MAX_ITEMS    = env('TASK_BULK_COMPLETE_MAX_ITEMS', cast=int, default=10000)
+TASK_BULK_COMPLETE_BATCH_SIZE   = env('TASK_BULK_COMPLETE_BATCH_SIZE', cast=int, default=1000)
+
+# rows read from the server-side cursor of a `tasks/export` at a time.
+TASK_EXPORT_CHUNK_SIZE          = env('TASK_EXPORT_CHUNK_SIZE', cast=int, default=2000)
+
+# complete and check served by the async views of views/task_async.py, for a deployment under ASGI.
+TASK_ASYNC_VIEWS                = env('TASK_ASYNC_VIEWS', cast=bool, default=False)
+
+# init, complete and check resolved with the URLconf of their own routes, see serverlessWorkflow/middleware.py.
+TASK_CALLBACK_FAST_PATH         = env('TASK_CALLBACK_FAST_PATH', cast=bool, default=False)
+TASK_CALLBACK_URLCONF           = 'serverlessWorkflow.callback_urls'
+
+if TASK_CALLBACK_FAST_PATH:
+
+    MIDDLEWARE = ['serverlessWorkflow.middleware.CallbackURLconfMiddleware', *MIDDLEWARE]
+
+#################################################################################
+# Payload store
+#################################################################################
+
+# Task bodies of at least PAYLOAD_OFFLOAD_THRESHOLD bytes are stored and replaced by a reference envelope (Cloud Tasks rejects tasks above 1MB), 0 disables it.
+PAYLOAD_OFFLOAD_THRESHOLD   = env('PAYLOAD_OFFLOAD_THRESHOLD', cast=int, default=0)
+# local, or gcs (needs google-cloud-storage)
+PAYLOAD_STORE_BACKEND       = env('PAYLOAD_STORE_BACKEND', default='local')
+PAYLOAD_STORE_ROOT          = env('PAYLOAD_STORE_ROOT', default=os.path.join(os.path.dirname(BASE_DIR), 'payloads'))
+PAYLOAD_STORE_BUCKET        = env('PAYLOAD_STORE_BUCKET', default=None)
+# gzip, zstd (needs zstandard) or identity
+PAYLOAD_COMPRESSION         = env('PAYLOAD_COMPRESSION', default='gzip')
+# seconds the signed URL of an envelope is valid, purge_payloads removes the payloads not offloaded again since.
+PAYLOAD_TTL                 = env('PAYLOAD_TTL', cast=int, default=7 * 24 * 3600)
+
+# the local store is only readable on the instance which wrote it, a receiver served by another instance would get a 404.
+if PAYLOAD_OFFLOAD_THRESHOLD > 0 and PAYLOAD_STORE_BACKEND == 'local' and not DEBUG:
+
+    raise ImproperlyConfigured("PAYLOAD_OFFLOAD_THRESHOLD needs a shared PAYLOAD_STORE_BACKEND, e.g. gcs, unless DEBUG is set.")
+
 ###################################
 # Email
 ###################################
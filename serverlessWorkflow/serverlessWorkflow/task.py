@@ -1,61 +1,568 @@
-from google.cloud import tasks_v2
-from google.cloud.tasks_v2.types import Task
-from google.protobuf import timestamp_pb2
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DatabaseError, transaction
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils import timezone
+
+from serverlessWorkflow.metrics import counters
+from serverlessWorkflow.payload_store import offload_payload
+
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import datetime
+import hashlib
 import json
-from typing import Dict, Any, Optional, cast, Union
+import math
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Any, Optional, List, NamedTuple, cast, Union
+
+if TYPE_CHECKING:
+
+    # the client library and protobuf are imported on the first dispatch, not when the app starts.
+    from google.cloud import tasks_v2
+    from google.cloud.tasks_v2.types import Task
+
+
+class DispatchResult(NamedTuple):
+    index: int
+    task: Optional["Task"]
+    error: Optional[Exception]
+
+    @property
+    def ok(self) -> bool:
+
+        return self.error is None
+
+
+def encode_payload(payload: Union[Optional[Dict[str, Any]], str]) -> Optional[bytes]:
+
+    if payload is None:
+
+        return None
+
+    if not isinstance(payload, str):
+        # Convert dict to JSON string
+        payload = cast(str, json.dumps(payload))
+
+    # The API expects a payload of type bytes.
+    return payload.encode()
+
+
+class CloudTasksDispatcher:
+    """
+    Process-wide owner of a single long-lived Cloud Tasks client.
+
+    The client (and its gRPC channel) is created lazily on first dispatch and reused
+    by every thread of the process. After a fork (gunicorn workers) the child detects
+    the pid change and builds its own client instead of sharing the parent's channel.
+    The async client of the ASGI views is bound to the event loop it has been built in.
+    """
+
+    # a call is sent right away, it cannot be rolled back with the caller's transaction.
+    transactional = False
+
+    def __init__(self, project: str, region: str, queue: str, service_account: str, emulator_host: Optional[str] = None, max_concurrency: int = 1):
+
+        self.project            = project
+        self.region             = region
+        self.queue              = queue
+        self.service_account    = service_account
+        self.emulator_host      = emulator_host
+
+        self.max_concurrency    = max_concurrency
+
+        self._client: Optional["tasks_v2.CloudTasksClient"] = None
+        self._async_client: Optional["tasks_v2.CloudTasksAsyncClient"] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._executor_pid: Optional[int] = None
+        self._lock              = threading.Lock()
+
+    def _build_client(self) -> "tasks_v2.CloudTasksClient":
+
+        from google.cloud import tasks_v2
+
+        # Talk plain gRPC to a local emulator / fake server when configured.
+        if self.emulator_host:
+
+            import grpc
+            from google.cloud.tasks_v2.services.cloud_tasks.transports import CloudTasksGrpcTransport
+
+            transport = CloudTasksGrpcTransport(channel=grpc.insecure_channel(self.emulator_host))
+
+            return tasks_v2.CloudTasksClient(transport=transport)
+
+        return tasks_v2.CloudTasksClient()
+
+    def _build_async_client(self) -> "tasks_v2.CloudTasksAsyncClient":
+
+        from google.cloud import tasks_v2
+
+        if self.emulator_host:
+
+            import grpc
+            from google.cloud.tasks_v2.services.cloud_tasks.transports import CloudTasksGrpcAsyncIOTransport
+
+            transport = CloudTasksGrpcAsyncIOTransport(channel=grpc.aio.insecure_channel(self.emulator_host))
+
+            return tasks_v2.CloudTasksAsyncClient(transport=transport)
+
+        return tasks_v2.CloudTasksAsyncClient()
+
+    @property
+    def async_client(self) -> "tasks_v2.CloudTasksAsyncClient":
+
+        # one event loop per worker under ASGI, the channel of another loop cannot be awaited.
+        loop = asyncio.get_running_loop()
+
+        if self._async_client is None or self._async_loop is not loop:
+
+            self._async_client  = self._build_async_client()
+            self._async_loop    = loop
+
+        return self._async_client
+
+    @property
+    def client(self) -> "tasks_v2.CloudTasksClient":
+
+        pid = os.getpid()
+
+        # Fast path, the client has already been built in this process.
+        if self._client is not None and self._pid == pid:
+
+            return self._client
+
+        with self._lock:
+
+            if self._client is None or self._pid != pid:
+
+                self._client    = self._build_client()
+                self._pid       = pid
+
+        return self._client
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+
+        pid = os.getpid()
+
+        if self._executor is not None and self._executor_pid == pid:
+
+            return self._executor
+
+        with self._lock:
+
+            if self._executor is None or self._executor_pid != pid:
 
+                self._executor      = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="cloud-tasks-dispatch")
+                self._executor_pid  = pid
 
-def create_http_task(url: str, payload: Union[Optional[Dict[str, Any]], str] = None, method: str ="POST", headers: Dict[str, Any]={"Content-Type": "application/json"}, queue: str = 'serverless-workflow-q', in_seconds: Optional[int] = None, task_name: Optional[str] = None) -> Task:
+        return self._executor
 
-    # Create a client.
-    client  = tasks_v2.CloudTasksClient()
+    def reset(self):
 
-    project = 'advancedware'
-    region  = 'europe-west1'
+        # Drop the client and pool without closing them, they belong to the parent process.
+        self._client    = None
+        self._executor  = None
+        self._async_client = None
+        self._async_loop   = None
+        self._pid       = None
+        self._executor_pid = None
+        self._lock      = threading.Lock()
 
-    # Construct the fully qualified queue name.
-    parent = client.queue_path(project, region, queue)
+    def queue_path(self, queue: Optional[str] = None) -> str:
 
-    task: Dict[str, Any] = {
-        'http_request': {  # Specify the type of request.
-            'http_method': method,
-            'url': url,  # The full url path that the task will be sent to.
-            'oidc_token': {
-                'service_account_email': 'books-356@advancedware.iam.gserviceaccount.com'
-            },
-            'headers': headers
+        # the format of CloudTasksClient.queue_path, without importing the client library.
+        return f"projects/{self.project}/locations/{self.region}/queues/{queue or self.queue}"
+
+    def build_task(self, url: str, payload: Union[Optional[Dict[str, Any]], str] = None, method: str = "POST", headers: Optional[Dict[str, Any]] = None, in_seconds: Optional[int] = None, task_name: Optional[str] = None) -> Dict[str, Any]:
+
+        task: Dict[str, Any] = {
+            'http_request': {  # Specify the type of request.
+                'http_method': method,
+                'url': url,  # The full url path that the task will be sent to.
+                'oidc_token': {
+                    'service_account_email': self.service_account
+                },
+                'headers': headers if headers is not None else {"Content-Type": "application/json"}
+            }
         }
-    }
-    
-    if payload is not None:
-        
-        if isinstance(payload, dict):
-            # Convert dict to JSON string
-            payload = cast(str, json.dumps(payload))
-        
-        # The API expects a payload of type bytes.
-        converted_payload = payload.encode()
-
-        # Add the payload to the request.
-        task["http_request"]["body"] = converted_payload
-
-    if in_seconds is not None:
-        # Convert "seconds from now" into an rfc3339 datetime string.
-        d = datetime.datetime.utcnow() + datetime.timedelta(seconds=in_seconds)
-
-        # Create Timestamp protobuf.
-        timestamp = timestamp_pb2.Timestamp()
-        timestamp.FromDatetime(d)
-
-        # Add the timestamp to the tasks.
-        task["schedule_time"] = timestamp
-
-    if task_name is not None:
-        # Add the name to tasks.
-        task["name"] = task_name
-
-    # Use the client to build and send the task.
-    response = client.create_task(request={"parent": parent, "task": task})
-
-    return response
+
+        # bodies above PAYLOAD_OFFLOAD_THRESHOLD are sent as a reference to the payload store.
+        converted_payload = offload_payload(encode_payload(payload))
+
+        if converted_payload is not None:
+
+            # Add the payload to the request.
+            task["http_request"]["body"] = converted_payload
+
+        if in_seconds is not None:
+            # Convert "seconds from now" into an rfc3339 datetime string.
+            d = datetime.datetime.utcnow() + datetime.timedelta(seconds=in_seconds)
+
+            from google.protobuf import timestamp_pb2
+
+            # Create Timestamp protobuf.
+            timestamp = timestamp_pb2.Timestamp()
+            timestamp.FromDatetime(d)
+
+            # Add the timestamp to the tasks.
+            task["schedule_time"] = timestamp
+
+        if task_name is not None:
+            # Add the name to tasks.
+            task["name"] = task_name
+
+        return task
+
+    def task_path(self, task_name: str, queue: Optional[str] = None) -> str:
+
+        # Short names are expanded into the fully qualified task name of the queue.
+        if "/" in task_name:
+
+            return task_name
+
+        return f"{self.queue_path(queue)}/tasks/{task_name}"
+
+    def create_http_task(self, url: str, payload: Union[Optional[Dict[str, Any]], str] = None, method: str = "POST", headers: Optional[Dict[str, Any]] = None, queue: Optional[str] = None, in_seconds: Optional[int] = None, task_name: Optional[str] = None) -> Optional["Task"]:
+
+        from google.api_core.exceptions import AlreadyExists
+
+        if task_name is not None:
+
+            task_name = self.task_path(task_name, queue)
+
+        task = self.build_task(url, payload=payload, method=method, headers=headers, in_seconds=in_seconds, task_name=task_name)
+
+        try:
+
+            # Use the shared client to build and send the task.
+            return self.client.create_task(request={"parent": self.queue_path(queue), "task": task})
+
+        except AlreadyExists:
+
+            # A task with the same name is already queued, nothing left to do.
+            if task_name is not None:
+
+                return None
+
+            raise
+
+    async def acreate_http_task(self, url: str, payload: Union[Optional[Dict[str, Any]], str] = None, method: str = "POST", headers: Optional[Dict[str, Any]] = None, queue: Optional[str] = None, in_seconds: Optional[int] = None, task_name: Optional[str] = None) -> Optional["Task"]:
+
+        from google.api_core.exceptions import AlreadyExists
+
+        if task_name is not None:
+
+            task_name = self.task_path(task_name, queue)
+
+        # a large payload is written to the payload store, out of the event loop.
+        task = await sync_to_async(self.build_task, thread_sensitive=False)(url, payload=payload, method=method, headers=headers, in_seconds=in_seconds, task_name=task_name)
+
+        try:
+
+            return await self.async_client.create_task(request={"parent": self.queue_path(queue), "task": task})
+
+        except AlreadyExists:
+
+            if task_name is not None:
+
+                return None
+
+            raise
+
+    def _dispatch_one(self, index: int, call: Dict[str, Any]) -> DispatchResult:
+
+        try:
+
+            return DispatchResult(index, self.create_http_task(**call), None)
+
+        except Exception as exc:
+
+            return DispatchResult(index, None, exc)
+
+    def dispatch_many(self, calls: List[Dict[str, Any]]) -> List[DispatchResult]:
+        """
+        Enqueues every call (keyword arguments of `create_http_task`) with at most `max_concurrency`
+        requests in flight. A failing call never aborts the others, the result of each call is
+        reported at its own index.
+        """
+
+        if self.max_concurrency <= 1 or len(calls) <= 1:
+
+            return [self._dispatch_one(index, call) for index, call in enumerate(calls)]
+
+        return list(self.executor.map(self._dispatch_one, range(len(calls)), calls))
+
+    async def adispatch_many(self, calls: List[Dict[str, Any]]) -> List[DispatchResult]:
+        """
+        Same as `dispatch_many` with the async client, at most `max_concurrency` requests in
+        flight and no thread held while they are.
+        """
+
+        semaphore = asyncio.Semaphore(max(self.max_concurrency, 1))
+
+        async def dispatch_one(index: int, call: Dict[str, Any]) -> DispatchResult:
+
+            async with semaphore:
+
+                try:
+
+                    return DispatchResult(index, await self.acreate_http_task(**call), None)
+
+                except Exception as exc:
+
+                    return DispatchResult(index, None, exc)
+
+        return list(await asyncio.gather(*(dispatch_one(index, call) for index, call in enumerate(calls))))
+
+
+class OutboxDispatcher:
+    """
+    Writes every dispatch as an `OutboxTask` row inside the caller's transaction instead of
+    calling Cloud Tasks, so a rollback also discards the work it scheduled. The rows are
+    delivered by `manage.py dispatch_outbox`.
+    """
+
+    transactional = True
+
+    def __init__(self, queue: str):
+
+        self.queue = queue
+
+    def reset(self):
+
+        pass
+
+    def build_row(self, url: str, payload: Union[Optional[Dict[str, Any]], str] = None, method: str = "POST", headers: Optional[Dict[str, Any]] = None, queue: Optional[str] = None, in_seconds: Optional[int] = None, task_name: Optional[str] = None):
+
+        from task_services.models import OutboxTask
+
+        scheduled_at = timezone.now()
+
+        if in_seconds is not None:
+
+            scheduled_at += datetime.timedelta(seconds=in_seconds)
+
+        return OutboxTask(
+            name            = task_name,
+            queue           = queue or self.queue,
+            url             = url,
+            method          = method,
+            headers         = headers if headers is not None else {"Content-Type": "application/json"},
+            body            = offload_payload(encode_payload(payload)),
+            scheduled_at    = scheduled_at,
+        )
+
+    def create_http_task(self, url: str, payload: Union[Optional[Dict[str, Any]], str] = None, method: str = "POST", headers: Optional[Dict[str, Any]] = None, queue: Optional[str] = None, in_seconds: Optional[int] = None, task_name: Optional[str] = None):
+
+        return self.dispatch_many([{
+            "url": url, "payload": payload, "method": method, "headers": headers, "queue": queue, "in_seconds": in_seconds, "task_name": task_name
+        }])[0].task
+
+    def dispatch_many(self, calls: List[Dict[str, Any]]) -> List[DispatchResult]:
+
+        from task_services.models import OutboxTask
+
+        results: List[DispatchResult] = []
+
+        for index, call in enumerate(calls):
+
+            try:
+
+                results.append(DispatchResult(index, self.build_row(**call), None))
+
+            except Exception as exc:
+
+                results.append(DispatchResult(index, None, exc))
+
+        rows = [result.task for result in results if result.ok]
+
+        try:
+
+            # savepoint, a failed insert must not break the caller's transaction.
+            with transaction.atomic():
+
+                # Named rows which are still waiting in the outbox are not inserted again.
+                queued = set(OutboxTask.objects.filter(name__in=[row.name for row in rows if row.name is not None]).values_list("name", flat=True))
+
+                OutboxTask.objects.bulk_create([row for row in rows if row.name not in queued], ignore_conflicts=True)
+
+        except DatabaseError as exc:
+
+            return [DispatchResult(result.index, None, result.error or exc) for result in results]
+
+        return [
+            DispatchResult(result.index, None, None) if result.ok and result.task.name in queued else result
+            for result in results
+        ]
+
+    async def acreate_http_task(self, url: str, payload: Union[Optional[Dict[str, Any]], str] = None, method: str = "POST", headers: Optional[Dict[str, Any]] = None, queue: Optional[str] = None, in_seconds: Optional[int] = None, task_name: Optional[str] = None):
+
+        return await sync_to_async(self.create_http_task)(url, payload=payload, method=method, headers=headers, queue=queue, in_seconds=in_seconds, task_name=task_name)
+
+    async def adispatch_many(self, calls: List[Dict[str, Any]]) -> List[DispatchResult]:
+
+        # the rows are written by the ORM, in a worker thread and in a transaction of their own.
+        return await sync_to_async(self.dispatch_many)(calls)
+
+
+def cloud_tasks_dispatcher_from_settings() -> CloudTasksDispatcher:
+
+    return CloudTasksDispatcher(
+        project         = settings.CLOUD_TASKS_PROJECT,
+        region          = settings.CLOUD_TASKS_REGION,
+        queue           = settings.CLOUD_TASKS_QUEUE,
+        service_account = settings.CLOUD_TASKS_SERVICE_ACCOUNT,
+        emulator_host   = settings.CLOUD_TASKS_EMULATOR_HOST,
+        max_concurrency = settings.CLOUD_TASKS_DISPATCH_CONCURRENCY,
+    )
+
+
+_dispatcher: Optional[Union[CloudTasksDispatcher, OutboxDispatcher]] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> Union[CloudTasksDispatcher, OutboxDispatcher]:
+
+    global _dispatcher
+
+    if _dispatcher is None:
+
+        with _dispatcher_lock:
+
+            if _dispatcher is None:
+
+                if settings.TASK_DISPATCHER_BACKEND == "outbox":
+
+                    _dispatcher = OutboxDispatcher(queue=settings.CLOUD_TASKS_QUEUE)
+
+                else:
+
+                    _dispatcher = cloud_tasks_dispatcher_from_settings()
+
+    return _dispatcher
+
+
+@receiver(setting_changed)
+def _reset_dispatcher(setting: str, **kwargs):
+
+    global _dispatcher
+
+    # override_settings of the tests switches the backend.
+    if setting.startswith("CLOUD_TASKS_") or setting == "TASK_DISPATCHER_BACKEND":
+
+        _dispatcher = None
+
+
+def _reset_after_fork():
+
+    global _dispatcher_lock
+
+    _dispatcher_lock = threading.Lock()
+
+    if _dispatcher is not None:
+
+        _dispatcher.reset()
+
+
+if hasattr(os, "register_at_fork"):
+
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def create_http_task(url: str, payload: Union[Optional[Dict[str, Any]], str] = None, method: str ="POST", headers: Dict[str, Any]={"Content-Type": "application/json"}, queue: Optional[str] = None, in_seconds: Optional[int] = None, task_name: Optional[str] = None) -> Any:
+
+    return get_dispatcher().create_http_task(url, payload=payload, method=method, headers=headers, queue=queue, in_seconds=in_seconds, task_name=task_name)
+
+
+def dispatch_many(calls: List[Dict[str, Any]]) -> List[DispatchResult]:
+
+    return get_dispatcher().dispatch_many(calls)
+
+
+async def acreate_http_task(url: str, payload: Union[Optional[Dict[str, Any]], str] = None, method: str ="POST", headers: Dict[str, Any]={"Content-Type": "application/json"}, queue: Optional[str] = None, in_seconds: Optional[int] = None, task_name: Optional[str] = None) -> Any:
+
+    return await get_dispatcher().acreate_http_task(url, payload=payload, method=method, headers=headers, queue=queue, in_seconds=in_seconds, task_name=task_name)
+
+
+async def adispatch_many(calls: List[Dict[str, Any]]) -> List[DispatchResult]:
+
+    return await get_dispatcher().adispatch_many(calls)
+
+
+def dispatch_on_commit(send: Callable[[], Any]):
+    """
+    Runs `send` right away when the dispatcher writes outbox rows, so they are part of the current
+    transaction, and only once it commits when the dispatcher calls Cloud Tasks, so no row lock
+    is held while waiting on it and a rollback enqueues nothing.
+    """
+
+    if get_dispatcher().transactional:
+
+        send()
+
+    else:
+
+        transaction.on_commit(send)
+
+
+def check_task_call(my_user_id: Any, task_id: Any) -> Dict[str, Any]:
+
+    url = settings.CURRENT_HOST + reverse("task-check", kwargs={"my_user": my_user_id, "id": task_id})
+
+    window: int = settings.TASK_CHECK_COALESCE_WINDOW
+
+    if window <= 0:
+
+        return {"url": url, "payload": {}, "method": "PUT", "in_seconds": settings.TASK_CHECK_DELAY}
+
+    now         = time.time()
+    bucket      = int(now // window)
+    in_seconds  = math.ceil((bucket + 1) * window - now) + settings.TASK_CHECK_DELAY
+
+    # a hash first, Cloud Tasks spreads names with random prefixes better than sequential ones, and it stays the same for the bucket.
+    prefix = hashlib.sha1(f"{task_id}-{window}".encode()).hexdigest()[:8]
+
+    return {"url": url, "payload": {}, "method": "PUT", "in_seconds": in_seconds, "task_name": f"check-{prefix}-{task_id}-{window}-{bucket}"}
+
+
+def create_check_task(my_user_id: Any, task_id: Any) -> Any:
+    """
+    Schedules a `PUT tasks/check/<my_user>/<id>` callback. Checks of one task are coalesced:
+    every call inside the same `TASK_CHECK_COALESCE_WINDOW` seconds bucket uses the same task
+    name, which runs `TASK_CHECK_DELAY` seconds after the bucket closes, so it observes all
+    the completions of that bucket. Returns None when the check was already scheduled.
+    """
+
+    call = check_task_call(my_user_id, task_id)
+
+    task = create_http_task(**call)
+
+    counters.incr("checks_scheduled" if task is not None or "task_name" not in call else "checks_coalesced")
+
+    return task
+
+
+async def acreate_check_task(my_user_id: Any, task_id: Any) -> Any:
+
+    call = check_task_call(my_user_id, task_id)
+
+    task = await acreate_http_task(**call)
+
+    counters.incr("checks_scheduled" if task is not None or "task_name" not in call else "checks_coalesced")
+
+    return task
+
+
+def dispatch_errors(calls: List[Dict[str, Any]], results: List[DispatchResult]) -> List[Dict[str, Any]]:
+
+    return [
+        {"index": result.index, "url": calls[result.index]["url"], "detail": str(result.error)}
+        for result in results if not result.ok
+    ]
@@ -4,7 +4,7 @@ from django.contrib import admin
 from task_services.models import Task
 
 class TaskAdmin(admin.ModelAdmin):
-    list_display = ('id', 'parent_task', 'task_status', 'sub_task_status', 'code')
-    ordering = ('code',)
+    list_display = ('id', 'parent_task', 'task_status', 'sub_task_status', 'depth', 'code')
+    ordering = ('path',)
 
 admin.site.register(Task, TaskAdmin)
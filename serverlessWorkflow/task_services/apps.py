@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class TaskServicesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'task_services'
+
+    def ready(self):
+
+        # connects the receivers dropping revoked tokens from the token cache.
+        from task_services import authentication  # noqa: F401
@@ -0,0 +1,163 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from task_services.models import User
+
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Tuple
+import copy
+import threading
+import time
+
+
+class TokenCache:
+    """
+    Thread-safe, process-local LRU of authenticated tokens, every entry expires after `ttl`
+    seconds. With `TOKEN_CACHE_BACKEND` the entries are shared through that Django cache as
+    well, so a new instance does not read every token again.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, backend: Optional[str] = None):
+
+        self.maxsize    = maxsize
+        self.ttl        = ttl
+        self.backend    = backend
+
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def shared_key(self, key: str) -> str:
+
+        return f"auth-token:{key}"
+
+    def get(self, key: str) -> Optional[Tuple[User, Token]]:
+
+        now = time.monotonic()
+
+        with self._lock:
+
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[0] > now:
+
+                self._entries.move_to_end(key)
+
+                return entry[1]
+
+            if entry is not None:
+
+                del self._entries[key]
+
+        if self.backend is None:
+
+            return None
+
+        value = caches[self.backend].get(self.shared_key(key))
+
+        if value is not None:
+
+            self.set(key, value, shared=False)
+
+        return value
+
+    def set(self, key: str, value: Tuple[User, Token], shared: bool = True):
+
+        with self._lock:
+
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+
+                self._entries.popitem(last=False)
+
+        if shared and self.backend is not None:
+
+            caches[self.backend].set(self.shared_key(key), value, timeout=self.ttl)
+
+    def invalidate(self, keys: Iterable[str]):
+
+        keys = list(keys)
+
+        with self._lock:
+
+            for key in keys:
+
+                self._entries.pop(key, None)
+
+        if keys and self.backend is not None:
+
+            caches[self.backend].delete_many([self.shared_key(key) for key in keys])
+
+    def clear(self):
+
+        with self._lock:
+
+            self._entries.clear()
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL, settings.TOKEN_CACHE_BACKEND)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication answering from `token_cache`, a known token costs no query. Signing out,
+    deleting or updating a user drops its token from the cache, other instances of the service
+    accept a revoked token for at most `TOKEN_CACHE_TTL` seconds.
+    """
+
+    def authenticate_credentials(self, key: str) -> Tuple[User, Token]:
+
+        cached = token_cache.get(key)
+
+        if cached is None:
+
+            cached = super().authenticate_credentials(key)
+
+            # User.is_active is a method, the flag is read directly.
+            if not cached[0].active:
+
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+            token_cache.set(key, cached)
+
+        # every request gets its own copies, a view changing request.user does not change the cache.
+        user, token = copy.copy(cached[0]), copy.copy(cached[1])
+
+        token.user = user
+
+        return user, token
+
+
+def invalidate_tokens(keys: Iterable[str]):
+
+    keys = list(keys)
+
+    token_cache.invalidate(keys)
+
+    # a request reading the token before the commit may have cached it again.
+    transaction.on_commit(lambda: token_cache.invalidate(keys))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance: Token, **kwargs):
+
+    # sign out, a new sign in replacing the token, or the deletion of its user.
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance: User, created: bool, **kwargs):
+
+    # a deactivated or renamed user is read again.
+    if not created:
+
+        invalidate_tokens(Token.objects.filter(user_id=instance.pk).values_list("key", flat=True))
@@ -0,0 +1,369 @@
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from serverlessWorkflow.exception import PayloadTooLarge
+from serverlessWorkflow.metrics import counters
+from serverlessWorkflow.task import DispatchResult, acreate_check_task, adispatch_many, create_check_task, dispatch_many, dispatch_errors, get_dispatcher
+
+from task_services.models import Task, TaskConflict
+from task_services.choices import SubTaskInputTypeChoices, StatusChoices
+
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class CheckResult(NamedTuple):
+    # PENDING: children still running, DISPATCHED: sub_task_next has been enqueued, COMPLETED: the subtree is done.
+    state: str
+    dispatch_errors: List[Dict[str, Any]]
+
+
+PENDING     = "pending"
+DISPATCHED  = "dispatched"
+COMPLETED   = "completed"
+
+
+def sub_task_payload(obj: Task, sub_next_data: Dict[str, Any]) -> Union[Optional[Dict[str, Any]], str]:
+
+    # getting payload
+    payload = {}
+
+    if sub_next_data["input_type"] == SubTaskInputTypeChoices.NONE:
+
+        payload = None
+
+    # getting the payload from response of current instance
+    if sub_next_data["input_type"] == SubTaskInputTypeChoices.CURRENT_RESPONSE:
+
+        payload = obj.response["data"]
+
+    # getting the payload from sub_task response, aggregated by Postgres and passed through as JSON text
+    elif sub_next_data["input_type"] == SubTaskInputTypeChoices.SUB_TASK_RESPONSE:
+
+        payload = Task.objects.sub_task_responses_json(obj, data_only=settings.SUB_TASK_RESPONSE_DATA_ONLY, max_bytes=settings.SUB_TASK_RESPONSE_MAX_BYTES)
+
+    # getting the payload from current response and sub task response
+    elif sub_next_data["input_type"] == SubTaskInputTypeChoices.CURRENT_AND_SUB_TASK_RESPONSE:
+
+        payload = Task.objects.sub_task_responses_json(obj, include_current=True, data_only=settings.SUB_TASK_RESPONSE_DATA_ONLY, max_bytes=settings.SUB_TASK_RESPONSE_MAX_BYTES)
+
+    # getting the payload from custom_input of sub_task_data
+    elif sub_next_data["input_type"] == SubTaskInputTypeChoices.CUSTOM_INPUT:
+
+        payload = sub_next_data["custom_input"]
+
+    return payload
+
+
+def claim_sub_task_next(obj: Task) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[DispatchResult]]]:
+    """
+    Claims the sub_task_next of `obj` with a compare-and-swap write, so a concurrent check cannot
+    send them as well. Returns the claimed entries, their calls and the results of the calls whose
+    payload could not be built, or None, without claiming anything, when `obj` has changed since
+    it was read.
+    """
+
+    sub_task_next       = obj.sub_task_next
+    obj.sub_task_next   = []
+
+    if not obj.cas_save(["sub_task_next"]):
+
+        obj.sub_task_next = sub_task_next
+
+        return None
+
+    calls   = []
+    results = []
+
+    for index, sub_next_data in enumerate(sub_task_next):
+
+        call = {
+            # getting url
+            "url": sub_next_data["url"],
+            # getting method
+            "method": sub_next_data["method"],
+            # getting headers
+            "headers": obj.response["headers"],
+            "in_seconds": settings.TASK_CHECK_DELAY,
+        }
+
+        calls.append(call)
+
+        try:
+
+            call["payload"] = sub_task_payload(obj, sub_next_data)
+
+        except PayloadTooLarge as exc:
+
+            results.append(DispatchResult(index, None, exc))
+
+    return sub_task_next, calls, results
+
+
+def pending_calls(calls: List[Dict[str, Any]], results: List[DispatchResult]) -> List[Dict[str, Any]]:
+
+    failed = {result.index for result in results}
+
+    return [call for index, call in enumerate(calls) if index not in failed]
+
+
+def settle_sub_task_next(obj: Task, sub_task_next: List[Dict[str, Any]], calls: List[Dict[str, Any]], results: List[DispatchResult], dispatched: List[DispatchResult]) -> List[Dict[str, Any]]:
+    """
+    Puts back the claimed sub_task_next entries which could not be enqueued, `dispatched` are the
+    results of `pending_calls`. Returns the dispatch errors.
+    """
+
+    failed = {result.index for result in results}
+
+    # mapping the results back to the index of their sub_task_next entry
+    indexes = [index for index in range(len(calls)) if index not in failed]
+
+    results = results + [result._replace(index=indexes[result.index]) for result in dispatched]
+
+    results.sort(key=lambda result: result.index)
+
+    # putting back the sub_task_next entries which could not be enqueued
+    undelivered = [sub_next_data for sub_next_data, result in zip(sub_task_next, results) if not result.ok]
+
+    if undelivered:
+
+        for _ in range(settings.TASK_CAS_RETRIES):
+
+            obj.refresh_from_db(fields=["sub_task_next", "version"])
+
+            obj.sub_task_next = (obj.sub_task_next or []) + undelivered
+
+            if obj.cas_save(["sub_task_next"]):
+
+                break
+
+        else:
+
+            raise TaskConflict(f"Task {obj.id} kept changing while putting back its sub_task_next.")
+
+    return dispatch_errors(calls, results)
+
+
+def dispatch_sub_task_next(obj: Task) -> Optional[List[Dict[str, Any]]]:
+    """
+    Claims the sub_task_next of `obj` with a compare-and-swap write, so a concurrent check cannot
+    send them as well, and sends them. The entries which could not be enqueued are put back.
+    Returns None, without sending anything, when `obj` has changed since it was read.
+
+    Inside a transaction, the inline propagation, Cloud Tasks is only called once it commits and
+    the ancestors' locks are released, the errors are then logged instead of returned.
+    """
+
+    claimed = claim_sub_task_next(obj)
+
+    if claimed is None:
+
+        return None
+
+    sub_task_next, calls, results = claimed
+
+    def send() -> List[Dict[str, Any]]:
+
+        # sending requests in parallel
+        dispatched = dispatch_many(pending_calls(calls, results))
+
+        return settle_sub_task_next(obj, sub_task_next, calls, results, dispatched)
+
+    if transaction.get_connection().in_atomic_block and not get_dispatcher().transactional:
+
+        def send_on_commit():
+
+            errors = send()
+
+            if errors:
+
+                logger.warning("Sub task next of task %s could not be enqueued, they are kept: %s", obj.id, errors)
+
+        # a rolled back propagation enqueues nothing.
+        transaction.on_commit(send_on_commit)
+
+        return []
+
+    return send()
+
+
+async def adispatch_sub_task_next(obj: Task) -> Optional[List[Dict[str, Any]]]:
+    """
+    Same as `dispatch_sub_task_next` with the async dispatcher, the database work runs in a worker thread.
+    """
+
+    claimed = await sync_to_async(claim_sub_task_next)(obj)
+
+    if claimed is None:
+
+        return None
+
+    sub_task_next, calls, results = claimed
+
+    dispatched = await adispatch_many(pending_calls(calls, results))
+
+    return await sync_to_async(settle_sub_task_next)(obj, sub_task_next, calls, results, dispatched)
+
+
+def check_task_once(obj: Task) -> Optional[CheckResult]:
+
+    # Checking if current tasks all children's task_status and sub_task_status is Completed
+    if not obj.children_completed:
+
+        return CheckResult(PENDING, [])
+
+    # sub_task_next is not None and length of sub_task_next is greater than 0
+    if obj.sub_task_next is not None and len(obj.sub_task_next) > 0:
+
+        errors = dispatch_sub_task_next(obj)
+
+        return CheckResult(DISPATCHED, errors) if errors is not None else None
+
+    # setting sub_task_status as Completed, only the check which actually changes it updates the parent's counters.
+    if obj.sub_task_status != StatusChoices.COMPLETED:
+
+        before = (obj.task_status, obj.sub_task_status)
+
+        obj.sub_task_status = StatusChoices.COMPLETED
+
+        # the status and the parent's counters are written together, a retried check would not count the transition again.
+        with transaction.atomic():
+
+            if not obj.cas_save(["sub_task_status"]):
+
+                return None
+
+            Task.record_child_transition(obj.parent_task_id, before, (obj.task_status, obj.sub_task_status))
+
+    # If obj is Root Node then we will delete the instance
+    if obj.parent_task_id is None:
+
+        deleted, _ = Task.objects.filter(id=obj.id).delete()
+
+        if deleted:
+
+            record_workflow_completion(obj)
+
+    return CheckResult(COMPLETED, [])
+
+
+def check_task(obj: Task) -> CheckResult:
+    """
+    Runs the check of one task: fires its sub_task_next once all children are completed, or marks
+    its sub_task_status Completed when there is nothing left to fire. A completed root is deleted.
+    Every write is a compare-and-swap on the version `obj` was read at, the check starts over from
+    a fresh read after a conflict.
+    """
+
+    for _ in range(settings.TASK_CAS_RETRIES):
+
+        result = check_task_once(obj)
+
+        if result is not None:
+
+            return result
+
+        obj.refresh_from_db()
+
+    raise TaskConflict(f"Task {obj.id} kept changing during its check.")
+
+
+async def acheck_task(obj: Task) -> CheckResult:
+    """
+    Same as `check_task`, the sub_task_next are sent by the async dispatcher and the database
+    work runs in a worker thread.
+    """
+
+    for _ in range(settings.TASK_CAS_RETRIES):
+
+        # the only step of a check which waits on Cloud Tasks.
+        if obj.children_completed and obj.sub_task_next:
+
+            errors = await adispatch_sub_task_next(obj)
+
+            result = CheckResult(DISPATCHED, errors) if errors is not None else None
+
+        else:
+
+            result = await sync_to_async(check_task_once)(obj)
+
+        if result is not None:
+
+            return result
+
+        await sync_to_async(obj.refresh_from_db)()
+
+    raise TaskConflict(f"Task {obj.id} kept changing during its check.")
+
+
+def record_workflow_completion(root: Task):
+
+    elapsed_ms = (timezone.now() - root.created_at).total_seconds() * 1000
+
+    counters.observe(f"workflow_completion_ms_{settings.TASK_CHECK_PROPAGATION}", elapsed_ms)
+
+    logger.info("Workflow %s completed in %.0fms (%s propagation).", root.id, elapsed_ms, settings.TASK_CHECK_PROPAGATION)
+
+
+def propagate_completion(task_id: Any) -> CheckResult:
+    """
+    Runs the check of `task_id` and then of its ancestors, one locked row at a time, until a task
+    still has pending children or fires its sub_task_next. Must run inside a transaction.
+    """
+
+    result = CheckResult(PENDING, [])
+
+    while task_id is not None:
+
+        obj: Optional[Task] = Task.objects.select_for_update().filter(id=task_id).first()
+
+        if obj is None:
+
+            break
+
+        result = check_task(obj)
+
+        if result.state != COMPLETED:
+
+            break
+
+        task_id = obj.parent_task_id
+
+    return result
+
+
+def schedule_check(my_user_id: Any, task_id: Any):
+    """
+    Checks `task_id` right away in the current transaction with `TASK_CHECK_PROPAGATION=inline`,
+    otherwise enqueues the check callback.
+    """
+
+    if settings.TASK_CHECK_PROPAGATION == "inline":
+
+        with transaction.atomic():
+
+            propagate_completion(task_id)
+
+    else:
+
+        create_check_task(my_user_id, task_id)
+
+
+async def aschedule_check(my_user_id: Any, task_id: Any):
+    """
+    Same as `schedule_check`, the inline propagation runs in a worker thread.
+    """
+
+    if settings.TASK_CHECK_PROPAGATION == "inline":
+
+        await sync_to_async(schedule_check)(my_user_id, task_id)
+
+    else:
+
+        await acreate_check_task(my_user_id, task_id)
@@ -65,3 +65,18 @@ class CannotDelete(APIException):
         self.detail = str(exc)
 
         register_bug(self.exc)
+
+
+class ConcurrentUpdate(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The task kept changing while it was being updated, please retry.'
+    default_code = 'Concurrent update'
+
+    def __init__(self, exc):
+        super().__init__()
+
+        self.exc = exc
+
+        self.detail = str(exc)
+
+        register_bug(self.exc)
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from task_services.choices import StatusChoices
+from task_services.models import Task
+
+
+class Command(BaseCommand):
+    help = "Recomputes children_count, children_completed_count and children_errored_count of every Task from its children, in batches."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+
+        batch_size: int = options["batch_size"]
+
+        children = Task.objects.filter(parent_task=OuterRef("pk")).order_by().values("parent_task")
+
+        def aggregate(condition: Q = Q()) -> Coalesce:
+
+            return Coalesce(
+                Subquery(children.annotate(total=Count("id", filter=condition)).values("total"), output_field=IntegerField()),
+                Value(0),
+            )
+
+        last_id = None
+        updated = 0
+
+        while True:
+
+            queryset = Task.objects.order_by("id")
+
+            if last_id is not None:
+
+                queryset = queryset.filter(id__gt=last_id)
+
+            ids = list(queryset.values_list("id", flat=True)[:batch_size])
+
+            if not ids:
+
+                break
+
+            # one short transaction per batch, no long lived lock on the table.
+            with transaction.atomic():
+
+                updated += Task.objects.filter(id__in=ids).update(
+                    children_count              = aggregate(),
+                    children_completed_count    = aggregate(Q(task_status=StatusChoices.COMPLETED, sub_task_status=StatusChoices.COMPLETED)),
+                    children_errored_count      = aggregate(Q(task_status=StatusChoices.ERRORS)),
+                )
+
+            last_id = ids[-1]
+
+        self.stdout.write(f"Updated counters of {updated} tasks.")
@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.test import APIClient
+
+from task_services.models import Task, User
+
+from typing import Any, Dict, List
+from uuid import uuid4
+import json
+import time
+
+
+class Command(BaseCommand):
+    help = "Registers --children children of one root through tasks/init, one request per child (before), and through tasks/bulk-init (after), and reports the wall time of both."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--children", type=int, default=10000)
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Children per bulk-init request.")
+        parser.add_argument("--ndjson", action="store_true", help="Send the bulk-init bodies as NDJSON.")
+
+    def item(self) -> Dict[str, Any]:
+
+        return {"id": str(uuid4()), "request": {"url": "https://localhost/", "method": "POST", "payload": None, "headers": {}}}
+
+    def root(self, client: APIClient, user: User) -> str:
+
+        root = str(uuid4())
+
+        response = client.post(f"/api/tasks/init/{user.id}", {**self.item(), "id": root, "my_user": str(user.id), "parent_task": None, "code": root}, format="json")
+
+        if response.status_code != 201:
+
+            raise CommandError(f"init root failed: {response.status_code} {response.content[:500]!r}")
+
+        return root
+
+    def handle(self, *args, **options):
+
+        children: int   = options["children"]
+        chunk_size: int = options["chunk_size"]
+
+        client  = APIClient()
+        user    = User.objects.create(email=f"bench-{uuid4()}@example.com", password=str(uuid4()), name="bench")
+
+        try:
+
+            # before: one request, transaction and validation per child
+            root    = self.root(client, user)
+            start   = time.perf_counter()
+
+            for _ in range(children):
+
+                response = client.post(f"/api/tasks/init/{user.id}", {**self.item(), "my_user": str(user.id), "parent_task": root}, format="json")
+
+                if response.status_code != 201:
+
+                    raise CommandError(f"init failed: {response.status_code} {response.content[:500]!r}")
+
+            single = time.perf_counter() - start
+
+            self.stdout.write(f"{'single init':<12} {children} children in {single:.2f}s ({children / single:.0f}/s)")
+
+            # after: chunks of children per request
+            root    = self.root(client, user)
+            start   = time.perf_counter()
+
+            for offset in range(0, children, chunk_size):
+
+                items: List[Dict[str, Any]] = [self.item() for _ in range(min(chunk_size, children - offset))]
+
+                url = f"/api/tasks/bulk-init/{user.id}/{root}"
+
+                if options["ndjson"]:
+
+                    response = client.post(url, "\n".join(json.dumps(item) for item in items), content_type="application/x-ndjson")
+
+                else:
+
+                    response = client.post(url, items, format="json")
+
+                if response.status_code != 201:
+
+                    raise CommandError(f"bulk-init failed: {response.status_code} {response.content[:500]!r}")
+
+            bulk = time.perf_counter() - start
+
+            self.stdout.write(f"{'bulk init':<12} {children} children in {bulk:.2f}s ({children / bulk:.0f}/s), {single / bulk:.1f}x")
+
+            counts = Task.objects.filter(my_user=user, parent_task__isnull=True).values_list("children_count", flat=True)
+
+            self.stdout.write(f"children_count of the roots: {list(counts)}")
+
+        finally:
+
+            Task.objects.filter(my_user=user).delete()
+
+            user.delete()
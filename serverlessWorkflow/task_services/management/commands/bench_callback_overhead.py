@@ -0,0 +1,126 @@
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from rest_framework.settings import api_settings
+
+from serverlessWorkflow.middleware import CallbackURLconfMiddleware
+from task_services.views.check import TaskCheckAPIView
+
+from io import BytesIO
+from statistics import mean, median
+from typing import Callable, Dict, List
+from uuid import uuid4
+from wsgiref.util import setup_testing_defaults
+import time
+
+
+class Command(BaseCommand):
+    help = "Sends --iterations empty-body `tasks/check` calls, for a task which does not exist, in process through the full middleware stack with the browsable API renderer (before), the full stack with JSON only, and the full stack resolving with the callback URLconf (after), and reports the per-request time of each. The calls share one database connection, opening one per request would hide the difference."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--iterations", type=int, default=5000)
+        parser.add_argument("--warmup", type=int, default=200)
+
+    def call(self, application: Callable, path: str) -> str:
+
+        environ = {"PATH_INFO": path, "REQUEST_METHOD": "PUT", "CONTENT_LENGTH": "0", "HTTP_ACCEPT": "*/*", "wsgi.input": BytesIO(b"")}
+
+        setup_testing_defaults(environ)
+
+        statuses = []
+
+        b"".join(application(environ, lambda status, headers: statuses.append(status)))
+
+        return statuses[0]
+
+    def measure(self, applications: Dict[str, Callable], path: str, iterations: int) -> Dict[str, List[float]]:
+
+        samples: Dict[str, List[float]] = {label: [] for label in applications}
+
+        # interleaved, a slower database or a busier machine weighs on every stack alike.
+        for _ in range(iterations):
+
+            for label, application in applications.items():
+
+                start = time.perf_counter()
+
+                self.call(application, path)
+
+                samples[label].append(time.perf_counter() - start)
+
+        return samples
+
+    def handle(self, *args, **options):
+
+        path = f"/api/tasks/check/{uuid4()}/{uuid4()}"
+
+        middleware = f"{CallbackURLconfMiddleware.__module__}.{CallbackURLconfMiddleware.__name__}"
+
+        # the handlers load their middleware when they are built, whatever TASK_CALLBACK_FAST_PATH is.
+        with override_settings(MIDDLEWARE=[item for item in settings.MIDDLEWARE if item != middleware]):
+
+            full = WSGIHandler()
+
+        with override_settings(MIDDLEWARE=[middleware, *(item for item in settings.MIDDLEWARE if item != middleware)]):
+
+            lean = WSGIHandler()
+
+        renderer_classes, parser_classes = TaskCheckAPIView.renderer_classes, TaskCheckAPIView.parser_classes
+
+        def browsable(environ, start_response):
+
+            # the check view as it was, negotiating between the project's default renderers and parsers.
+            TaskCheckAPIView.renderer_classes   = tuple(api_settings.DEFAULT_RENDERER_CLASSES)
+            TaskCheckAPIView.parser_classes     = tuple(api_settings.DEFAULT_PARSER_CLASSES)
+
+            try:
+
+                return full(environ, start_response)
+
+            finally:
+
+                TaskCheckAPIView.renderer_classes, TaskCheckAPIView.parser_classes = renderer_classes, parser_classes
+
+        applications = {"before": browsable, "full stack, json": full, "after": lean}
+
+        conn_max_age = connection.settings_dict["CONN_MAX_AGE"]
+
+        connection.settings_dict["CONN_MAX_AGE"] = None
+
+        try:
+
+            self.run(applications, path, options)
+
+        finally:
+
+            connection.settings_dict["CONN_MAX_AGE"] = conn_max_age
+
+    def run(self, applications: Dict[str, Callable], path: str, options: Dict):
+
+        for label, application in applications.items():
+
+            with CaptureQueriesContext(connection) as queries:
+
+                status = self.call(application, path)
+
+            if not status.startswith("200"):
+
+                raise CommandError(f"{label}: expected status 200, got {status}")
+
+            self.stdout.write(f"{label:<20} {status}, {len(queries)} queries")
+
+        self.measure(applications, path, options["warmup"])
+
+        samples = self.measure(applications, path, options["iterations"])
+
+        for label, timings in samples.items():
+
+            self.stdout.write(f"{label:<20} mean={mean(timings) * 1000:.3f}ms p50={median(timings) * 1000:.3f}ms")
+
+        saved = median(samples["before"]) - median(samples["after"])
+
+        self.stdout.write(f"saved per request p50={saved * 1000:.3f}ms ({saved / median(samples['before']) * 100:.0f}%)")
@@ -0,0 +1,99 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from task_services.choices import StatusChoices
+from task_services.models import Task, User
+
+from statistics import mean, median
+from typing import Callable, List
+from uuid import uuid4
+import time
+
+
+class Command(BaseCommand):
+    help = "Seeds a synthetic user with --rows tasks and compares the latency of the subtree completion check: code LIKE scan (before) and children counters (after)."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--roots", type=int, default=1000)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded rows.")
+
+    def seed(self, user: User, rows: int, roots: int):
+
+        fanout = max(1, rows // roots)
+
+        with connection.cursor() as cursor:
+
+            cursor.execute(
+                """
+                INSERT INTO task_services_task (id, parent_task_id, my_user_id, task_status, sub_task_status, code,
+                    depth, children_count, children_completed_count, children_errored_count, version, created_at, updated_at)
+                SELECT gen_random_uuid(), NULL, %s, %s, %s, 'bench-' || g, 0, %s, %s, 0, 0, now(), now()
+                FROM generate_series(1, %s) AS g
+                """,
+                [user.id, StatusChoices.COMPLETED, StatusChoices.PENDING, fanout, fanout, roots],
+            )
+
+            cursor.execute(
+                """
+                INSERT INTO task_services_task (id, parent_task_id, my_user_id, task_status, sub_task_status, code,
+                    depth, children_count, children_completed_count, children_errored_count, version, created_at, updated_at)
+                SELECT gen_random_uuid(), root.id, %s, %s, %s, root.code || ',' || gen_random_uuid(), 1, 0, 0, 0, 0, now(), now()
+                FROM task_services_task AS root CROSS JOIN generate_series(1, %s)
+                WHERE root.my_user_id = %s AND root.parent_task_id IS NULL
+                """,
+                [user.id, StatusChoices.COMPLETED, StatusChoices.COMPLETED, fanout, user.id],
+            )
+
+            cursor.execute("ANALYZE task_services_task")
+
+    def measure(self, label: str, iterations: int, check: Callable[[], bool]):
+
+        samples: List[float] = []
+
+        for _ in range(iterations):
+
+            start = time.perf_counter()
+
+            check()
+
+            samples.append(time.perf_counter() - start)
+
+        self.stdout.write(f"{label:<20} mean={mean(samples) * 1000:.3f}ms p50={median(samples) * 1000:.3f}ms max={max(samples) * 1000:.3f}ms")
+
+    def handle(self, *args, **options):
+
+        user = User.objects.create(email=f"bench-{uuid4()}@example.com", password=str(uuid4()), name="bench")
+
+        try:
+
+            self.seed(user, options["rows"], options["roots"])
+
+            root: Task = Task.objects.filter(my_user=user, parent_task__isnull=True).first()
+
+            segment = root.code.split(",")[-1]
+
+            self.stdout.write(f"seeded {Task.objects.filter(my_user=user).count()} tasks")
+
+            # before: subtree scan on the code column
+            self.measure("code scan", options["iterations"], lambda: not Task.objects.filter(
+                code__contains=segment
+            ).exclude(code__endswith=segment).exclude(
+                task_status=StatusChoices.COMPLETED,
+                sub_task_status=StatusChoices.COMPLETED
+            ).exists())
+
+            # after: one primary key read
+            self.measure("children counters", options["iterations"], lambda: Task.objects.filter(id=root.id).first().children_completed)
+
+        finally:
+
+            if not options["keep"]:
+
+                with connection.cursor() as cursor:
+
+                    cursor.execute("DELETE FROM task_services_task WHERE my_user_id = %s", [user.id])
+
+                user.delete()
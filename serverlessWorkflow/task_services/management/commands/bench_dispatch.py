@@ -0,0 +1,118 @@
+from django.core.management.base import BaseCommand
+
+from google.cloud import tasks_v2
+from google.cloud.tasks_v2.types import CreateTaskRequest, Task
+
+from serverlessWorkflow.task import CloudTasksDispatcher
+
+from concurrent import futures
+from statistics import mean, median
+from typing import Callable, List, Optional
+import time
+
+import grpc
+
+
+def start_fake_cloud_tasks_server(port: int = 0, on_create: Optional[Callable[[Task], None]] = None, latency: float = 0.0, max_workers: int = 8):
+    """
+    Starts an in-process gRPC server answering CloudTasks.CreateTask by echoing the task back,
+    rejecting names it has already seen like Cloud Tasks does. `on_create` is called with every
+    accepted task, `latency` seconds are waited before every answer. Returns the server and the
+    bound `host:port`.
+    """
+
+    names = set()
+
+    def create_task(request: CreateTaskRequest, context) -> Task:
+
+        if latency:
+
+            time.sleep(latency)
+
+        if request.task.name:
+
+            if request.task.name in names:
+
+                context.abort(grpc.StatusCode.ALREADY_EXISTS, f"Task {request.task.name} already exists.")
+
+            names.add(request.task.name)
+
+        if on_create is not None:
+
+            on_create(request.task)
+
+        return request.task
+
+    handler = grpc.method_handlers_generic_handler("google.cloud.tasks.v2.CloudTasks", {
+        "CreateTask": grpc.unary_unary_rpc_method_handler(
+            create_task,
+            request_deserializer=CreateTaskRequest.deserialize,
+            response_serializer=Task.serialize,
+        ),
+    })
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+    server.add_generic_rpc_handlers((handler,))
+
+    port = server.add_insecure_port(f"127.0.0.1:{port}")
+    server.start()
+
+    return server, f"127.0.0.1:{port}"
+
+
+class Command(BaseCommand):
+    help = "Measures per-enqueue latency of create_http_task against a local fake Cloud Tasks gRPC server, with a new client per call (before) and the pooled dispatcher (after)."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--iterations", type=int, default=500)
+
+    def report(self, label: str, samples: List[float]):
+
+        samples = sorted(samples)
+        p99     = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+        self.stdout.write(f"{label:<24} mean={mean(samples) * 1000:.3f}ms p50={median(samples) * 1000:.3f}ms p99={p99 * 1000:.3f}ms")
+
+    def handle(self, *args, **options):
+
+        iterations: int = options["iterations"]
+
+        server, target = start_fake_cloud_tasks_server()
+
+        try:
+
+            dispatcher = CloudTasksDispatcher("bench", "local", "bench-q", "bench@example.com", emulator_host=target)
+
+            # before: a brand new client / channel for every enqueue
+            samples = []
+
+            for _ in range(iterations):
+
+                start = time.perf_counter()
+
+                client = dispatcher._build_client()
+                client.create_task(request={"parent": dispatcher.queue_path(), "task": dispatcher.build_task("http://localhost/bench", payload={})})
+
+                samples.append(time.perf_counter() - start)
+
+                client.transport.close()
+
+            self.report("client per call", samples)
+
+            # after: the process-wide pooled client
+            samples = []
+
+            for _ in range(iterations):
+
+                start = time.perf_counter()
+
+                dispatcher.create_http_task("http://localhost/bench", payload={})
+
+                samples.append(time.perf_counter() - start)
+
+            self.report("pooled dispatcher", samples)
+
+        finally:
+
+            server.stop(None)
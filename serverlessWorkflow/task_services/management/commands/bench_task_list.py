@@ -0,0 +1,110 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.test import APIClient
+
+from task_services.choices import StatusChoices
+from task_services.models import Task, User
+
+from statistics import median
+from typing import Any, Dict, List
+from uuid import uuid4
+import time
+import tracemalloc
+
+
+class Command(BaseCommand):
+    help = "Seeds --tasks tasks with --response-kb KB responses and compares the latency and the Python memory peak of a task list page rendered by the serializers (before) and by Postgres with ?raw=true (after)."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--tasks", type=int, default=1000)
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--response-kb", type=int, default=50)
+        parser.add_argument("--iterations", type=int, default=50)
+
+    def response(self, size: int) -> Dict[str, Any]:
+
+        # many small objects, like the JSON responses of the nodes.
+        items = [{"index": index, "name": f"item-{index}", "value": index * 0.5, "tags": ["a", "b"]} for index in range(size // 70)]
+
+        return {"status_code": 200, "headers": {"Content-Type": "application/json"}, "data": {"items": items}}
+
+    def seed(self, user: User, tasks: int, size: int):
+
+        response = self.response(size)
+        root     = Task.objects.create(id=uuid4(), my_user=user, code=str(uuid4()), task_status=StatusChoices.COMPLETED)
+        node_ids = Task.objects.next_node_ids(tasks)
+
+        Task.objects.bulk_create([
+            Task(
+                id              = uuid4(),
+                parent_task     = root,
+                my_user         = user,
+                code            = f"{root.code},{uuid4()}",
+                task_status     = StatusChoices.COMPLETED,
+                request         = {"url": "https://localhost/", "method": "POST", "payload": None, "headers": {}},
+                response        = response,
+                immediate_next  = [{"url": "https://localhost/next", "method": "POST", "input_type": 0, "custom_input": None}],
+                node_id         = node_id,
+            )
+            for node_id in node_ids
+        ], batch_size=100)
+
+    def measure(self, client: APIClient, url: str, iterations: int) -> List[float]:
+
+        samples = []
+
+        for _ in range(iterations):
+
+            start       = time.perf_counter()
+            response    = client.get(url)
+
+            samples.append(time.perf_counter() - start)
+
+            if response.status_code != 200:
+
+                raise CommandError(f"{url}: {response.status_code} {response.content[:500]!r}")
+
+        return sorted(samples)
+
+    def peak(self, client: APIClient, url: str) -> int:
+
+        tracemalloc.start()
+
+        try:
+
+            client.get(url)
+
+            return tracemalloc.get_traced_memory()[1]
+
+        finally:
+
+            tracemalloc.stop()
+
+    def handle(self, *args, **options):
+
+        client  = APIClient()
+        user    = User.objects.create(email=f"bench-{uuid4()}@example.com", password=str(uuid4()), name="bench")
+
+        try:
+
+            self.seed(user, options["tasks"], options["response_kb"] * 1024)
+
+            url = f"/api/tasks/{user.id}?limit={options['page_size']}"
+
+            for label, mode in (("serializers", ""), ("raw", "&raw=true")):
+
+                # warm up, the first request builds the serializers and the connection.
+                client.get(url + mode)
+
+                samples = self.measure(client, url + mode, options["iterations"])
+                p99     = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+                size    = len(client.get(url + mode).content)
+
+                self.stdout.write(f"{label:<12} p50={median(samples) * 1000:.1f}ms p99={p99 * 1000:.1f}ms peak={self.peak(client, url + mode) / 1024 / 1024:.1f}MiB body={size / 1024 / 1024:.1f}MiB")
+
+        finally:
+
+            Task.objects.filter(my_user=user).delete()
+
+            user.delete()
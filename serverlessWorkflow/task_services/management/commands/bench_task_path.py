@@ -0,0 +1,140 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from itertools import count
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+import json
+import time
+
+
+# both layouts are temporary copies of the task table, they only differ by the path and node id columns.
+LAYOUTS: Dict[str, List[str]] = {
+    "before": [
+        "ALTER TABLE bench_path_before DROP COLUMN node_id, DROP COLUMN path, ADD COLUMN path uuid[]",
+        "ALTER TABLE bench_path_before ADD PRIMARY KEY (id)",
+        "CREATE UNIQUE INDEX ON bench_path_before (my_user_id, md5(code))",
+        "CREATE INDEX ON bench_path_before USING gin (path)",
+        "CREATE INDEX ON bench_path_before (parent_task_id)",
+    ],
+    "after": [
+        "ALTER TABLE bench_path_after ADD PRIMARY KEY (id)",
+        "CREATE UNIQUE INDEX ON bench_path_after (my_user_id, md5(code))",
+        "CREATE UNIQUE INDEX ON bench_path_after (node_id)",
+        "CREATE INDEX ON bench_path_after USING gin (path)",
+        "CREATE INDEX ON bench_path_after (parent_task_id)",
+    ],
+}
+
+COLUMNS = "id, parent_task_id, my_user_id, task_status, sub_task_status, code, path, depth, request, children_count, children_completed_count, children_errored_count, version, created_at, updated_at"
+
+
+class Command(BaseCommand):
+    help = "Inserts --chains chains of tasks --depths deep, one row per statement like tasks/init, into a copy of the task table with the uuid path (before) and with the node id path (after), both with comma joined codes,, and reports row size, index size and insert throughput."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--depths", type=int, nargs="+", default=[5, 20, 50])
+        parser.add_argument("--rows", type=int, default=10000, help="Rows inserted per layout and depth.")
+
+    def create(self, cursor, layout: str):
+
+        table = f"bench_path_{layout}"
+
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute(f"CREATE TEMP TABLE {table} (LIKE task_services_task INCLUDING DEFAULTS)")
+
+        for statement in LAYOUTS[layout]:
+
+            cursor.execute(statement)
+
+    def row(self, layout: str, user_id: Any, parent: Optional[Tuple[Any, str, List[Any]]], node_ids: count) -> Tuple[Tuple[Any, str, List[Any]], List[Any]]:
+
+        task_id = uuid4()
+
+        if layout == "before":
+
+            code    = parent[1] + f",{uuid4()}" if parent is not None else str(task_id)
+            path    = (parent[2] if parent is not None else []) + [task_id]
+            values  = [task_id, parent[0] if parent is not None else None, user_id, code, path]
+
+        else:
+
+            node_id = next(node_ids)
+            code    = parent[1] + f",{uuid4()}" if parent is not None else str(task_id)
+            path    = (parent[2] if parent is not None else []) + [node_id]
+            values  = [task_id, parent[0] if parent is not None else None, user_id, code, path, node_id]
+
+        return (task_id, code, path), values
+
+    def insert(self, cursor, layout: str, depth: int, rows: int) -> float:
+
+        table       = f"bench_path_{layout}"
+        node_ids    = count(1)
+        user_id     = uuid4()
+        request     = json.dumps({"url": "https://localhost/", "method": "POST", "payload": None, "headers": {}})
+
+        node_column = ", node_id" if layout == "after" else ""
+        node_value  = ", %s" if layout == "after" else ""
+
+        query = f"""
+            INSERT INTO {table} ({COLUMNS}{node_column})
+            VALUES (%s, %s, %s, 1, 1, %s, %s, %s, %s, 0, 0, 0, 0, now(), now(){node_value})
+        """
+
+        inserted    = 0
+        start       = time.perf_counter()
+
+        while inserted < rows:
+
+            parent = None
+
+            # one chain: a root and `depth` nested children.
+            for level in range(min(depth + 1, rows - inserted)):
+
+                parent, values = self.row(layout, user_id, parent, node_ids)
+
+                cursor.execute(query, values[:5] + [level, request] + values[5:])
+
+                inserted += 1
+
+        return time.perf_counter() - start
+
+    def report(self, cursor, layout: str, depth: int, rows: int, elapsed: float):
+
+        table = f"bench_path_{layout}"
+
+        cursor.execute(f"""
+            SELECT
+                avg(pg_column_size(t.*))::int,
+                max(pg_column_size(t.*)) FILTER (WHERE depth = %s),
+                avg(pg_column_size(code) + pg_column_size(path))::int,
+                pg_table_size('{table}'),
+                pg_indexes_size('{table}')
+            FROM {table} AS t
+        """, [depth])
+
+        avg_row, deepest_row, avg_code_path, table_size, indexes_size = cursor.fetchone()
+
+        self.stdout.write(
+            f"{layout:<6} depth={depth:<3} rows={rows} avg_row={avg_row}B deepest_row={deepest_row}B code+path={avg_code_path}B "
+            f"table={table_size // 1024}KiB indexes={indexes_size // 1024}KiB insert={rows / elapsed:.0f} rows/s"
+        )
+
+    def handle(self, *args, **options):
+
+        rows: int = options["rows"]
+
+        with connection.cursor() as cursor:
+
+            for depth in options["depths"]:
+
+                for layout in LAYOUTS:
+
+                    self.create(cursor, layout)
+
+                    elapsed = self.insert(cursor, layout, depth, rows)
+
+                    self.report(cursor, layout, depth, rows, elapsed)
+
+                    cursor.execute(f"DROP TABLE bench_path_{layout}")
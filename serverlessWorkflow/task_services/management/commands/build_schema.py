@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from serverlessWorkflow.schema import render_schema, write_schema
+
+
+class Command(BaseCommand):
+    help = "Generates the OpenAPI schema once, in every format served by api/schema/, and writes it plain and gzipped to --output with a manifest naming the version it has been built for. Run at build time, before the image is built."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--output", default=settings.SCHEMA_ROOT)
+
+    def handle(self, *args, **options):
+
+        built       = render_schema()
+        manifest    = write_schema(options["output"], built)
+
+        for name, schema in built.items():
+
+            self.stdout.write(f"schema.{name:<6} {len(schema.body):>8} bytes, gzipped {len(schema.gzipped):>7} bytes, etag {schema.etag}")
+
+        self.stdout.write(f"Schema of version {manifest['version']} written to {options['output']}.")
@@ -0,0 +1,159 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from serverlessWorkflow.task import cloud_tasks_dispatcher_from_settings, DispatchResult
+from task_services.models import OutboxTask
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import List, Optional
+import math
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Command(BaseCommand):
+    help = (
+        "Drains OutboxTask rows written by the outbox dispatcher backend. "
+        "`--mode cloud_tasks` forwards them to Cloud Tasks, `--mode http` performs the HTTP calls itself "
+        "which makes it a local stand-in for Cloud Tasks."
+    )
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--mode", choices=["cloud_tasks", "http"], default="http")
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--concurrency", type=int, default=settings.CLOUD_TASKS_DISPATCH_CONCURRENCY)
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when there is nothing due.")
+        parser.add_argument("--timeout", type=float, default=600.0, help="Timeout of a single HTTP call in http mode.")
+        parser.add_argument("--max-backoff", type=int, default=3600, help="Upper bound in seconds of the retry delay of a failed row.")
+        parser.add_argument("--lease", type=float, default=None, help="Seconds a batch is leased to this worker, by default long enough for every call of the batch to time out.")
+        parser.add_argument("--once", action="store_true", help="Drain until nothing is due and exit.")
+
+    def handle(self, *args, **options):
+
+        self.mode: str              = options["mode"]
+        self.timeout: float         = options["timeout"]
+        self.max_backoff: int       = options["max_backoff"]
+        concurrency: int            = max(1, options["concurrency"])
+
+        # rows of a worker which died are delivered again once their lease is over.
+        self.lease: float           = options["lease"] or self.timeout * math.ceil(options["batch_size"] / concurrency) + 60
+
+        self.executor               = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="outbox")
+
+        if self.mode == "cloud_tasks":
+
+            self.dispatcher = cloud_tasks_dispatcher_from_settings()
+
+        else:
+
+            # one pooled session shared by every delivery thread.
+            self.session = requests.Session()
+
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=concurrency)
+
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+
+        while True:
+
+            delivered = self.drain_batch(options["batch_size"])
+
+            if delivered == 0:
+
+                if options["once"]:
+
+                    break
+
+                # nothing due, or everything due keeps failing.
+                time.sleep(options["poll_interval"])
+
+    def lease_batch(self, batch_size: int) -> List[OutboxTask]:
+        """
+        Takes up to `batch_size` rows, moves their `scheduled_at` past the lease and counts the
+        attempt, and commits. Other workers skip them until the lease is over, no lock is held
+        while they are delivered.
+        """
+
+        with transaction.atomic():
+
+            now = timezone.now()
+
+            queryset = OutboxTask.objects.select_for_update(skip_locked=True).order_by("scheduled_at")
+
+            # Cloud Tasks takes care of the delay itself, rows can be forwarded before they are due.
+            if self.mode == "http":
+
+                queryset = queryset.filter(scheduled_at__lte=now)
+
+            rows: List[OutboxTask] = list(queryset[:batch_size])
+
+            if rows:
+
+                OutboxTask.objects.filter(id__in=[row.id for row in rows]).update(
+                    attempts        = F("attempts") + 1,
+                    scheduled_at    = Greatest(F("scheduled_at"), now + timedelta(seconds=self.lease)),
+                )
+
+        return rows
+
+    def drain_batch(self, batch_size: int) -> int:
+
+        rows = self.lease_batch(batch_size)
+
+        if not rows:
+
+            return 0
+
+        results = list(self.executor.map(self.deliver, range(len(rows)), rows))
+
+        delivered   = [rows[result.index].id for result in results if result.ok]
+        failed      = [result for result in results if not result.ok]
+
+        # a second short transaction, the delivered rows go and the failed ones are rescheduled with a backoff.
+        with transaction.atomic():
+
+            OutboxTask.objects.filter(id__in=delivered).delete()
+
+            for result in failed:
+
+                row = rows[result.index]
+
+                OutboxTask.objects.filter(id=row.id).update(
+                    last_error      = str(result.error),
+                    scheduled_at    = timezone.now() + timedelta(seconds=min(self.max_backoff, 2 ** row.attempts)),
+                )
+
+        self.stdout.write(f"delivered={len(delivered)} failed={len(failed)}")
+
+        return len(delivered)
+
+    def deliver(self, index: int, row: OutboxTask) -> DispatchResult:
+
+        try:
+
+            if self.mode == "cloud_tasks":
+
+                # `row` was read before the lease, its `scheduled_at` is still the requested one.
+                in_seconds: Optional[int] = max(0, int((row.scheduled_at - timezone.now()).total_seconds())) or None
+
+                payload = bytes(row.body).decode() if row.body is not None else None
+
+                return DispatchResult(index, self.dispatcher.create_http_task(row.url, payload=payload, method=row.method, headers=row.headers, queue=row.queue, in_seconds=in_seconds, task_name=row.name), None)
+
+            response = self.session.request(row.method, row.url, data=bytes(row.body) if row.body is not None else None, headers=row.headers, timeout=self.timeout)
+
+            response.raise_for_status()
+
+            return DispatchResult(index, None, None)
+
+        except Exception as exc:
+
+            return DispatchResult(index, None, exc)
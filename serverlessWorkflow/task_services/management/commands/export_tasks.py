@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from querybuilder import querybuilder
+
+from task_services.models import Task
+from task_services.serializers.task import ListTaskSerializer
+from task_services.views.task import TaskListAPIView
+
+import sys
+
+
+class Command(BaseCommand):
+    help = "Writes every task of a user as NDJSON, one task per line, oldest first, like tasks/export/<my_user>. --query takes the filters of the task list as a query string."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("my_user")
+        parser.add_argument("--query", default="", help="Filters of the task list, e.g. 'task_status=2&code.startswith=registration'.")
+        parser.add_argument("--fields", default="", help="Comma separated fields, every field by default.")
+        parser.add_argument("--output", default="-", help="File to write, stdout by default.")
+        parser.add_argument("--chunk-size", type=int, default=settings.TASK_EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+
+        fields  = [name.strip() for name in options["fields"].split(",") if name.strip()] or ListTaskSerializer.Meta.fields
+        unknown = set(fields) - set(ListTaskSerializer.Meta.fields)
+
+        if unknown:
+
+            raise CommandError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+
+        queries = querybuilder(Task.objects.filter(my_user=options["my_user"]), QueryDict(options["query"]), TaskListAPIView.valid_pairs)
+
+        if queries is False:
+
+            raise CommandError("Invalid query.")
+
+        queryset = queries.get("queryset").order_by("created_at", "id")
+
+        output = sys.stdout.buffer if options["output"] == "-" else open(options["output"], "wb")
+
+        try:
+
+            for chunk in queryset.iter_ndjson(fields, chunk_size=options["chunk_size"]):
+
+                output.write(chunk)
+
+        finally:
+
+            if output is not sys.stdout.buffer:
+
+                output.close()
@@ -0,0 +1,192 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from task_services.management.commands.bench_dispatch import start_fake_cloud_tasks_server
+from task_services.models import User
+
+from concurrent import futures
+from http.client import HTTPConnection
+from typing import Any, Dict, List, Tuple
+from uuid import uuid4
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+
+SERVERS = {
+    # the command line of gunicorn/Dockerfile.
+    "wsgi": ["--threads", "{threads}", "serverlessWorkflow.wsgi:application"],
+    "asgi": ["--worker-class", "uvicorn.workers.UvicornWorker", "serverlessWorkflow.asgi:application"],
+}
+
+
+class Command(BaseCommand):
+    help = "Runs the init, complete and check requests of --clients concurrent clients for --duration seconds against gunicorn with threaded WSGI workers and against uvicorn workers serving the async views, Cloud Tasks answering after --latency seconds, and reports the throughput and latency percentiles of both."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--server", choices=["wsgi", "asgi", "both"], default="both")
+        parser.add_argument("--clients", type=int, default=64)
+        parser.add_argument("--duration", type=float, default=20.0)
+        parser.add_argument("--workers", type=int, default=1)
+        parser.add_argument("--threads", type=int, default=8, help="Threads per WSGI worker.")
+        parser.add_argument("--latency", type=float, default=0.05, help="Seconds the fake Cloud Tasks server waits before every answer.")
+        parser.add_argument("--port", type=int, default=0)
+
+    def free_port(self) -> int:
+
+        with socket.socket() as sock:
+
+            sock.bind(("127.0.0.1", 0))
+
+            return sock.getsockname()[1]
+
+    def start_server(self, server: str, port: int, target: str, options: Dict[str, Any]) -> subprocess.Popen:
+
+        env = {
+            **os.environ,
+            "CLOUD_TASKS_EMULATOR_HOST": target,
+            "TASK_DISPATCHER_BACKEND": "cloud_tasks",
+            "TASK_CHECK_PROPAGATION": "async",
+            "TASK_ASYNC_VIEWS": str(server == "asgi"),
+        }
+
+        args = [arg.format(threads=options["threads"]) for arg in SERVERS[server]]
+
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", str(options["workers"]), "--timeout", "0", "--log-level", "warning", *args],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+
+        deadline = time.monotonic() + 30
+
+        while time.monotonic() < deadline:
+
+            if process.poll() is not None:
+
+                raise CommandError(f"{server} server exited with status {process.returncode}.")
+
+            try:
+
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+
+                return process
+
+            except OSError:
+
+                time.sleep(0.2)
+
+        process.kill()
+
+        raise CommandError(f"{server} server did not start listening on port {port}.")
+
+    def request(self, connection: HTTPConnection, method: str, url: str, body: Any, expected_status: int) -> float:
+
+        start = time.perf_counter()
+
+        connection.request(method, url, body=json.dumps(body), headers={"Content-Type": "application/json"})
+
+        response = connection.getresponse()
+        content  = response.read()
+
+        elapsed = time.perf_counter() - start
+
+        if response.status != expected_status:
+
+            raise CommandError(f"{method} {url}: expected status {expected_status}, got {response.status} {content[:500]!r}")
+
+        return elapsed
+
+    def client(self, port: int, user: User, deadline: float) -> List[Tuple[str, float]]:
+
+        connection  = HTTPConnection("127.0.0.1", port, timeout=60)
+        samples     = []
+        root        = str(uuid4())
+
+        request = {"url": "https://localhost/", "method": "POST", "payload": None, "headers": {}}
+
+        self.request(connection, "POST", f"/api/tasks/init/{user.id}", {"id": root, "my_user": str(user.id), "parent_task": None, "code": root, "request": request}, 201)
+
+        while time.monotonic() < deadline:
+
+            child = str(uuid4())
+
+            samples.append(("init", self.request(connection, "POST", f"/api/tasks/init/{user.id}", {"id": child, "my_user": str(user.id), "parent_task": root, "request": request}, 201)))
+
+            # two immediate_next entries are enqueued by the complete, the check enqueues the check of the root.
+            samples.append(("complete", self.request(connection, "PUT", f"/api/tasks/complete/{user.id}/{child}", {
+                "id": child,
+                "my_user": str(user.id),
+                "parent_task": root,
+                "response": {"status_code": 200, "headers": {}, "data": None},
+                "immediate_next": [{"url": "https://localhost/next", "method": "POST", "input_type": 0, "custom_input": None}] * 2,
+                "sub_task_next": [],
+            }, 200)))
+
+            samples.append(("check", self.request(connection, "PUT", f"/api/tasks/check/{user.id}/{child}", None, 200)))
+
+        connection.close()
+
+        return samples
+
+    def report(self, label: str, samples: List[float], duration: float):
+
+        samples = sorted(samples)
+
+        p50 = samples[len(samples) // 2]
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+        self.stdout.write(f"{label:<16} requests={len(samples):<7} rps={len(samples) / duration:<9.1f} p50={p50 * 1000:.1f}ms p99={p99 * 1000:.1f}ms")
+
+    def run(self, server: str, target: str, options: Dict[str, Any]):
+
+        port    = options["port"] or self.free_port()
+        process = self.start_server(server, port, target, options)
+        user    = User.objects.create(email=f"load-{uuid4()}@example.com", password=str(uuid4()), name="load")
+
+        try:
+
+            deadline = time.monotonic() + options["duration"]
+            start    = time.perf_counter()
+
+            with futures.ThreadPoolExecutor(max_workers=options["clients"]) as executor:
+
+                results = list(executor.map(lambda _: self.client(port, user, deadline), range(options["clients"])))
+
+            duration = time.perf_counter() - start
+            samples  = [sample for result in results for sample in result]
+
+            self.stdout.write(f"{server} ({options['clients']} clients, {options['duration']:.0f}s, Cloud Tasks latency {options['latency'] * 1000:.0f}ms)")
+
+            self.report("all", [elapsed for _, elapsed in samples], duration)
+
+            for label in ("init", "complete", "check"):
+
+                self.report(label, [elapsed for name, elapsed in samples if name == label], duration)
+
+        finally:
+
+            process.terminate()
+            process.wait()
+
+            user.delete()
+
+    def handle(self, *args, **options):
+
+        # every request handled by a client thread waits on the server, a gRPC thread per client keeps Cloud Tasks from queueing.
+        server, target = start_fake_cloud_tasks_server(latency=options["latency"], max_workers=options["clients"] * 4)
+
+        try:
+
+            for name in (["wsgi", "asgi"] if options["server"] == "both" else [options["server"]]):
+
+                self.run(name, target, options)
+
+        finally:
+
+            server.stop(None)
@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from collections import defaultdict
+from statistics import median
+from typing import Dict, List, Tuple
+import json
+import os
+import subprocess
+import sys
+
+
+# imported on the first dispatch or the first schema request, never by a cold start.
+DEFERRED_MODULES = (
+    "google.cloud.tasks_v2",
+    "google.api_core",
+    "google.protobuf",
+    "grpc",
+)
+
+# a fresh interpreter loading the app like a gunicorn worker does, then serving one request.
+STARTUP = """
+import json, os, sys, time
+
+start = time.perf_counter()
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "serverlessWorkflow.settings")
+
+from django.urls import get_resolver
+
+from serverlessWorkflow.wsgi import application
+
+get_resolver().url_patterns
+
+ready = time.perf_counter()
+
+from wsgiref.util import setup_testing_defaults
+
+environ = {"PATH_INFO": "/api/choices", "REQUEST_METHOD": "GET"}
+
+setup_testing_defaults(environ)
+
+statuses = []
+
+b"".join(application(environ, lambda status, headers: statuses.append(status)))
+
+served = time.perf_counter()
+
+print(json.dumps({
+    "startup_ms": (ready - start) * 1000,
+    "first_request_ms": (served - ready) * 1000,
+    "status": statuses[0],
+    "deferred": [name for name in json.loads(sys.argv[1]) if name in sys.modules],
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Starts the app in fresh interpreters with -X importtime, reports the startup and first request times and the packages which take the most import time, and fails with --check when a module which should be imported lazily is imported at startup."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--top", type=int, default=15)
+        parser.add_argument("--check", action="store_true", help="Fail when one of the deferred modules is imported at startup.")
+
+    def run_once(self) -> Tuple[Dict, List[Tuple[str, int, int]]]:
+
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP, json.dumps(DEFERRED_MODULES)],
+            cwd=settings.BASE_DIR,
+            env=os.environ.copy(),
+            capture_output=True,
+            text=True,
+        )
+
+        if process.returncode != 0:
+
+            raise CommandError(f"The app could not start:\n{process.stderr[-2000:]}")
+
+        imports = []
+
+        # import time: self [us] | cumulative | imported package
+        for line in process.stderr.splitlines():
+
+            if not line.startswith("import time:") or "self [us]" in line:
+
+                continue
+
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+
+            imports.append((name.strip(), int(self_us), int(cumulative_us)))
+
+        return json.loads(process.stdout.strip().splitlines()[-1]), imports
+
+    def package(self, name: str) -> str:
+
+        parts = name.split(".")
+
+        # google.* are namespace packages, their second level is the library.
+        return ".".join(parts[:3] if parts[0] == "google" else parts[:1])
+
+    def handle(self, *args, **options):
+
+        runs        = [self.run_once() for _ in range(options["runs"])]
+        reports     = [report for report, _ in runs]
+        packages    = defaultdict(list)
+
+        for _, imports in runs:
+
+            totals = defaultdict(int)
+
+            for name, self_us, _ in imports:
+
+                totals[self.package(name)] += self_us
+
+            for package, total in totals.items():
+
+                packages[package].append(total)
+
+        self.stdout.write(f"startup       p50={median(report['startup_ms'] for report in reports):.1f}ms over {len(reports)} runs")
+        self.stdout.write(f"first request p50={median(report['first_request_ms'] for report in reports):.1f}ms ({reports[0]['status']})")
+
+        self.stdout.write("import time by package, self time summed over its modules:")
+
+        for package, totals in sorted(packages.items(), key=lambda item: -median(item[1]))[:options["top"]]:
+
+            self.stdout.write(f"  {package:<40} {median(totals) / 1000:.1f}ms")
+
+        deferred = sorted({name for report in reports for name in report["deferred"]})
+
+        if deferred:
+
+            message = f"Imported at startup instead of on first use: {', '.join(deferred)}"
+
+            if options["check"]:
+
+                raise CommandError(message)
+
+            self.stdout.write(message)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from serverlessWorkflow.payload_store import purge_payloads
+
+
+class Command(BaseCommand):
+    help = "Removes the offloaded payloads which have not been offloaded again for PAYLOAD_TTL seconds, their signed urls have expired."
+
+    def handle(self, *args, **options):
+
+        removed = purge_payloads()
+
+        self.stdout.write(f"Removed {removed} payloads.")
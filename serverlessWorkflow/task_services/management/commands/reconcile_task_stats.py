@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from task_services.models import Task, WorkflowStats
+
+
+class Command(BaseCommand):
+    help = "Counts the tasks of every workflow again from the task table, in batches of root tasks, and corrects the workflow counts which differ."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--batch-size", type=int, default=1000, help="Root tasks per transaction.")
+        parser.add_argument("--user", default=None, help="Only the workflows of this user.")
+
+    def handle(self, *args, **options):
+
+        batch_size: int = options["batch_size"]
+
+        roots = Task.objects.filter(parent_task__isnull=True).order_by("node_id")
+
+        if options["user"]:
+
+            roots = roots.filter(my_user=options["user"])
+
+        last_node_id    = None
+        workflows       = 0
+        corrected       = 0
+
+        while True:
+
+            queryset = roots if last_node_id is None else roots.filter(node_id__gt=last_node_id)
+
+            node_ids = list(queryset.values_list("node_id", flat=True)[:batch_size])
+
+            if not node_ids:
+
+                break
+
+            # one short transaction per batch, the counts rows of the batch are locked until it commits.
+            with transaction.atomic():
+
+                corrected += WorkflowStats.objects.reconcile(node_ids)
+
+            workflows       += len(node_ids)
+            last_node_id    = node_ids[-1]
+
+        self.stdout.write(f"Reconciled {workflows} workflows, corrected the counts of {corrected}.")
@@ -0,0 +1,33 @@
+# Generated by Django 4.0.4 on 2026-10-18 16:06
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_services', '0007_remove_task_unique_user-code_task_unique_user-code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField(null=True, unique=True)),
+                ('queue', models.TextField()),
+                ('url', models.TextField()),
+                ('method', models.CharField(max_length=20)),
+                ('headers', models.JSONField(null=True)),
+                ('body', models.BinaryField(null=True)),
+                ('scheduled_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scheduled_at'], name='OutboxTask_Scheduled-At')],
+            },
+        ),
+    ]
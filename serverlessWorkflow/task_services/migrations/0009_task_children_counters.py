@@ -0,0 +1,48 @@
+# Generated by Django 4.0.4 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+# Same aggregation as `manage.py backfill_task_counters`, in one statement.
+BACKFILL_COUNTERS = """
+UPDATE task_services_task AS task
+SET children_count = children.registered,
+    children_completed_count = children.completed,
+    children_errored_count = children.errored
+FROM (
+    SELECT parent_task_id,
+           COUNT(*) AS registered,
+           COUNT(*) FILTER (WHERE task_status = 1 AND sub_task_status = 1) AS completed,
+           COUNT(*) FILTER (WHERE task_status = 2) AS errored
+    FROM task_services_task
+    WHERE parent_task_id IS NOT NULL
+    GROUP BY parent_task_id
+) AS children
+WHERE task.id = children.parent_task_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_services', '0008_outboxtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='children_completed_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='children_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='children_errored_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(BACKFILL_COUNTERS, migrations.RunSQL.noop, elidable=True),
+    ]
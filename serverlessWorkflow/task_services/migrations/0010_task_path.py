@@ -0,0 +1,25 @@
+# Generated by Django 4.0.4 on 2026-10-18 16:11
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_services', '0009_task_children_counters'),
+    ]
+
+    operations = [
+        # nullable column and constant default, both are metadata only changes without a table rewrite.
+        migrations.AddField(
+            model_name='task',
+            name='depth',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='path',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.UUIDField(), null=True, size=None),
+        ),
+    ]
@@ -0,0 +1,58 @@
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+BATCH_SIZE = 5000
+
+# roots first, then every level whose parent already has a path.
+BACKFILL_ROOTS = """
+UPDATE task_services_task SET path = ARRAY[id], depth = 0
+WHERE id IN (
+    SELECT id FROM task_services_task WHERE path IS NULL AND parent_task_id IS NULL LIMIT %s
+)
+"""
+
+BACKFILL_CHILDREN = """
+UPDATE task_services_task AS task SET path = parent.path || task.id, depth = parent.depth + 1
+FROM task_services_task AS parent
+WHERE task.parent_task_id = parent.id AND task.id IN (
+    SELECT child.id FROM task_services_task AS child
+    JOIN task_services_task AS child_parent ON child.parent_task_id = child_parent.id
+    WHERE child.path IS NULL AND child_parent.path IS NOT NULL
+    LIMIT %s
+)
+"""
+
+
+def backfill_path(apps, schema_editor):
+
+    # non atomic migration, every batch is committed on its own and only locks its rows.
+    with schema_editor.connection.cursor() as cursor:
+
+        for statement in (BACKFILL_ROOTS, BACKFILL_CHILDREN):
+
+            while True:
+
+                cursor.execute(statement, [BATCH_SIZE])
+
+                if cursor.rowcount == 0:
+
+                    break
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('task_services', '0010_task_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_path, migrations.RunPython.noop, elidable=True),
+        AddIndexConcurrently(
+            model_name='task',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['path'], name='Task_Path-Gin'),
+        ),
+    ]
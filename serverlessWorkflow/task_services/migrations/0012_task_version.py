@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_services', '0011_task_path_backfill'),
+    ]
+
+    operations = [
+        # constant default, a metadata only change without a table rewrite.
+        migrations.AddField(
+            model_name='task',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
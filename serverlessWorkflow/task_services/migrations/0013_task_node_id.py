@@ -0,0 +1,201 @@
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+BATCH_SIZE = 5000
+
+# the column default is set after the column is added, existing rows are numbered in batches instead of by a table rewrite.
+ADD_COLUMNS = """
+CREATE SEQUENCE IF NOT EXISTS task_services_task_node_id_seq AS bigint;
+ALTER TABLE task_services_task ADD COLUMN node_id bigint NULL, ADD COLUMN node_path bigint[] NULL;
+ALTER TABLE task_services_task ALTER COLUMN node_id SET DEFAULT nextval('task_services_task_node_id_seq');
+ALTER SEQUENCE task_services_task_node_id_seq OWNED BY task_services_task.node_id;
+"""
+
+# new children get the code of their root, only the codes of the roots stay unique.
+REPLACE_CODE_CONSTRAINT = [
+    """CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "Unique_User-Root-Code" ON task_services_task (my_user_id, md5(code)) WHERE parent_task_id IS NULL""",
+    """DROP INDEX CONCURRENTLY IF EXISTS "Unique_User-Code\"""",
+]
+
+BACKFILL_NODE_IDS = """
+UPDATE task_services_task SET node_id = nextval('task_services_task_node_id_seq')
+WHERE id IN (
+    SELECT id FROM task_services_task WHERE node_id IS NULL LIMIT %s
+)
+"""
+
+# roots first, then every level whose parent already has a path. The codes of the existing children are kept.
+BACKFILL_ROOTS = """
+UPDATE task_services_task SET node_path = ARRAY[node_id], depth = 0
+WHERE id IN (
+    SELECT id FROM task_services_task WHERE node_path IS NULL AND parent_task_id IS NULL LIMIT %s
+)
+"""
+
+BACKFILL_CHILDREN = """
+UPDATE task_services_task AS task SET node_path = parent.node_path || task.node_id, depth = parent.depth + 1
+FROM task_services_task AS parent
+WHERE task.parent_task_id = parent.id AND task.id IN (
+    SELECT child.id FROM task_services_task AS child
+    JOIN task_services_task AS child_parent ON child.parent_task_id = child_parent.id
+    WHERE child.node_path IS NULL AND child_parent.node_path IS NOT NULL
+    LIMIT %s
+)
+"""
+
+ADD_INDEXES = [
+    """CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "Unique_Node-Id" ON task_services_task (node_id)""",
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS "Task_Node_Path-Gin" ON task_services_task USING gin (node_path)""",
+]
+
+# SET NOT NULL skips its table scan when a validated check constraint already proves it. The
+# constraint is added without a scan, then validated under a lock which does not block reads and writes.
+ADD_NOT_NULL_CHECK = """
+ALTER TABLE task_services_task ADD CONSTRAINT "Task_Node_Id-Not-Null" CHECK (node_id IS NOT NULL) NOT VALID;
+"""
+
+VALIDATE_NOT_NULL_CHECK = """
+ALTER TABLE task_services_task VALIDATE CONSTRAINT "Task_Node_Id-Not-Null";
+"""
+
+DROP_NOT_NULL_CHECK = """
+ALTER TABLE task_services_task DROP CONSTRAINT IF EXISTS "Task_Node_Id-Not-Null";
+"""
+
+# the uuid path is replaced by the node id path under its former name.
+SWAP_PATH = """
+ALTER TABLE task_services_task ALTER COLUMN node_id SET NOT NULL;
+ALTER TABLE task_services_task DROP CONSTRAINT "Task_Node_Id-Not-Null";
+ALTER TABLE task_services_task ADD CONSTRAINT "Unique_Node-Id" UNIQUE USING INDEX "Unique_Node-Id";
+DROP INDEX IF EXISTS "Task_Path-Gin";
+ALTER TABLE task_services_task DROP COLUMN path;
+ALTER TABLE task_services_task RENAME COLUMN node_path TO path;
+ALTER INDEX "Task_Node_Path-Gin" RENAME TO "Task_Path-Gin";
+"""
+
+# reverse: the uuid path is rebuilt and the children sharing the code of their root get a comma joined code again.
+UNSWAP_PATH = """
+ALTER INDEX "Task_Path-Gin" RENAME TO "Task_Node_Path-Gin";
+ALTER TABLE task_services_task RENAME COLUMN path TO node_path;
+ALTER TABLE task_services_task ADD COLUMN path uuid[] NULL;
+ALTER TABLE task_services_task DROP CONSTRAINT "Unique_Node-Id";
+ALTER TABLE task_services_task ALTER COLUMN node_id DROP NOT NULL;
+"""
+
+DROP_INDEXES = [
+    """DROP INDEX CONCURRENTLY IF EXISTS "Unique_Node-Id\"""",
+    """DROP INDEX CONCURRENTLY IF EXISTS "Task_Node_Path-Gin\"""",
+]
+
+UNBACKFILL_ROOTS = """
+UPDATE task_services_task SET path = ARRAY[id]
+WHERE id IN (
+    SELECT id FROM task_services_task WHERE path IS NULL AND parent_task_id IS NULL LIMIT %s
+)
+"""
+
+UNBACKFILL_CHILDREN = """
+UPDATE task_services_task AS task SET path = parent.path || task.id,
+    code = CASE WHEN task.code = root.code THEN parent.code || ',' || gen_random_uuid() ELSE task.code END
+FROM task_services_task AS parent, task_services_task AS root
+WHERE task.parent_task_id = parent.id AND root.node_id = task.node_path[1] AND task.id IN (
+    SELECT child.id FROM task_services_task AS child
+    JOIN task_services_task AS child_parent ON child.parent_task_id = child_parent.id
+    WHERE child.path IS NULL AND child_parent.path IS NOT NULL
+    LIMIT %s
+)
+"""
+
+RESTORE_CODE_CONSTRAINT = [
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS "Task_Path-Gin" ON task_services_task USING gin (path)""",
+    """CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "Unique_User-Code" ON task_services_task (my_user_id, md5(code))""",
+    """DROP INDEX CONCURRENTLY IF EXISTS "Unique_User-Root-Code\"""",
+]
+
+DROP_COLUMNS = """
+ALTER TABLE task_services_task DROP COLUMN node_id, DROP COLUMN node_path;
+DROP SEQUENCE IF EXISTS task_services_task_node_id_seq;
+"""
+
+
+def run(statements):
+
+    def forwards(apps, schema_editor):
+
+        with schema_editor.connection.cursor() as cursor:
+
+            for statement in statements:
+
+                cursor.execute(statement)
+
+    return forwards
+
+
+def in_batches(*statements):
+
+    def forwards(apps, schema_editor):
+
+        # non atomic migration, every batch is committed on its own and only locks its rows.
+        with schema_editor.connection.cursor() as cursor:
+
+            for statement in statements:
+
+                while True:
+
+                    cursor.execute(statement, [BATCH_SIZE])
+
+                    if cursor.rowcount == 0:
+
+                        break
+
+    return forwards
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('task_services', '0012_task_version'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(ADD_COLUMNS, DROP_COLUMNS),
+                migrations.RunPython(run(REPLACE_CODE_CONSTRAINT), run(RESTORE_CODE_CONSTRAINT[1:])),
+                migrations.RunPython(in_batches(BACKFILL_NODE_IDS, BACKFILL_ROOTS, BACKFILL_CHILDREN), in_batches(UNBACKFILL_ROOTS, UNBACKFILL_CHILDREN), elidable=True),
+                migrations.RunPython(run(ADD_INDEXES), run(DROP_INDEXES + RESTORE_CODE_CONSTRAINT[:1])),
+                migrations.RunSQL(ADD_NOT_NULL_CHECK, DROP_NOT_NULL_CHECK),
+                migrations.RunSQL(VALIDATE_NOT_NULL_CHECK, migrations.RunSQL.noop),
+                migrations.RunSQL(SWAP_PATH, UNSWAP_PATH),
+            ],
+            state_operations=[
+                migrations.RemoveConstraint(
+                    model_name='task',
+                    name='Unique_User-Code',
+                ),
+                migrations.AddField(
+                    model_name='task',
+                    name='node_id',
+                    field=models.BigIntegerField(),
+                ),
+                migrations.AlterField(
+                    model_name='task',
+                    name='path',
+                    field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), null=True, size=None),
+                ),
+                migrations.AddConstraint(
+                    model_name='task',
+                    constraint=models.UniqueConstraint(models.F('my_user'), django.db.models.functions.text.MD5('code'), condition=models.Q(('parent_task__isnull', True)), name='Unique_User-Root-Code'),
+                ),
+                migrations.AddConstraint(
+                    model_name='task',
+                    constraint=models.UniqueConstraint(fields=('node_id',), name='Unique_Node-Id'),
+                ),
+            ],
+        ),
+    ]
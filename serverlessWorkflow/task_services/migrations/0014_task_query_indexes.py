@@ -0,0 +1,72 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+# the composite indexes start with the foreign keys, their own indexes are dropped once the composite ones exist.
+DROP_FOREIGN_KEY_INDEXES = [
+    """DROP INDEX CONCURRENTLY IF EXISTS task_services_task_my_user_id_97806052""",
+    """DROP INDEX CONCURRENTLY IF EXISTS task_services_task_parent_task_id_64a8bf80""",
+]
+
+
+# reverse: the foreign key indexes are created again before the composite ones are removed.
+CREATE_FOREIGN_KEY_INDEXES = [
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS task_services_task_my_user_id_97806052 ON task_services_task (my_user_id)""",
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS task_services_task_parent_task_id_64a8bf80 ON task_services_task (parent_task_id)""",
+]
+
+
+def run(statements):
+
+    def forwards(apps, schema_editor):
+
+        with schema_editor.connection.cursor() as cursor:
+
+            for statement in statements:
+
+                cursor.execute(statement)
+
+    return forwards
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('task_services', '0013_task_node_id'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(fields=['my_user', '-created_at', '-id'], name='Task_User-Created'),
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(fields=['parent_task', 'created_at', 'id'], name='Task_Parent-Created'),
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(condition=models.Q(('task_status', 1), _negated=True), fields=['my_user', 'task_status', '-created_at'], name='Task_User-Open-Status'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(run(DROP_FOREIGN_KEY_INDEXES), run(CREATE_FOREIGN_KEY_INDEXES)),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='task',
+                    name='my_user',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to=settings.AUTH_USER_MODEL),
+                ),
+                migrations.AlterField(
+                    model_name='task',
+                    name='parent_task',
+                    field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sub_task', to='task_services.task'),
+                ),
+            ],
+        ),
+    ]
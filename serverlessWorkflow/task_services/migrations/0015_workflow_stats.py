@@ -0,0 +1,42 @@
+# Generated by Django 4.0.4 on 2026-10-18 16:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Same counts as `manage.py reconcile_task_stats`, in one statement.
+BACKFILL_STATS = """
+INSERT INTO task_services_workflowstats (root_node_id, my_user_id, pending_count, completed_count, errored_count, updated_at)
+SELECT path[1], my_user_id,
+       COUNT(*) FILTER (WHERE task_status = 0),
+       COUNT(*) FILTER (WHERE task_status = 1),
+       COUNT(*) FILTER (WHERE task_status = 2),
+       now()
+FROM task_services_task
+WHERE path IS NOT NULL
+GROUP BY path[1], my_user_id
+ON CONFLICT (root_node_id) DO NOTHING
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_services', '0014_task_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkflowStats',
+            fields=[
+                ('root', models.OneToOneField(db_column='root_node_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='task_services.task', to_field='node_id')),
+                ('pending_count', models.IntegerField(default=0)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('errored_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('my_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workflow_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunSQL(BACKFILL_STATS, migrations.RunSQL.noop, elidable=True),
+    ]
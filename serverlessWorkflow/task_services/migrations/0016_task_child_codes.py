@@ -0,0 +1,95 @@
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+BATCH_SIZE = 5000
+
+# children registered since 0013 got the code of their root, they get a comma joined code again,
+# one level at a time so the code of their parent is already the final one.
+MAX_DEPTH = """
+SELECT coalesce(max(depth), 0) FROM task_services_task
+"""
+
+RESTORE_CHILD_CODES = """
+UPDATE task_services_task AS task SET code = parent.code || ',' || gen_random_uuid()
+FROM task_services_task AS parent
+WHERE task.parent_task_id = parent.id AND task.id IN (
+    SELECT child.id FROM task_services_task AS child
+    JOIN task_services_task AS root ON root.node_id = child.path[1]
+    WHERE child.depth = %s AND child.parent_task_id IS NOT NULL AND child.code = root.code
+    LIMIT %s
+)
+"""
+
+# every code is unique per user again.
+RESTORE_CODE_CONSTRAINT = [
+    """CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "Unique_User-Code" ON task_services_task (my_user_id, md5(code))""",
+    """DROP INDEX CONCURRENTLY IF EXISTS "Unique_User-Root-Code\"""",
+]
+
+REPLACE_CODE_CONSTRAINT = [
+    """CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "Unique_User-Root-Code" ON task_services_task (my_user_id, md5(code)) WHERE parent_task_id IS NULL""",
+    """DROP INDEX CONCURRENTLY IF EXISTS "Unique_User-Code\"""",
+]
+
+
+def run(statements):
+
+    def forwards(apps, schema_editor):
+
+        with schema_editor.connection.cursor() as cursor:
+
+            for statement in statements:
+
+                cursor.execute(statement)
+
+    return forwards
+
+
+def restore_child_codes(apps, schema_editor):
+
+    # non atomic migration, every batch is committed on its own and only locks its rows.
+    with schema_editor.connection.cursor() as cursor:
+
+        cursor.execute(MAX_DEPTH)
+
+        max_depth = cursor.fetchone()[0]
+
+        for depth in range(1, max_depth + 1):
+
+            while True:
+
+                cursor.execute(RESTORE_CHILD_CODES, [depth, BATCH_SIZE])
+
+                if cursor.rowcount == 0:
+
+                    break
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('task_services', '0015_workflow_stats'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                # the codes are kept when going back, they are unique under either constraint.
+                migrations.RunPython(restore_child_codes, migrations.RunPython.noop, elidable=True),
+                migrations.RunPython(run(RESTORE_CODE_CONSTRAINT), run(REPLACE_CODE_CONSTRAINT)),
+            ],
+            state_operations=[
+                migrations.RemoveConstraint(
+                    model_name='task',
+                    name='Unique_User-Root-Code',
+                ),
+                migrations.AddConstraint(
+                    model_name='task',
+                    constraint=models.UniqueConstraint(models.F('my_user'), django.db.models.functions.text.MD5('code'), name='Unique_User-Code'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.0.4 on 2026-10-18 17:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# the counts of the workflows still registered, the completed ones have been deleted with their root.
+BACKFILL_USER_STATS = """
+INSERT INTO task_services_userstats (my_user_id, workflows_count, pending_count, completed_count, errored_count, updated_at)
+SELECT my_user_id, COUNT(*), SUM(pending_count), SUM(completed_count), SUM(errored_count), now()
+FROM task_services_workflowstats
+GROUP BY my_user_id
+ON CONFLICT (my_user_id) DO NOTHING
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_services', '0016_task_child_codes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('my_user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('workflows_count', models.IntegerField(default=0)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('errored_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunSQL(BACKFILL_USER_STATS, migrations.RunSQL.noop, elidable=True),
+    ]
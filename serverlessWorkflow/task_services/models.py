@@ -1,13 +1,31 @@
-from django.db import models
+from django.db import connections, models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.contrib.postgres.fields import ArrayField
-from django.db.models.functions import MD5
+from django.contrib.postgres.indexes import GinIndex
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, MD5
+from django.utils import timezone
 
 from task_services.choices import StatusChoices
+from serverlessWorkflow.exception import PayloadTooLarge
+from serverlessWorkflow.metrics import counters
 
 from datetime import datetime
 from uuid import UUID, uuid4
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+import json
+
+
+# node ids of the tasks, 8 bytes each instead of the 16 bytes of a uuid.
+NODE_ID_SEQUENCE = "task_services_task_node_id_seq"
+
+
+class TaskConflict(Exception):
+    """
+    Raised when a Task row kept changing under a compare-and-swap update, every retry included.
+    """
+    pass
 
 
 class UserManager(BaseUserManager):
@@ -75,28 +93,348 @@ class User(AbstractBaseUser):
         return True
 
 
+class TaskQuerySet(models.QuerySet):
+
+    def subtree(self, task: "Task") -> "TaskQuerySet":
+        # the task and all of its descendants, `path @> ARRAY[node_id]` is served by the GIN index.
+        return self.filter(path__contains=[task.node_id])
+
+    def descendants(self, task: "Task", status: Optional[int] = None) -> "TaskQuerySet":
+
+        queryset = self.subtree(task).exclude(id=task.id)
+
+        if status is not None:
+
+            queryset = queryset.filter(task_status=status)
+
+        return queryset
+
+    def ancestors(self, task: "Task") -> "TaskQuerySet":
+
+        return self.filter(node_id__in=(task.path or [])[:-1]).order_by("depth")
+
+    def next_node_ids(self, count: int) -> List[int]:
+        """
+        Allocates `count` node ids from the sequence, for tasks which are not created through
+        `validation_context`.
+        """
+
+        with connections[self.db].cursor() as cursor:
+
+            cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [NODE_ID_SEQUENCE, count])
+
+            return [row[0] for row in cursor.fetchall()]
+
+    def validation_context(self, task_ids: List[Any], my_user_id: Any, parent_task_id: Any = None, nodes: int = 0) -> Dict[str, Any]:
+        """
+        Everything the init / complete serializers check, read in a single query: which of
+        `task_ids` already exist, whether the user exists, and the parent task (`None` when missing)
+        with only the columns a new child needs. `nodes` node ids are allocated for the new tasks.
+        """
+
+        query = f"""
+            SELECT
+                ARRAY(SELECT id FROM {Task._meta.db_table} WHERE id = ANY(%(ids)s::uuid[])),
+                EXISTS (SELECT 1 FROM {User._meta.db_table} WHERE id = %(my_user)s),
+                ARRAY(SELECT nextval(%(sequence)s) FROM generate_series(1, %(nodes)s)),
+                parent.id, parent.my_user_id, parent.code, parent.node_id, parent.path, parent.depth
+            FROM (SELECT 1) AS one
+            LEFT JOIN {Task._meta.db_table} AS parent ON parent.id = %(parent_task)s
+        """
+
+        with connections[self.db].cursor() as cursor:
+
+            cursor.execute(query, {"ids": [str(task_id) for task_id in task_ids], "my_user": my_user_id, "sequence": NODE_ID_SEQUENCE, "nodes": nodes, "parent_task": parent_task_id})
+
+            existing_ids, user_exists, node_ids, parent_id, parent_user_id, parent_code, parent_node_id, parent_path, parent_depth = cursor.fetchone()
+
+        parent_task = None
+
+        if parent_id is not None:
+
+            parent_task = Task(id=parent_id, my_user_id=parent_user_id, code=parent_code, node_id=parent_node_id, path=parent_path, depth=parent_depth)
+
+            # the instance comes from the database, saving it must update the row.
+            parent_task._state.adding   = False
+            parent_task._state.db       = self.db
+
+        return {"existing_ids": set(existing_ids), "user_exists": user_exists, "node_ids": node_ids, "parent_task": parent_task}
+
+    # SQL type of the columns `bulk_set` can write, JSON columns are sent as text.
+    BULK_SET_TYPES = {
+        "task_status": "integer",
+        "sub_task_status": "integer",
+        "response": "jsonb",
+        "immediate_next": "jsonb[]",
+        "sub_task_next": "jsonb[]",
+        "updated_at": "timestamptz",
+    }
+
+    def bulk_set(self, tasks: List["Task"], fields: List[str], batch_size: int = 1000) -> int:
+        """
+        Writes `fields` of every task with one `UPDATE ... FROM unnest(...)` per `batch_size` rows,
+        one array parameter per column, instead of the CASE WHEN expressions of `bulk_update`.
+        The version of every row is incremented.
+        """
+
+        table   = Task._meta.db_table
+        updated = 0
+
+        def value(field: str) -> str:
+
+            if self.BULK_SET_TYPES[field] == "jsonb":
+
+                return f"v.{field}::jsonb"
+
+            if self.BULK_SET_TYPES[field] == "jsonb[]":
+
+                return f"CASE WHEN v.{field} IS NULL THEN NULL ELSE ARRAY(SELECT jsonb_array_elements(v.{field}::jsonb)) END"
+
+            return f"v.{field}"
+
+        def param(field: str, task: "Task") -> Any:
+
+            current = getattr(task, field)
+
+            if self.BULK_SET_TYPES[field] in ("jsonb", "jsonb[]"):
+
+                return json.dumps(current) if current is not None else None
+
+            return current
+
+        def sql_type(field: str) -> str:
+
+            return "text" if self.BULK_SET_TYPES[field] in ("jsonb", "jsonb[]") else self.BULK_SET_TYPES[field]
+
+        query = f"""
+            UPDATE {table} AS task SET {", ".join(f"{field} = {value(field)}" for field in fields)}, version = task.version + 1
+            FROM unnest(%s::uuid[], {", ".join(f"%s::{sql_type(field)}[]" for field in fields)}) AS v(id, {", ".join(fields)})
+            WHERE task.id = v.id
+        """
+
+        with connections[self.db].cursor() as cursor:
+
+            for start in range(0, len(tasks), batch_size):
+
+                batch = tasks[start:start + batch_size]
+
+                cursor.execute(query, [[task.id for task in batch]] + [[param(field, task) for task in batch] for field in fields])
+
+                updated += cursor.rowcount
+
+        return updated
+
+    # SQL of every field of the task list, formatted like ListTaskSerializer renders it. `{table}` is the task table.
+    JSON_COLUMNS = {
+        "id": "{table}.id",
+        "parent_task": "{table}.parent_task_id",
+        "task_status": "{table}.task_status",
+        "sub_task_status": "{table}.sub_task_status",
+        "code": "{table}.code",
+        "request": "{table}.request",
+        "response": "{table}.response",
+        "immediate_next": "to_jsonb({table}.immediate_next)",
+        "sub_task_next": "to_jsonb({table}.sub_task_next)",
+        "created_at": """to_char({table}.created_at AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"Z"')""",
+        "updated_at": """to_char({table}.updated_at AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"Z"')""",
+    }
+
+    def json_object_sql(self, fields: List[str]) -> str:
+
+        table = Task._meta.db_table
+        pairs = ", ".join(f"'{field}', {self.JSON_COLUMNS[field].format(table=table)}" for field in fields)
+
+        return f"json_build_object({pairs})::text"
+
+    def json_rows(self, ids: List[Any], fields: List[str]) -> List[str]:
+        """
+        Text of a JSON object with `fields` of every task of `ids`, in the order of `ids`, built by
+        Postgres. The JSON columns are never decoded in Python.
+        """
+
+        table = Task._meta.db_table
+
+        query = f"""
+            SELECT {self.json_object_sql(fields)}
+            FROM unnest(%s::uuid[]) WITH ORDINALITY AS page(id, position)
+            JOIN {table} ON {table}.id = page.id
+            ORDER BY page.position
+        """
+
+        with connections[self.db].cursor() as cursor:
+
+            cursor.execute(query, [[str(task_id) for task_id in ids]])
+
+            return [row[0] for row in cursor.fetchall()]
+
+    def iter_ndjson(self, fields: List[str], chunk_size: int = 2000) -> Iterator[bytes]:
+        """
+        Yields the tasks of the queryset as NDJSON, one JSON object with `fields` per line built by
+        Postgres, read through a server-side cursor `chunk_size` rows at a time. Memory does not
+        grow with the number of rows.
+        """
+
+        rows = self.annotate(json=RawSQL(self.json_object_sql(fields), [], output_field=models.TextField())).values_list("json", flat=True)
+
+        lines = []
+
+        for line in rows.iterator(chunk_size=chunk_size):
+
+            lines.append(line)
+
+            if len(lines) == chunk_size:
+
+                yield ("\n".join(lines) + "\n").encode()
+
+                lines = []
+
+        if lines:
+
+            yield ("\n".join(lines) + "\n").encode()
+
+    def tree_json(self, task_id: Any, my_user_id: Any, fields: List[str], max_depth: Optional[int] = None) -> Optional[str]:
+        """
+        JSON text of the subtree of `task_id`: every task with `fields`, built by Postgres, its
+        `children` in creation order and the `counts` of task_status over its subtree. The subtree
+        is read with one path query and nested in one pass from the deepest tasks up. Tasks deeper
+        than `max_depth` levels below `task_id` are counted but not returned. None when the task
+        does not exist.
+        """
+
+        table = Task._meta.db_table
+
+        # `path @> ARRAY[node_id]` is served by the GIN index, parents come before their children.
+        query = f"""
+            WITH root AS (
+                SELECT node_id, depth FROM {table} WHERE id = %s AND my_user_id = %s
+            )
+            SELECT {table}.id, {table}.parent_task_id, {table}.task_status,
+                CASE WHEN %s::int IS NULL OR {table}.depth <= root.depth + %s::int THEN {self.json_object_sql(fields)} END
+            FROM root JOIN {table} ON {table}.path @> ARRAY[root.node_id]
+            WHERE {table}.my_user_id = %s
+            ORDER BY {table}.depth, {table}.created_at, {table}.id
+        """
+
+        with connections[self.db].cursor() as cursor:
+
+            cursor.execute(query, [task_id, my_user_id, max_depth, max_depth, my_user_id])
+
+            rows = cursor.fetchall()
+
+        if not rows:
+
+            return None
+
+        names = {choice.value: choice.name.lower() for choice in StatusChoices}
+
+        # task id -> [counts of its subtree, JSON text of its children, deepest first]
+        nodes: Dict[Any, List[Any]] = {}
+
+        for task_id, parent_task_id, task_status, body in reversed(rows):
+
+            counts, children = nodes.pop(task_id, None) or [dict.fromkeys(names.values(), 0), []]
+
+            counts[names[task_status]] += 1
+
+            if body is not None:
+
+                children.reverse()
+
+                head = body.rstrip()[:-1].rstrip()
+                head = head + "," if head != "{" else head
+                body = head + f'"counts":{json.dumps(counts)},"children":[' + ",".join(children) + "]}"
+
+            # the first row is the task asked for, its parent is not part of the subtree.
+            if task_id == rows[0][0]:
+
+                break
+
+            parent = nodes.setdefault(parent_task_id, [dict.fromkeys(names.values(), 0), []])
+
+            for name, value in counts.items():
+
+                parent[0][name] += value
+
+            if body is not None:
+
+                parent[1].append(body)
+
+        return f'{{"nodes":{len(rows)},"counts":{json.dumps(counts)},"tree":{body}}}'
+
+    def sub_task_responses_json(self, task: "Task", include_current: bool = False, data_only: bool = False, max_bytes: Optional[int] = None) -> str:
+        """
+        JSON array text of the responses of `task`'s children in creation order, built by Postgres
+        with jsonb_agg so the responses are never decoded in Python. `include_current` puts the
+        task's own response first, `data_only` keeps only the `data` key of each response.
+        Raises PayloadTooLarge when the array is bigger than `max_bytes`.
+        """
+
+        value = "response -> 'data'" if data_only else "response"
+        table = Task._meta.db_table
+
+        query = f"""
+            SELECT CASE WHEN %(max_bytes)s IS NULL OR octet_length(body) <= %(max_bytes)s THEN body END, octet_length(body)
+            FROM (
+                SELECT (
+                    CASE WHEN %(include_current)s
+                        THEN (SELECT jsonb_build_array({value}) FROM {table} WHERE id = %(id)s)
+                        ELSE '[]'::jsonb
+                    END
+                    ||
+                    (SELECT COALESCE(jsonb_agg({value} ORDER BY created_at, id), '[]'::jsonb) FROM {table} WHERE parent_task_id = %(id)s)
+                )::text AS body
+            ) AS aggregated
+        """
+
+        with connections[self.db].cursor() as cursor:
+
+            cursor.execute(query, {"id": task.id, "include_current": include_current, "max_bytes": max_bytes})
+
+            body, size = cursor.fetchone()
+
+        if body is None:
+
+            raise PayloadTooLarge(f"Sub task responses of task {task.id} are {size} bytes, more than {max_bytes} bytes.")
+
+        return body
+
+
 class Task(models.Model):
     id: UUID                            = models.UUIDField(primary_key=True, editable=False, default=uuid4)
-    parent_task                         = models.ForeignKey("self", null=True, on_delete=models.CASCADE, related_name="sub_task") # type: Task
-    my_user: User                       = models.ForeignKey(User, on_delete=models.CASCADE, related_name="tasks")
+    # indexed by the composite indexes of Meta, which start with them.
+    parent_task                         = models.ForeignKey("self", null=True, on_delete=models.CASCADE, related_name="sub_task", db_index=False) # type: Task
+    my_user: User                       = models.ForeignKey(User, on_delete=models.CASCADE, related_name="tasks", db_index=False)
     task_status: int                    = models.IntegerField(choices=StatusChoices.choices, default=StatusChoices.PENDING)
     sub_task_status: int                = models.IntegerField(choices=StatusChoices.choices, default=StatusChoices.PENDING)
 
     code: str                           = models.TextField()
 
+    # node ids of the root, every ancestor and the task itself, indexed with GIN for subtree lookups.
+    node_id: int                        = models.BigIntegerField()
+    path: Optional[List[int]]           = ArrayField(models.BigIntegerField(), null=True)
+    depth: int                          = models.IntegerField(default=0)
+
     request: Optional[Dict[str, Any]]   = models.JSONField(null=True)
     response: Optional[Dict[str, Any]]  = models.JSONField(null=True)
 
     immediate_next: Optional[List[Dict[str, Any]]] = ArrayField(models.JSONField(null=True), null=True)
     sub_task_next: Optional[List[Dict[str, Any]]]  = ArrayField(models.JSONField(null=True), null=True)
 
+    # counters of the direct children, maintained by init, complete, check and retry.
+    children_count: int                 = models.IntegerField(default=0)
+    children_completed_count: int       = models.IntegerField(default=0)
+    children_errored_count: int         = models.IntegerField(default=0)
+
+    # incremented by every write, compare-and-swap updates only apply to the version they have read.
+    version: int                        = models.IntegerField(default=0)
+
     # buffer_immediate_next   = ArrayField(models.JSONField(null=True), null=True)
     # buffer_sub_task_next    = ArrayField(models.JSONField(null=True), null=True)
 
     created_at: datetime    = models.DateTimeField(auto_now_add=True)
     updated_at: datetime    = models.DateTimeField(auto_now=True)
 
-    objects                 = models.Manager()
+    objects                 = TaskQuerySet.as_manager()
 
     class Meta:
         constraints = [
@@ -104,8 +442,345 @@ class Task(models.Model):
                 'my_user',
                 MD5('code'),
                 name = "Unique_User-Code"
-            )
+            ),
+            models.UniqueConstraint(
+                fields  = ["node_id"],
+                name    = "Unique_Node-Id"
+            ),
+        ]
+        indexes = [
+            GinIndex(fields=["path"], name="Task_Path-Gin"),
+            # task list and export, newest or oldest first, with a unique tie breaker.
+            models.Index(fields=["my_user", "-created_at", "-id"], name="Task_User-Created"),
+            # children of a task in creation order: sub task responses, tree, cascades.
+            models.Index(fields=["parent_task", "created_at", "id"], name="Task_Parent-Created"),
+            # task list filtered on the statuses which are still open, completed tasks are left out.
+            models.Index(fields=["my_user", "task_status", "-created_at"], condition=~Q(task_status=StatusChoices.COMPLETED), name="Task_User-Open-Status"),
         ]
 
     def __str__(self):
         return f"{self.id} {self.task_status} {self.sub_task_status}"
+
+    def save(self, *args, **kwargs):
+
+        # the ORM always sends the column, the sequence default of the table never applies to its inserts.
+        if self._state.adding and self.node_id is None:
+
+            self.node_id = Task.objects.next_node_ids(1)[0]
+
+        super().save(*args, **kwargs)
+
+    def build_path(self, parent_task: Optional["Task"]) -> None:
+
+        self.path   = (parent_task.path if parent_task is not None else []) + [self.node_id]
+        self.depth  = len(self.path) - 1
+
+    def subtree(self) -> TaskQuerySet:
+
+        return Task.objects.subtree(self)
+
+    def descendants(self, status: Optional[int] = None) -> TaskQuerySet:
+
+        return Task.objects.descendants(self, status=status)
+
+    def ancestors(self) -> TaskQuerySet:
+
+        return Task.objects.ancestors(self)
+
+    def cas_save(self, fields: List[str]) -> bool:
+        """
+        Writes `fields` only if the row is still at `self.version`, and increments the version.
+        Returns False, without writing anything, when another write happened since it was read.
+        """
+
+        now = timezone.now()
+
+        updated = Task.objects.filter(id=self.id, version=self.version).update(
+            **{field: getattr(self, field) for field in fields},
+            version     = F("version") + 1,
+            updated_at  = now,
+        )
+
+        if updated:
+
+            self.version    += 1
+            self.updated_at = now
+
+        else:
+
+            counters.incr("task_cas_conflicts")
+
+        return bool(updated)
+
+    @property
+    def children_completed(self) -> bool:
+        # every registered child has task_status and sub_task_status Completed.
+        return self.children_completed_count >= self.children_count
+
+    @classmethod
+    def record_child_transition(cls, parent_task_id: Optional[UUID], before: Optional[Tuple[int, int]], after: Optional[Tuple[int, int]]) -> None:
+        """
+        Updates the children counters of `parent_task_id` when one of its children is registered
+        (`before` is None), changes its (task_status, sub_task_status), or is removed (`after` is None).
+        """
+
+        cls.record_children_transitions(parent_task_id, [(before, after)])
+
+    @classmethod
+    def record_children_transitions(cls, parent_task_id: Optional[UUID], transitions: List[Tuple[Optional[Tuple[int, int]], Optional[Tuple[int, int]]]]) -> None:
+        """
+        Same as `record_child_transition` for many (before, after) transitions of children of the
+        same parent, applied with one update.
+        """
+
+        if parent_task_id is None:
+
+            return
+
+        def completed(state: Optional[Tuple[int, int]]) -> int:
+            return int(state is not None and state == (StatusChoices.COMPLETED, StatusChoices.COMPLETED))
+
+        def errored(state: Optional[Tuple[int, int]]) -> int:
+            return int(state is not None and state[0] == StatusChoices.ERRORS)
+
+        registered_delta    = sum(int(after is not None) - int(before is not None) for before, after in transitions)
+        completed_delta     = sum(completed(after) - completed(before) for before, after in transitions)
+        errored_delta       = sum(errored(after) - errored(before) for before, after in transitions)
+
+        if registered_delta == completed_delta == errored_delta == 0:
+
+            return
+
+        cls.objects.filter(id=parent_task_id).update(
+            children_count              = F("children_count") + registered_delta,
+            children_completed_count    = F("children_completed_count") + completed_delta,
+            children_errored_count      = F("children_errored_count") + errored_delta,
+            # a check which has read the former counters must not act on them.
+            version                     = F("version") + 1,
+        )
+
+
+class WorkflowStatsQuerySet(models.QuerySet):
+
+    # column of the counts of every task_status.
+    COLUMNS = {
+        StatusChoices.PENDING: "pending_count",
+        StatusChoices.COMPLETED: "completed_count",
+        StatusChoices.ERRORS: "errored_count",
+    }
+
+    def record(self, my_user_id: Any, transitions: List[Tuple[int, Optional[int], Optional[int]]], workflows: int = 0) -> None:
+        """
+        Applies (root node id, task_status before, task_status after) transitions of tasks to the
+        counts of their workflows and to the counts of the user with one statement. `before` is
+        None when the task is registered, `after` is None when it is removed. `workflows` is the
+        number of workflows registered (or removed, when negative) with them.
+        """
+
+        deltas: Dict[int, Dict[str, int]] = {}
+
+        for root_node_id, before, after in transitions:
+
+            delta = deltas.setdefault(root_node_id, dict.fromkeys(self.COLUMNS.values(), 0))
+
+            if before is not None:
+
+                delta[self.COLUMNS[before]] -= 1
+
+            if after is not None:
+
+                delta[self.COLUMNS[after]] += 1
+
+        # in root order, concurrent writers of several workflows cannot deadlock on each other.
+        rows = [(root_node_id, delta) for root_node_id, delta in sorted(deltas.items()) if any(delta.values())]
+
+        if not rows and not workflows:
+
+            return
+
+        table       = WorkflowStats._meta.db_table
+        user_table  = UserStats._meta.db_table
+
+        # the user row is written once the workflow rows are, every writer locks them in the same order.
+        query = f"""
+            WITH workflow AS (
+                INSERT INTO {table} AS stats (root_node_id, my_user_id, pending_count, completed_count, errored_count, updated_at)
+                SELECT v.root_node_id, %s, v.pending_count, v.completed_count, v.errored_count, now()
+                FROM unnest(%s::bigint[], %s::int[], %s::int[], %s::int[]) AS v(root_node_id, pending_count, completed_count, errored_count)
+                ON CONFLICT (root_node_id) DO UPDATE SET
+                    pending_count   = stats.pending_count + EXCLUDED.pending_count,
+                    completed_count = stats.completed_count + EXCLUDED.completed_count,
+                    errored_count   = stats.errored_count + EXCLUDED.errored_count,
+                    updated_at      = EXCLUDED.updated_at
+                RETURNING 1
+            )
+            INSERT INTO {user_table} AS stats (my_user_id, workflows_count, pending_count, completed_count, errored_count, updated_at)
+            SELECT %s, %s, %s, %s, %s, now() FROM (SELECT count(*) FROM workflow) AS written
+            ON CONFLICT (my_user_id) DO UPDATE SET
+                workflows_count = stats.workflows_count + EXCLUDED.workflows_count,
+                pending_count   = stats.pending_count + EXCLUDED.pending_count,
+                completed_count = stats.completed_count + EXCLUDED.completed_count,
+                errored_count   = stats.errored_count + EXCLUDED.errored_count,
+                updated_at      = EXCLUDED.updated_at
+        """
+
+        columns = [[delta[column] for _, delta in rows] for column in self.COLUMNS.values()]
+
+        with connections[self.db].cursor() as cursor:
+
+            cursor.execute(query, [my_user_id, [root_node_id for root_node_id, _ in rows]] + columns + [my_user_id, workflows] + [sum(column) for column in columns])
+
+    def reconcile(self, root_node_ids: List[int]) -> int:
+        """
+        Counts the tasks of the workflows of `root_node_ids` again from the task table, rewrites the
+        counts which differ and applies the differences to the counts of their users. Must run
+        inside a transaction: the counts rows are locked first, so the writes in flight are either
+        counted or applied on top of the new counts, never lost. Returns the number of workflows
+        whose counts have been corrected.
+        """
+
+        table       = WorkflowStats._meta.db_table
+        user_table  = UserStats._meta.db_table
+        task_table  = Task._meta.db_table
+
+        query = f"""
+            WITH counted AS (
+                SELECT path[1] AS root_node_id, my_user_id,
+                    count(*) FILTER (WHERE task_status = {StatusChoices.PENDING}) AS pending_count,
+                    count(*) FILTER (WHERE task_status = {StatusChoices.COMPLETED}) AS completed_count,
+                    count(*) FILTER (WHERE task_status = {StatusChoices.ERRORS}) AS errored_count
+                FROM {task_table}
+                WHERE path && %(roots)s::bigint[]
+                GROUP BY path[1], my_user_id
+            ),
+            changed AS (
+                SELECT counted.*, current.root_node_id IS NULL AS missing,
+                    counted.pending_count - coalesce(current.pending_count, 0) AS pending_delta,
+                    counted.completed_count - coalesce(current.completed_count, 0) AS completed_delta,
+                    counted.errored_count - coalesce(current.errored_count, 0) AS errored_delta
+                FROM counted LEFT JOIN {table} AS current ON current.root_node_id = counted.root_node_id
+                WHERE (current.pending_count, current.completed_count, current.errored_count)
+                    IS DISTINCT FROM (counted.pending_count, counted.completed_count, counted.errored_count)
+            ),
+            corrected AS (
+                INSERT INTO {table} AS stats (root_node_id, my_user_id, pending_count, completed_count, errored_count, updated_at)
+                SELECT root_node_id, my_user_id, pending_count, completed_count, errored_count, now()
+                FROM changed
+                ON CONFLICT (root_node_id) DO UPDATE SET
+                    pending_count   = EXCLUDED.pending_count,
+                    completed_count = EXCLUDED.completed_count,
+                    errored_count   = EXCLUDED.errored_count,
+                    updated_at      = EXCLUDED.updated_at
+                RETURNING 1
+            ),
+            users AS (
+                INSERT INTO {user_table} AS stats (my_user_id, workflows_count, pending_count, completed_count, errored_count, updated_at)
+                SELECT my_user_id, count(*) FILTER (WHERE missing), sum(pending_delta), sum(completed_delta), sum(errored_delta), now()
+                FROM changed, (SELECT count(*) FROM corrected) AS written
+                GROUP BY my_user_id
+                ORDER BY my_user_id
+                ON CONFLICT (my_user_id) DO UPDATE SET
+                    workflows_count = stats.workflows_count + EXCLUDED.workflows_count,
+                    pending_count   = stats.pending_count + EXCLUDED.pending_count,
+                    completed_count = stats.completed_count + EXCLUDED.completed_count,
+                    errored_count   = stats.errored_count + EXCLUDED.errored_count,
+                    updated_at      = EXCLUDED.updated_at
+                RETURNING 1
+            )
+            SELECT (SELECT count(*) FROM corrected), (SELECT count(*) FROM users)
+        """
+
+        with connections[self.db].cursor() as cursor:
+
+            cursor.execute(f"SELECT root_node_id FROM {table} WHERE root_node_id = ANY(%(roots)s::bigint[]) ORDER BY root_node_id FOR UPDATE", {"roots": root_node_ids})
+
+            # a new statement, its snapshot has every write committed while waiting for the locks.
+            cursor.execute(query, {"roots": root_node_ids})
+
+            return cursor.fetchone()[0]
+
+    def totals(self) -> Dict[str, int]:
+
+        totals = self.aggregate(
+            workflows   = models.Count("root"),
+            pending     = Coalesce(models.Sum("pending_count"), 0),
+            completed   = Coalesce(models.Sum("completed_count"), 0),
+            errors      = Coalesce(models.Sum("errored_count"), 0),
+        )
+
+        counts = {name: totals[name] for name in ("pending", "completed", "errors")}
+
+        return {"tasks": sum(counts.values()), "workflows": totals["workflows"], "counts": counts}
+
+
+class WorkflowStats(models.Model):
+    """
+    Counts of the tasks of one workflow by task_status, kept up to date by init, complete and retry
+    in the transaction of their task write. Deleted with the root task, the counts of its user keep them.
+    """
+
+    root: Task                  = models.OneToOneField(Task, to_field="node_id", primary_key=True, on_delete=models.CASCADE, related_name="stats", db_column="root_node_id")
+    my_user: User               = models.ForeignKey(User, on_delete=models.CASCADE, related_name="workflow_stats")
+
+    pending_count: int          = models.IntegerField(default=0)
+    completed_count: int        = models.IntegerField(default=0)
+    errored_count: int          = models.IntegerField(default=0)
+
+    updated_at: datetime        = models.DateTimeField(auto_now=True)
+
+    objects                     = WorkflowStatsQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.root_id} {self.pending_count} {self.completed_count} {self.errored_count}"
+
+
+class UserStats(models.Model):
+    """
+    Counts of the tasks of every workflow of a user by task_status, written by the statement which
+    writes the counts of the workflows. Completed workflows, deleted with their root task, are
+    still counted.
+    """
+
+    my_user: User               = models.OneToOneField(User, primary_key=True, on_delete=models.CASCADE, related_name="stats")
+
+    workflows_count: int        = models.IntegerField(default=0)
+    pending_count: int          = models.IntegerField(default=0)
+    completed_count: int        = models.IntegerField(default=0)
+    errored_count: int          = models.IntegerField(default=0)
+
+    updated_at: datetime        = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.my_user_id} {self.workflows_count} {self.pending_count} {self.completed_count} {self.errored_count}"
+
+    def totals(self) -> Dict[str, int]:
+
+        counts = {"pending": self.pending_count, "completed": self.completed_count, "errors": self.errored_count}
+
+        return {"tasks": sum(counts.values()), "workflows": self.workflows_count, "counts": counts}
+
+
+class OutboxTask(models.Model):
+    name: Optional[str]                 = models.TextField(null=True, unique=True)
+    queue: str                          = models.TextField()
+
+    url: str                            = models.TextField()
+    method: str                         = models.CharField(max_length=20)
+    headers: Optional[Dict[str, Any]]   = models.JSONField(null=True)
+    body: Optional[bytes]               = models.BinaryField(null=True)
+
+    scheduled_at: datetime  = models.DateTimeField(default=timezone.now)
+    attempts: int           = models.IntegerField(default=0)
+    last_error: Optional[str] = models.TextField(null=True)
+
+    created_at: datetime    = models.DateTimeField(auto_now_add=True)
+
+    objects                 = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["scheduled_at"], name="OutboxTask_Scheduled-At"),
+        ]
+
+    def __str__(self):
+        return f"{self.id} {self.method} {self.url}"
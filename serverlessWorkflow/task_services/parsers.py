@@ -0,0 +1,35 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+import codecs
+import json
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline delimited JSON, one object per line, into a list. Blank lines are skipped.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+
+        encoding = (parser_context or {}).get("encoding", "utf-8")
+
+        items = []
+
+        for number, line in enumerate(codecs.getreader(encoding)(stream), start=1):
+
+            if not line.strip():
+
+                continue
+
+            try:
+
+                items.append(json.loads(line))
+
+            except ValueError as exc:
+
+                raise ParseError(f"NDJSON parse error on line {number}: {exc}")
+
+        return items
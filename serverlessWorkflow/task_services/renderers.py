@@ -0,0 +1,22 @@
+from rest_framework.renderers import BaseRenderer
+
+import json
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Lets clients ask for `application/x-ndjson`. The exports stream their own lines, only the
+    error responses are rendered here, as a single JSON line.
+    """
+
+    media_type  = "application/x-ndjson"
+    format      = "ndjson"
+    charset     = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+
+        if data is None:
+
+            return b""
+
+        return json.dumps(data).encode() + b"\n"
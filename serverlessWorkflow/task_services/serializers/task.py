@@ -1,20 +1,105 @@
 from rest_framework import serializers
 
 from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
 
-from task_services.models import Task, User
+from task_services.checks import schedule_check
+from task_services.models import Task, TaskConflict, User, WorkflowStats
 from task_services.choices import StatusChoices, ImmediateInputTypeChoices, SubTaskInputTypeChoices
 
-from serverlessWorkflow.task import create_http_task
+from serverlessWorkflow.task import DispatchResult, dispatch_many, dispatch_errors
 
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, List, Optional
 from collections import OrderedDict
+from uuid import UUID
 
 
 class ChoicesSerializer(serializers.Serializer):
     pass
 
 
+class DeferredPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Only parses the primary key, the serializer checks that the related row exists in validate(),
+    together with the other relations, instead of one query per field.
+    """
+
+    def to_internal_value(self, data):
+
+        if isinstance(data, bool):
+
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+        try:
+
+            return self.get_queryset().model._meta.pk.to_python(data)
+
+        except DjangoValidationError:
+
+            self.fail('does_not_exist', pk_value=data)
+
+
+def validate_relations(serializer: serializers.ModelSerializer, data: OrderedDict, task_exists: bool) -> OrderedDict:
+    """
+    Checks the task id (`task_exists` tells whether it must already exist), the user and the parent
+    task with one query, and replaces `my_user` / `parent_task` by their instances. A new task also
+    gets its `node_id`.
+    """
+
+    my_user_id      = data["my_user"]
+    parent_task_id  = data.get("parent_task")
+
+    instance: Optional[Task] = serializer.instance
+
+    # the view has already loaded the task, nothing to check when the relations are unchanged.
+    if instance is not None and str(instance.id) == str(data["id"]) and instance.my_user_id == my_user_id and instance.parent_task_id == parent_task_id:
+
+        data["my_user"]     = User(id=my_user_id)
+        data["parent_task"] = Task(id=parent_task_id) if parent_task_id is not None else None
+
+        return data
+
+    context = Task.objects.validation_context([data["id"]], my_user_id, parent_task_id, nodes=0 if task_exists else 1)
+
+    found = UUID(data["id"]) in context["existing_ids"]
+
+    errors = {}
+
+    if found and not task_exists:
+
+        errors["id"] = [f"Task with id: {data['id']} already exists."]
+
+    elif not found and task_exists:
+
+        errors["id"] = [f"Task with id: {data['id']} does not exists."]
+
+    if not context["user_exists"]:
+
+        errors["my_user"] = [serializer.fields["my_user"].error_messages["does_not_exist"].format(pk_value=my_user_id)]
+
+    if parent_task_id is not None and context["parent_task"] is None:
+
+        errors["parent_task"] = [serializer.fields["parent_task"].error_messages["does_not_exist"].format(pk_value=parent_task_id)]
+
+    if errors:
+
+        raise serializers.ValidationError(errors)
+
+    # Check for user of current task and parent task is same if exists.
+    if context["parent_task"] is not None and context["parent_task"].my_user_id != my_user_id:
+
+        raise serializers.ValidationError("Parent Task of Current task is not valid")
+
+    data["my_user"]     = User(id=my_user_id)
+    data["parent_task"] = context["parent_task"]
+
+    if not task_exists:
+
+        data["node_id"] = context["node_ids"][0]
+
+    return data
+
+
 class RequestSerializer(serializers.Serializer):
 
     url                             = serializers.CharField(max_length=10000, help_text="URL of the Request.")
@@ -63,6 +148,96 @@ class ResponseSerializer(serializers.Serializer):
     data                            = serializers.JSONField(allow_null=True, help_text="Response Data.")
 
 
+def apply_completion(task: Task, data: OrderedDict) -> bool:
+    """
+    Sets the task_status, response, immediate_next and sub_task_next of a completion on `task`.
+    Returns True when it has no immediate_next, its sub_task_status is then Completed as well.
+    """
+
+    # If response's status_code greater than 299
+    if data.get("response").get("status_code") > 299:
+        
+        # then task_status will be set as Errors
+        task.task_status    = StatusChoices.ERRORS
+
+    # If response's status_code is lesser than 300
+    else:
+
+        # then task_status will be set as Completed
+        task.task_status    = StatusChoices.COMPLETED
+
+    # only the given keys are read, the columns of `task` may be deferred.
+    for field in ("response", "immediate_next", "sub_task_next"):
+
+        if field in data:
+
+            setattr(task, field, data[field])
+
+    no_immediate_next = task.immediate_next is None or len(task.immediate_next) == 0
+
+    # If ImmediateNext is None or Length of ImmediateNext is 0 the task has no sub tasks
+    if no_immediate_next:
+
+        task.sub_task_status = StatusChoices.COMPLETED
+
+    return no_immediate_next
+
+
+def immediate_next_calls(task: Task) -> List[Dict[str, Any]]:
+
+    calls = []
+
+    for next_data in task.immediate_next:
+
+        # Getting the url
+        url: str = next_data["url"]
+
+        # Getting the method
+        method: str = next_data["method"]
+
+        # Getting the headers
+        headers: Dict[str, Any] = task.response["headers"]
+
+        # Insert Authorization key of user into Target-Authorization key
+        if 'Authorization' in headers:
+            headers['Target-Authorization'] = headers['Authorization']
+            
+        # Initializing payload as {}
+        payload = {}
+
+        # getting the response of current task
+        if next_data.get("input_type") == ImmediateInputTypeChoices.NONE:
+            
+            payload = None
+
+        if next_data.get("input_type") == ImmediateInputTypeChoices.CURRENT_RESPONSE:
+
+            payload = task.response.get("data")
+
+        # getting the custom_input from current immediate_data
+        elif next_data.get("input_type") == ImmediateInputTypeChoices.CUSTOM_INPUT:
+
+            payload = next_data.get("custom_input")
+
+        calls.append({"url": url, "payload": payload, "method": method, "headers": headers})
+
+    return calls
+
+
+def without_delivered(immediate_next: Optional[List[Dict[str, Any]]], delivered: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+
+    # removing the enqueued entries, the ones written since the row was read are kept
+    remaining = list(immediate_next or [])
+
+    for next_data in delivered:
+
+        if next_data in remaining:
+
+            remaining.remove(next_data)
+
+    return remaining
+
+
 class ListTaskSerializer(serializers.ModelSerializer):
     id                              = serializers.CharField(max_length=250)
     parent_task                     = serializers.PrimaryKeyRelatedField(read_only=True, allow_null=True, help_text="Primary Key of the Parent Task.")
@@ -97,11 +272,22 @@ class ListTaskSerializer(serializers.ModelSerializer):
             "updated_at"
         ]
 
+    def __init__(self, *args, fields: Optional[Iterable[str]] = None, **kwargs):
+
+        super().__init__(*args, **kwargs)
+
+        # projection asked by the client, the other fields are neither fetched nor rendered.
+        if fields is not None:
+
+            for name in set(self.fields) - set(fields):
+
+                self.fields.pop(name)
+
 
 class InitTaskSerializer(serializers.ModelSerializer):
     id                              = serializers.CharField(max_length=250)
-    my_user                         = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(),allow_null=False,help_text="Primary Key of User.")
-    parent_task                     = serializers.PrimaryKeyRelatedField(queryset=Task.objects.all(), allow_null=True, help_text="Primary Key of the Parent Task.")
+    my_user                         = DeferredPrimaryKeyRelatedField(queryset=User.objects.all(),allow_null=False,help_text="Primary Key of User.")
+    parent_task                     = DeferredPrimaryKeyRelatedField(queryset=Task.objects.all(), allow_null=True, help_text="Primary Key of the Parent Task.")
 
     request                         = RequestSerializer(allow_null=True, help_text="Request Object.")
 
@@ -130,45 +316,86 @@ class InitTaskSerializer(serializers.ModelSerializer):
         return dict(value)
 
     def validate_id(self, value: str) -> str:
-                
-        # Checking if Task with the given id already exists.
-        if Task.objects.filter(id=value).exists():
-            
-            # raise error
-            raise serializers.ValidationError(detail=f"Task with id: {value} already exists.")
-        
+
+        try:
+
+            UUID(value)
+
+        except ValueError:
+
+            raise serializers.ValidationError(detail=f"'{value}' is not a valid UUID.")
+
         return value
+
+    def validate(self, data: OrderedDict) -> OrderedDict:
+
+        # id, my_user and parent_task are checked together in one query.
+        return validate_relations(self, data, task_exists=False)
     
-    def validate_my_user(self, value: User) -> User:
         
-        # Checking if the given user exists.
-        if User.objects.filter(id=value.id).exists():
-            
-            return value
-    
-        raise serializers.ValidationError(detail=f"User with id: {value.id} does not exists.")
-    
+class BulkInitTaskSerializer(serializers.Serializer):
+    id                              = serializers.CharField(max_length=250)
+
+    # retry re-sends the request, a task without one could never be retried.
+    request                         = RequestSerializer(help_text="Request Object.")
+
+    task_status                     = serializers.ChoiceField(required=False, choices=StatusChoices.choices, default=StatusChoices.PENDING, help_text="Status of the Task.")
+    sub_task_status                 = serializers.ChoiceField(required=False, choices=StatusChoices.choices, default=StatusChoices.PENDING, help_text="Status of the Sub Task.")
+
+    def validate_request(self, value: Dict[str, Any]) -> dict:
+
+        return dict(value)
+
+    def validate_id(self, value: str) -> str:
+
+        try:
+
+            UUID(value)
+
+        except ValueError:
+
+            raise serializers.ValidationError(detail=f"'{value}' is not a valid UUID.")
+
+        return value
+
+
+class BulkCompleteTaskSerializer(serializers.Serializer):
+    id                              = serializers.CharField(max_length=250)
+
+    response                        = ResponseSerializer(help_text="Response Object")
+
+    immediate_next                  = ImmediateNextSerializer(many=True, required=False, allow_null=True, help_text="Immediate Next List. All the Immediate Next endpoints will be called once the task_status is Completed.")
+    sub_task_next                   = SubTaskSerializer(many=True, required=False, allow_null=True, help_text="Sub Task Next List. All the Sub Task Next endpoints will be called once all children's task_status and sub_task_status is Completed.")
+
+    def validate_id(self, value: str) -> str:
+
+        try:
+
+            UUID(value)
+
+        except ValueError:
+
+            raise serializers.ValidationError(detail=f"'{value}' is not a valid UUID.")
+
+        return value
+
     def validate(self, data: OrderedDict) -> OrderedDict:
-        
-        if data['parent_task']:
 
-            # Check for user of current task and parent task is same if exists.
-            if Task.objects.filter(id=data['parent_task'].id).exists():
-                
-                parent_task_user = Task.objects.get(id=data['parent_task'].id).my_user
+        # If ImmediateNext is None or []
+        if data.get("immediate_next") is None or len(data["immediate_next"]) == 0:
+
+            # then SubTaskNext should be None or [] as well.
+            if data.get("sub_task_next") is not None and len(data["sub_task_next"]) != 0:
 
-                
-                if data['my_user'] != parent_task_user:
+                raise serializers.ValidationError(detail="Sub Task Next should be None when Immediate Next is None.")
 
-                    raise serializers.ValidationError("Parent Task of Current task is not valid")
-        
         return data
-    
-        
+
+
 class CompleteTaskSerializer(serializers.ModelSerializer):
     id                              = serializers.CharField(max_length=250)
-    my_user                         = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(),allow_null=False,help_text="Primary Key of User.")
-    parent_task                     = serializers.PrimaryKeyRelatedField(queryset=Task.objects.all(), allow_null=True, help_text="Primary Key of the Parent Task.")
+    my_user                         = DeferredPrimaryKeyRelatedField(queryset=User.objects.all(),allow_null=False,help_text="Primary Key of User.")
+    parent_task                     = DeferredPrimaryKeyRelatedField(queryset=Task.objects.all(), allow_null=True, help_text="Primary Key of the Parent Task.")
 
     response                        = ResponseSerializer(allow_null=True, required=False, help_text="Response Object")
 
@@ -177,6 +404,8 @@ class CompleteTaskSerializer(serializers.ModelSerializer):
 
     code                            = serializers.CharField(read_only=True, help_text="Code of Current Task and Parent Tasks.")
 
+    dispatch_errors                 = serializers.SerializerMethodField(help_text="Immediate Next entries which could not be enqueued, they are kept in immediate_next.")
+
     class Meta:
         model = Task
         fields = [
@@ -188,36 +417,31 @@ class CompleteTaskSerializer(serializers.ModelSerializer):
             "immediate_next",
             "sub_task_next",
 
-            "code"
+            "code",
+
+            "dispatch_errors",
         ]
 
+    def get_dispatch_errors(self, instance: Task) -> List[Dict[str, Any]]:
+
+        return getattr(self, "_dispatch_errors", [])
+
     def validate_id(self, value: str) -> str:
-    
-        if Task.objects.filter(id=value).exists():
 
-            return value
-        
-        raise serializers.ValidationError(detail=f"Task with id: {value} does not exists.")
+        try:
 
-    def validate_my_user(self, value: User) -> User:
+            UUID(value)
 
-        if User.objects.filter(id=value.id).exists():
+        except ValueError:
 
-            return value
-        # print(f"User with id: {value.id} does not exists.")
-        raise serializers.ValidationError(detail=f"User with id: {value.id} does not exists.")
+            raise serializers.ValidationError(detail=f"'{value}' is not a valid UUID.")
 
-    def validate(self, data: OrderedDict) -> OrderedDict:
-        
-        if data['parent_task']:
+        return value
 
-            if Task.objects.filter(id=data['parent_task'].id).exists():
-            
-                parent_task_user = Task.objects.get(id=data['parent_task'].id).my_user
+    def validate(self, data: OrderedDict) -> OrderedDict:
 
-                if data['my_user'] != parent_task_user:
-                    # print("Parent Task of Current task is not valid")
-                    raise serializers.ValidationError("Parent Task of Current task is not valid")
+        # id, my_user and parent_task are checked together in one query, or not at all when they match the task being completed.
+        data = validate_relations(self, data, task_exists=True)
 
         # If ImmediateNext is None or []
         if data.get("immediate_next") is None or len(data["immediate_next"]) == 0:
@@ -230,89 +454,84 @@ class CompleteTaskSerializer(serializers.ModelSerializer):
 
         return data
 
-    def update(self, instance: Task, validated_data: OrderedDict) -> Task:
-        
-        # If response's status_code greater than 299
-        if validated_data.get("response").get("status_code") > 299:
-            
-            # then task_status will be set as Errors
-            instance.task_status    = StatusChoices.ERRORS
+    def record_completion(self, instance: Task, validated_data: OrderedDict) -> bool:
+        """
+        Writes the completion on `instance` and the counters it changes. Returns True when the
+        task has no immediate_next.
+        """
+
+        for _ in range(settings.TASK_CAS_RETRIES):
+
+            before = (instance.task_status, instance.sub_task_status)
+
+            no_immediate_next = apply_completion(instance, validated_data)
+
+            # to save task_status before calling create_hhtp_task, only if nobody wrote the row since it was read,
+            # concurrent completions of the same task must not both count the transition.
+            if instance.cas_save(["task_status", "sub_task_status", "response", "immediate_next", "sub_task_next"]):
+
+                break
+
+            instance.refresh_from_db(fields=["task_status", "sub_task_status", "response", "immediate_next", "sub_task_next", "version"])
 
-        # If response's status_code is lesser than 300
         else:
 
-            # then task_status will be set as Completed
-            instance.task_status    = StatusChoices.COMPLETED
+            raise TaskConflict(f"Task {instance.id} kept changing during its completion.")
 
-        instance.response               = validated_data.get("response", instance.response)
-        instance.immediate_next         = validated_data.get("immediate_next", instance.immediate_next)
-        instance.sub_task_next          = validated_data.get("sub_task_next", instance.sub_task_next)
-        
-        # to save task_status before calling create_hhtp_task.
-        instance.save()
+        # keeping the parent's children counters in sync before its check runs
+        Task.record_child_transition(instance.parent_task_id, before, (instance.task_status, instance.sub_task_status))
 
-        # If ImmediateNext is None or Length of ImmediateNext is 0 and
-        if (instance.immediate_next is None or len(instance.immediate_next) == 0) and instance.parent_task_id is not None:
+        WorkflowStats.objects.record(instance.my_user_id, [(instance.path[0], before[0], instance.task_status)])
 
-            instance.sub_task_status = StatusChoices.COMPLETED
+        return no_immediate_next
 
-            instance.save()
+    def sends_immediate_next(self, instance: Task) -> bool:
 
-            # 8001
-            # print(f"{settings.CURRENT_HOST}/api/tasks/check/{instance.my_user_id}/{instance.parent_task_id}")
-            create_http_task(f"{settings.CURRENT_HOST}/api/tasks/check/{instance.my_user_id}/{instance.parent_task_id}", payload={}, method="PUT", in_seconds=5)
-        
-        elif (instance.immediate_next is None or len(instance.immediate_next) == 0) and instance.parent_task_id is None:
+        return instance.immediate_next is not None and len(instance.immediate_next) > 0 and instance.task_status == StatusChoices.COMPLETED
 
-            instance.sub_task_status = StatusChoices.COMPLETED
+    def keep_undelivered_immediate_next(self, instance: Task, calls: List[Dict[str, Any]], results: List[DispatchResult]):
 
-            instance.save()
+        self._dispatch_errors = dispatch_errors(calls, results)
 
-            # 8001
-            create_http_task(f"{settings.CURRENT_HOST}/api/tasks/check/{instance.my_user_id}/{instance.id}", payload={}, method="PUT", in_seconds=5)
+        delivered = [next_data for next_data, result in zip(instance.immediate_next, results) if result.ok]
 
-        # Checking if current task's status is Completed
-        elif instance.immediate_next is not None and len(instance.immediate_next) > 0 and instance.task_status == StatusChoices.COMPLETED:
+        for _ in range(settings.TASK_CAS_RETRIES):
+
+            instance.immediate_next = without_delivered(instance.immediate_next, delivered)
 
-            for next_data in instance.immediate_next:
+            if instance.cas_save(["immediate_next"]):
 
-                # Getting the url
-                url: str = next_data["url"]
+                break
 
-                # Getting the method
-                method: str = next_data["method"]
+            instance.refresh_from_db(fields=["immediate_next", "version"])
+
+        else:
 
-                # Getting the headers
-                headers: Dict[str, Any] = instance.response["headers"]
+            raise TaskConflict(f"Task {instance.id} kept changing while saving its immediate_next.")
 
-                # Insert Authorization key of user into Target-Authorization key
-                if 'Authorization' in headers:
-                    headers['Target-Authorization'] = headers['Authorization']
-                    
-                # Initializing payload as {}
-                payload = {}
+    def update(self, instance: Task, validated_data: OrderedDict) -> Task:
 
-                # getting the response of current instance
-                if next_data.get("input_type") == ImmediateInputTypeChoices.NONE:
-                    
-                    payload = None
+        no_immediate_next = self.record_completion(instance, validated_data)
 
-                if next_data.get("input_type") == ImmediateInputTypeChoices.CURRENT_RESPONSE:
+        if no_immediate_next and instance.parent_task_id is not None:
 
-                    payload = instance.response.get("data")
+            # 8001
+            schedule_check(instance.my_user_id, instance.parent_task_id)
+        
+        elif no_immediate_next and instance.parent_task_id is None:
 
-                # getting the custom_input from current immediate_data
-                elif next_data.get("input_type") == ImmediateInputTypeChoices.CUSTOM_INPUT:
+            # 8001
+            schedule_check(instance.my_user_id, instance.id)
 
-                    payload = next_data.get("custom_input")
+        # Checking if current task's status is Completed
+        elif self.sends_immediate_next(instance):
 
-                # sending request
-                create_http_task(url, payload=payload, method=method, headers=headers)
+            calls = immediate_next_calls(instance)
 
-            # setting immediate_next to [] after calling create_http_task for each immediate_next
-            instance.immediate_next = []
+            # sending requests in parallel
+            results = dispatch_many(calls)
 
-            instance.save()
+            self.keep_undelivered_immediate_next(instance, calls, results)
 
         return instance
 
@@ -0,0 +1,69 @@
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from task_services.authentication import token_cache
+from task_services.models import User
+
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+
+class TaskAPIMixin:
+    """
+    A user with a token and the init and complete calls of the workers, for the TestCases.
+    """
+
+    def create_user(self, name: str) -> User:
+
+        self.user   = User.objects.create(email=f"{name}-{uuid4()}@example.com", password=str(uuid4()), name=name)
+        self.client = APIClient()
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+
+        # the token goes away with the rolled back user.
+        self.addCleanup(token_cache.clear)
+
+        return self.user
+
+    def init_body(self, task_id: str, parent_task_id: Optional[str] = None) -> Dict[str, Any]:
+
+        body = {
+            "id": task_id,
+            "my_user": str(self.user.id),
+            "parent_task": parent_task_id,
+            "request": {"url": "https://localhost/", "method": "POST", "payload": None, "headers": {}},
+        }
+
+        # the code of a root task is given by the caller.
+        if parent_task_id is None:
+
+            body["code"] = task_id
+
+        return body
+
+    def complete_body(self, task_id: str, parent_task_id: Optional[str] = None, immediate_next: Optional[List[Dict[str, Any]]] = None, sub_task_next: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+
+        return {
+            "id": task_id,
+            "my_user": str(self.user.id),
+            "parent_task": parent_task_id,
+            "response": {"status_code": 200, "headers": {}, "data": None},
+            "immediate_next": immediate_next or [],
+            "sub_task_next": sub_task_next or [],
+        }
+
+    def init(self, task_id: str, parent_task_id: Optional[str] = None):
+
+        response = self.client.post(f"/api/tasks/init/{self.user.id}", self.init_body(task_id, parent_task_id), format="json")
+
+        self.assertEqual(response.status_code, 201, response.content)
+
+        return response
+
+    def complete(self, task_id: str, parent_task_id: Optional[str] = None, **kwargs):
+
+        response = self.client.put(f"/api/tasks/complete/{self.user.id}/{task_id}", self.complete_body(task_id, parent_task_id, **kwargs), format="json")
+
+        self.assertEqual(response.status_code, 200, response.content)
+
+        return response
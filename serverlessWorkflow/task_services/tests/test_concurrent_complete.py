@@ -0,0 +1,122 @@
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from rest_framework.test import APIClient
+
+from serverlessWorkflow.metrics import counters
+from task_services.choices import StatusChoices, SubTaskInputTypeChoices
+from task_services.management.commands.bench_dispatch import start_fake_cloud_tasks_server
+from task_services.models import Task
+from task_services.tests.api import TaskAPIMixin
+
+from concurrent import futures
+from typing import List
+from uuid import uuid4
+import threading
+
+
+NEXT_URL = "https://localhost/concurrent-next"
+
+CHILDREN    = 300
+THREADS     = 24
+
+
+class ConcurrentCompleteTests(TaskAPIMixin, TransactionTestCase):
+    """
+    Completes many siblings from many threads at once, each thread checking the parent after every
+    complete, every request in a transaction of its own like in production.
+    """
+
+    def setUp(self):
+
+        self.sent_next: List[str]   = []
+        self.sent_lock              = threading.Lock()
+
+        server, target = start_fake_cloud_tasks_server(on_create=self.on_create)
+
+        self.addCleanup(server.stop, None)
+
+        # every enqueue of the test, sub_task_next and check callbacks included, goes to the fake server.
+        settings = override_settings(TASK_CHECK_PROPAGATION="async", TASK_DISPATCHER_BACKEND="cloud_tasks", CLOUD_TASKS_EMULATOR_HOST=target, CLOUD_TASKS_DISPATCH_CONCURRENCY=8)
+
+        settings.enable()
+
+        self.addCleanup(settings.disable)
+
+        self.create_user("concurrent")
+
+    def on_create(self, task):
+
+        if task.http_request.url == NEXT_URL:
+
+            with self.sent_lock:
+
+                self.sent_next.append(task.name)
+
+    def test_no_counter_update_is_lost_and_sub_task_next_is_sent_once(self):
+
+        root, parent, sibling = str(uuid4()), str(uuid4()), str(uuid4())
+
+        self.init(root)
+        self.init(parent, root)
+
+        # keeps the root pending, the root is not deleted under the parent.
+        self.init(sibling, root)
+
+        ids = [str(uuid4()) for _ in range(CHILDREN)]
+
+        response = self.client.post(f"/api/tasks/bulk-init/{self.user.id}/{parent}", [{"id": task_id, "request": self.init_body(task_id, parent)["request"]} for task_id in ids], format="json")
+
+        self.assertEqual(response.status_code, 201, response.content)
+
+        self.complete(
+            parent,
+            root,
+            immediate_next=[{"url": "https://localhost/", "method": "POST", "input_type": SubTaskInputTypeChoices.NONE, "custom_input": None}],
+            sub_task_next=[{"url": NEXT_URL, "method": "POST", "input_type": SubTaskInputTypeChoices.NONE, "custom_input": None}],
+        )
+
+        def complete(task_id: str):
+
+            client = APIClient()
+
+            try:
+
+                response = client.put(f"/api/tasks/complete/{self.user.id}/{task_id}", self.complete_body(task_id, parent), format="json")
+
+                self.assertEqual(response.status_code, 200, response.content)
+
+                # the check of the parent races with the completes of the other threads, a 409 is retried like Cloud Tasks does.
+                while True:
+
+                    response = client.put(f"/api/tasks/check/{self.user.id}/{parent}", {}, format="json")
+
+                    if response.status_code != 409:
+
+                        break
+
+                self.assertEqual(response.status_code, 200, response.content)
+
+            finally:
+
+                connection.close()
+
+        before = counters.snapshot().get("task_cas_conflicts", 0)
+
+        with futures.ThreadPoolExecutor(max_workers=THREADS) as executor:
+
+            for future in [executor.submit(complete, task_id) for task_id in ids]:
+
+                future.result()
+
+        # sub_task_next has been sent by one of the checks, the next check marks the parent completed.
+        response = self.client.put(f"/api/tasks/check/{self.user.id}/{parent}", {}, format="json")
+
+        self.assertEqual(response.status_code, 200, response.content)
+
+        obj = Task.objects.get(id=parent)
+
+        self.assertEqual((obj.children_count, obj.children_completed_count, obj.children_errored_count), (CHILDREN, CHILDREN, 0))
+        self.assertEqual(len(self.sent_next), 1, f"sub_task_next enqueued {len(self.sent_next)} times, {counters.snapshot().get('task_cas_conflicts', 0) - before} conflicts")
+        self.assertEqual(obj.sub_task_next, [])
+        self.assertEqual(obj.sub_task_status, StatusChoices.COMPLETED)
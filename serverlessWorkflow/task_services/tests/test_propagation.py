@@ -0,0 +1,93 @@
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from serverlessWorkflow.task import CloudTasksDispatcher, DispatchResult
+from task_services.choices import ImmediateInputTypeChoices, SubTaskInputTypeChoices
+from task_services.models import Task
+from task_services.tests.api import TaskAPIMixin
+
+from typing import Any, Dict, List
+from unittest import mock
+from uuid import uuid4
+
+
+class Rollback(Exception):
+    pass
+
+
+@override_settings(TASK_CHECK_PROPAGATION="inline", TASK_DISPATCHER_BACKEND="cloud_tasks")
+class InlinePropagationTests(TaskAPIMixin, TestCase):
+
+    def setUp(self):
+
+        self.create_user("propagation")
+
+        # every call of the dispatcher is recorded instead of reaching Cloud Tasks.
+        self.sent: List[Dict[str, Any]] = []
+
+        patcher = mock.patch.object(CloudTasksDispatcher, "dispatch_many", autospec=True, side_effect=self.dispatch_many)
+
+        patcher.start()
+
+        self.addCleanup(patcher.stop)
+
+    def dispatch_many(self, dispatcher: CloudTasksDispatcher, calls: List[Dict[str, Any]]) -> List[DispatchResult]:
+
+        self.sent += calls
+
+        return [DispatchResult(index, None, None) for index in range(len(calls))]
+
+    def root_waiting_on_child(self):
+        """
+        A root whose sub_task_next is sent by the check which runs once its only child completes.
+        """
+
+        root, child = str(uuid4()), str(uuid4())
+
+        self.init(root)
+
+        self.complete(
+            root,
+            immediate_next=[{"url": "https://localhost/child", "method": "POST", "input_type": ImmediateInputTypeChoices.NONE, "custom_input": None}],
+            sub_task_next=[{"url": "https://localhost/sub", "method": "POST", "input_type": SubTaskInputTypeChoices.CUSTOM_INPUT, "custom_input": {"done": True}}],
+        )
+
+        self.init(child, root)
+
+        self.sent.clear()
+
+        return root, child
+
+    def test_rolled_back_propagation_enqueues_nothing(self):
+
+        root, child = self.root_waiting_on_child()
+
+        try:
+
+            with self.captureOnCommitCallbacks(execute=True) as callbacks, transaction.atomic():
+
+                self.complete(child, root)
+
+                raise Rollback()
+
+        except Rollback:
+
+            pass
+
+        self.assertEqual(self.sent, [])
+        self.assertEqual(callbacks, [])
+        self.assertEqual(len(Task.objects.get(id=root).sub_task_next), 1)
+
+    def test_committed_propagation_enqueues_sub_task_next(self):
+
+        root, child = self.root_waiting_on_child()
+
+        with self.captureOnCommitCallbacks(execute=True):
+
+            self.complete(child, root)
+
+            # the ancestors are still locked, Cloud Tasks has not been called yet.
+            self.assertEqual(self.sent, [])
+
+        self.assertEqual([call["url"] for call in self.sent], ["https://localhost/sub"])
+        self.assertEqual(Task.objects.get(id=root).sub_task_next, [])
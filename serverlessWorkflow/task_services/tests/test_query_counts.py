@@ -0,0 +1,68 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from task_services.tests.api import TaskAPIMixin
+
+from uuid import uuid4
+
+
+# queries of one request, raise them only together with the change which needs it.
+# the last query of each is the upsert of the workflow counts.
+MAX_QUERIES = {
+    # a known token is answered by the token cache.
+    "authenticated": 0,
+    "init root": 3,
+    "init child": 4,
+    "complete child": 5,
+}
+
+
+# completing the child checks its parent in process, no callback leaves the test transaction.
+@override_settings(TASK_CHECK_PROPAGATION="inline")
+class QueryCountTests(TaskAPIMixin, TestCase):
+
+    def setUp(self):
+
+        self.create_user("query-count")
+
+        # the first request reads the token, the following ones must not.
+        self.client.get("/api/choices")
+
+    def assertQueries(self, label: str, request):
+
+        with CaptureQueriesContext(connection) as context:
+
+            response = request()
+
+        # savepoints only exist because of the transaction of the test.
+        queries = [query["sql"] for query in context.captured_queries if not query["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT"))]
+
+        self.assertLessEqual(len(queries), MAX_QUERIES[label], f"{label} issued {len(queries)} queries:\n" + "\n".join(queries))
+
+        return response
+
+    def test_authenticated(self):
+
+        response = self.assertQueries("authenticated", lambda: self.client.get("/api/choices"))
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_init_and_complete(self):
+
+        root, child, sibling = str(uuid4()), str(uuid4()), str(uuid4())
+
+        response = self.assertQueries("init root", lambda: self.client.post(f"/api/tasks/init/{self.user.id}", self.init_body(root), format="json"))
+
+        self.assertEqual(response.status_code, 201, response.content)
+
+        response = self.assertQueries("init child", lambda: self.client.post(f"/api/tasks/init/{self.user.id}", self.init_body(child, root), format="json"))
+
+        self.assertEqual(response.status_code, 201, response.content)
+
+        # keeps the root pending, the check of the root stops there.
+        self.init(sibling, root)
+
+        response = self.assertQueries("complete child", lambda: self.client.put(f"/api/tasks/complete/{self.user.id}/{child}", self.complete_body(child, root), format="json"))
+
+        self.assertEqual(response.status_code, 200, response.content)
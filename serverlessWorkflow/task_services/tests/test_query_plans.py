@@ -0,0 +1,178 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from task_services.choices import StatusChoices
+from task_services.models import Task, User
+from task_services.tests.api import TaskAPIMixin
+
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import uuid4
+import json
+
+
+# tables which must never be read with a sequential scan by the hot requests.
+HOT_TABLES = (Task._meta.db_table,)
+
+USERS       = 100
+ROOTS       = 20
+CHILDREN    = 100
+
+
+def scans(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+
+    yield plan
+
+    for child in plan.get("Plans", []):
+
+        yield from scans(child)
+
+
+# every callback is written to the outbox, inside the transaction of the test.
+@override_settings(TASK_CHECK_PROPAGATION="inline", TASK_DISPATCHER_BACKEND="outbox")
+class QueryPlanTests(TaskAPIMixin, TestCase):
+    """
+    Runs the hot requests of views/task.py and views/check.py against a large task table and fails when
+    the plan of one of their queries has a sequential scan on the task table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+
+        seeded = User.objects.bulk_create([User(email=f"plan-{uuid4()}@example.com", name="plan") for _ in range(USERS)])
+
+        with connection.cursor() as cursor:
+
+            # mostly completed workflows, like a table which has been in use for a while.
+            cursor.execute(
+                """
+                INSERT INTO task_services_task (id, parent_task_id, my_user_id, task_status, sub_task_status, code,
+                    depth, children_count, children_completed_count, children_errored_count, version, created_at, updated_at)
+                SELECT gen_random_uuid(), NULL, user_id, %s, %s, 'plan-' || gen_random_uuid(), 0, %s, %s, 0, 0, now() - random() * interval '30 days', now()
+                FROM unnest(%s::uuid[]) AS user_id CROSS JOIN generate_series(1, %s)
+                """,
+                [StatusChoices.COMPLETED, StatusChoices.COMPLETED, CHILDREN, CHILDREN, [str(user.id) for user in seeded], ROOTS],
+            )
+
+            cursor.execute(
+                """
+                INSERT INTO task_services_task (id, parent_task_id, my_user_id, task_status, sub_task_status, code,
+                    depth, children_count, children_completed_count, children_errored_count, version, created_at, updated_at)
+                SELECT gen_random_uuid(), root.id, root.my_user_id, CASE WHEN random() < 0.95 THEN %s ELSE %s END, %s, root.code || ',' || gen_random_uuid(), 1, 0, 0, 0, 0, root.created_at + g * interval '1 second', now()
+                FROM task_services_task AS root CROSS JOIN generate_series(1, %s) AS g
+                WHERE root.parent_task_id IS NULL AND root.code LIKE 'plan-%%'
+                """,
+                [StatusChoices.COMPLETED, StatusChoices.ERRORS, StatusChoices.COMPLETED, CHILDREN],
+            )
+
+            cursor.execute(f"UPDATE {Task._meta.db_table} SET path = ARRAY[node_id] WHERE parent_task_id IS NULL AND path IS NULL")
+
+            cursor.execute(
+                f"""
+                UPDATE {Task._meta.db_table} AS task SET path = root.path || task.node_id
+                FROM {Task._meta.db_table} AS root
+                WHERE task.parent_task_id = root.id AND task.path IS NULL
+                """
+            )
+
+            cursor.execute(f"ANALYZE {Task._meta.db_table}")
+
+    def setUp(self):
+
+        self.failures: List[str] = []
+
+        self.create_user("plan")
+
+    def plan(self, sql: str) -> List[Dict[str, Any]]:
+
+        # an export reads through a server-side cursor, its plan is the one of the query it declares.
+        if sql.startswith("DECLARE"):
+
+            sql = sql[sql.index(" FOR ") + len(" FOR "):]
+
+        with connection.cursor() as cursor:
+
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+
+            plan = cursor.fetchone()[0]
+
+        return json.loads(plan) if isinstance(plan, str) else plan
+
+    def check_plan(self, label: str, sql: str, plan: List[Dict[str, Any]]):
+
+        tables = [node["Relation Name"] for node in scans(plan[0]["Plan"]) if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in HOT_TABLES]
+
+        if tables:
+
+            self.failures.append(f"{label}: {' '.join(sql.split())[:200]}")
+
+    def request(self, label: str, method: str, url: str, body: Optional[Any], expected_status: int):
+
+        with CaptureQueriesContext(connection) as context:
+
+            response = getattr(self.client, method)(url, body, format="json")
+
+            # streamed responses run their queries while the content is consumed.
+            content = b"".join(response.streaming_content) if response.streaming else response.content
+
+        self.assertEqual(response.status_code, expected_status, f"{label}: {content[:500]!r}")
+
+        for query in context.captured_queries:
+
+            sql = query["sql"].strip()
+
+            if sql.startswith(("SELECT", "UPDATE", "DELETE", "DECLARE", "WITH")):
+
+                self.check_plan(label, sql, self.plan(sql))
+
+    def test_no_sequential_scan_on_the_task_table(self):
+
+        user_id     = self.user.id
+        root        = str(uuid4())
+        children    = [str(uuid4()) for _ in range(20)]
+
+        request = {"url": "https://localhost/", "method": "POST", "payload": None, "headers": {}}
+
+        self.request("init root", "post", f"/api/tasks/init/{user_id}", self.init_body(root), 201)
+
+        self.request("init child", "post", f"/api/tasks/init/{user_id}", self.init_body(children[0], root), 201)
+
+        self.request("bulk init", "post", f"/api/tasks/bulk-init/{user_id}/{root}", [{"id": child, "request": request} for child in children[1:]], 201)
+
+        # the check of the root aggregates the responses of its children.
+        self.request("complete root", "put", f"/api/tasks/complete/{user_id}/{root}", self.complete_body(
+            root,
+            immediate_next=[{"url": "https://localhost/", "method": "POST", "input_type": 0, "custom_input": None}],
+            sub_task_next=[{"url": "https://localhost/", "method": "POST", "input_type": 2, "custom_input": None}],
+        ), 200)
+
+        self.request("complete child", "put", f"/api/tasks/complete/{user_id}/{children[0]}", self.complete_body(children[0], root), 200)
+
+        self.request("bulk complete", "put", f"/api/tasks/bulk-complete/{user_id}", [self.complete_body(child, root) for child in children[1:-1]], 200)
+
+        self.request("list", "get", f"/api/tasks/{user_id}", None, 200)
+
+        # the status filters of the list, applied by querybuilder.
+        for statuses in ([StatusChoices.PENDING], [StatusChoices.PENDING, StatusChoices.ERRORS]):
+
+            queryset = Task.objects.filter(my_user=self.user, task_status__in=statuses).order_by("-created_at", "-id")[:11]
+
+            self.check_plan("list status", str(queryset.query), json.loads(queryset.explain(format="json")))
+
+        self.request("list raw", "get", f"/api/tasks/{user_id}?raw=true&limit=100", None, 200)
+
+        self.request("export", "get", f"/api/tasks/export/{user_id}?fields=id,task_status", None, 200)
+
+        self.request("tree", "get", f"/api/tasks/tree/{user_id}/{root}?depth=1", None, 200)
+
+        self.request("stats", "get", f"/api/tasks/stats/{user_id}", None, 200)
+
+        self.request("workflow stats", "get", f"/api/tasks/stats/{user_id}/{root}", None, 200)
+
+        self.request("retry", "delete", f"/api/tasks/retry/{user_id}/{children[-1]}", None, 204)
+
+        self.request("check", "put", f"/api/tasks/check/{user_id}/{root}", None, 200)
+
+        self.request("delete", "delete", f"/api/tasks/delete/{user_id}/{root}", None, 204)
+
+        self.assertFalse(self.failures, "Sequential scans on the task table:\n" + "\n".join(self.failures))
@@ -0,0 +1,77 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from task_services.models import Task, UserStats, WorkflowStats
+from task_services.tests.api import TaskAPIMixin
+
+from uuid import uuid4
+
+
+# the completion checks run in the request, the workflow is completed and deleted by the last complete.
+@override_settings(TASK_CHECK_PROPAGATION="inline")
+class TaskStatsTests(TaskAPIMixin, TestCase):
+
+    def setUp(self):
+
+        self.create_user("stats")
+
+    def stats(self, root_id=None):
+
+        return self.client.get(f"/api/tasks/stats/{self.user.id}" + (f"/{root_id}" if root_id else ""))
+
+    def test_counts_of_a_running_workflow(self):
+
+        root, child = str(uuid4()), str(uuid4())
+
+        self.init(root)
+        self.complete(root, immediate_next=[{"url": "https://localhost/child", "method": "POST", "input_type": 0, "custom_input": None}])
+        self.init(child, root)
+
+        expected = {"tasks": 2, "workflows": 1, "counts": {"pending": 1, "completed": 1, "errors": 0}}
+
+        self.assertEqual(self.stats().json(), expected)
+        self.assertEqual(self.stats(root).json(), expected)
+
+    def test_completed_workflows_stay_in_the_user_counts(self):
+
+        for _ in range(2):
+
+            root = str(uuid4())
+
+            self.init(root)
+            self.complete(root)
+
+        self.assertFalse(Task.objects.filter(my_user=self.user).exists())
+        self.assertFalse(WorkflowStats.objects.filter(my_user=self.user).exists())
+
+        self.assertEqual(self.stats().json(), {"tasks": 2, "workflows": 2, "counts": {"pending": 0, "completed": 2, "errors": 0}})
+
+    def test_user_counts_read_one_row(self):
+
+        for _ in range(3):
+
+            self.init(str(uuid4()))
+
+        with CaptureQueriesContext(connection) as queries:
+
+            response = self.stats()
+
+        self.assertEqual(response.json()["workflows"], 3)
+        self.assertEqual([query["sql"] for query in queries if UserStats._meta.db_table not in query["sql"]], [])
+
+    def test_reconcile_corrects_the_user_counts(self):
+
+        root = str(uuid4())
+
+        self.init(root)
+
+        WorkflowStats.objects.filter(my_user=self.user).update(pending_count=5)
+        UserStats.objects.filter(my_user=self.user).update(pending_count=5)
+
+        node_id = Task.objects.get(id=root).node_id
+
+        self.assertEqual(WorkflowStats.objects.reconcile([node_id]), 1)
+
+        self.assertEqual(self.stats().json()["counts"]["pending"], 1)
+        self.assertEqual(self.stats(root).json()["counts"]["pending"], 1)
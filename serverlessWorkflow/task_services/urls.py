@@ -1,20 +1,41 @@
+from django.conf import settings
 from django.urls import path
 from task_services.views.profile import ProfileAPIView
 from task_services.views.user import UserListCreateAPIView, UserRetrieveUpdateDeleteAPIView
-from task_services.views.task import TaskInitAPIView, TaskCompletedAPIView, TaskRetryAPIView, TaskDeleteAPIView, TaskListAPIView, TaskRetryAPIView
+from task_services.views.task import TaskInitAPIView, TaskBulkInitAPIView, TaskCompletedAPIView, TaskBulkCompleteAPIView, TaskRetryAPIView, TaskDeleteAPIView, TaskListAPIView, TaskExportAPIView, TaskTreeAPIView
 from task_services.views.choices import ChoicesAPIView
 from task_services.views.check import TaskCheckAPIView
+from task_services.views.metrics import MetricsAPIView
+from task_services.views.payload import PayloadAPIView
+from task_services.views.stats import TaskStatsAPIView
+
+if settings.TASK_ASYNC_VIEWS:
+
+    from task_services.views.task_async import AsyncTaskCompletedAPIView as TaskCompletedAPIView, AsyncTaskCheckAPIView as TaskCheckAPIView
+
+# the routes called by Cloud Tasks and the workers, also resolved by serverlessWorkflow/callback_urls.py.
+callback_urlpatterns = [
+    path("tasks/init/<str:my_user>", TaskInitAPIView.as_view(), name="task-init"),
+    path("tasks/complete/<str:my_user>/<str:id>", TaskCompletedAPIView.as_view(), name="task-complete"),
+    path("tasks/check/<str:my_user>/<str:id>", TaskCheckAPIView.as_view(), name="task-check"),
+]
 
 urlpatterns = [
+    *callback_urlpatterns,
     path("users", UserListCreateAPIView.as_view(), name='create-user'),
     path("users/<str:pk>", UserRetrieveUpdateDeleteAPIView.as_view(), name='rud-user'),
     path("profile", ProfileAPIView.as_view(), name='profile-create'),
     path("choices", ChoicesAPIView.as_view(), name="task-choices"),
+    path("metrics", MetricsAPIView.as_view(), name="metrics"),
+    path("payloads/<str:name>", PayloadAPIView.as_view(), name="payload"),
     
     path("tasks/<str:my_user>", TaskListAPIView.as_view(), name="task-list"),
-    path("tasks/init/<str:my_user>", TaskInitAPIView.as_view(), name="task-init"),
-    path("tasks/complete/<str:my_user>/<str:id>", TaskCompletedAPIView.as_view(), name="task-complete"),
-    path("tasks/check/<str:my_user>/<str:id>", TaskCheckAPIView.as_view(), name="task-check"),
+    path("tasks/export/<str:my_user>", TaskExportAPIView.as_view(), name="task-export"),
+    path("tasks/tree/<str:my_user>/<str:root_id>", TaskTreeAPIView.as_view(), name="task-tree"),
+    path("tasks/stats/<str:my_user>", TaskStatsAPIView.as_view(), name="task-stats"),
+    path("tasks/stats/<str:my_user>/<str:root_id>", TaskStatsAPIView.as_view(), name="task-workflow-stats"),
+    path("tasks/bulk-init/<str:my_user>/<str:parent_task>", TaskBulkInitAPIView.as_view(), name="task-bulk-init"),
+    path("tasks/bulk-complete/<str:my_user>", TaskBulkCompleteAPIView.as_view(), name="task-bulk-complete"),
     path("tasks/retry/<str:my_user>/<str:id>", TaskRetryAPIView.as_view(), name="task-retry"),
     path("tasks/delete/<str:my_user>/<str:id>", TaskDeleteAPIView.as_view(), name="task-delete")
 ]
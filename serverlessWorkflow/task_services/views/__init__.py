@@ -0,0 +1,12 @@
+from django.utils.functional import lazy
+
+
+def _read_doc(path: str) -> str:
+
+    with open(path) as f:
+
+        return f.read()
+
+
+# the markdown of a view is read when the schema is generated, not when the view is imported.
+read_doc = lazy(_read_doc, str)
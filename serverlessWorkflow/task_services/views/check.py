@@ -1,24 +1,23 @@
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
 
-from django.conf import settings
-from django.urls import reverse
-
-from serverlessWorkflow.task import create_http_task
 from drf_spectacular.utils import extend_schema, extend_schema_view, inline_serializer
 from rest_framework import serializers
 
-from task_services.models import Task
-from task_services.choices import SubTaskInputTypeChoices, StatusChoices
+from task_services.checks import CheckResult, check_task, schedule_check, COMPLETED
+from task_services.exceptions import ConcurrentUpdate
+from task_services.models import Task, TaskConflict
+from task_services.views import read_doc
 
 from typing import Optional
 
 
 
-with open('./task_services/views/docs/task/task_check.md') as f:
-    task_check = f.read()
+task_check = read_doc('./task_services/views/docs/task/task_check.md')
 
 @extend_schema_view(
     put=extend_schema(
@@ -27,114 +26,53 @@ with open('./task_services/views/docs/task/task_check.md') as f:
         description=task_check,
         request=None,
         responses=inline_serializer(name='TaskCheckAPISerializer', fields={
-           'detail': serializers.CharField(read_only=True)
+           'detail': serializers.CharField(read_only=True),
+           'dispatch_errors': serializers.ListField(child=serializers.DictField(), required=False, read_only=True),
         }),
     ),
 )
 class TaskCheckAPIView(APIView):
-    permission_classes: tuple = (AllowAny,)
+    permission_classes: tuple   = (AllowAny,)
+    renderer_classes: tuple     = (JSONRenderer,)
+    parser_classes: tuple       = (JSONParser,)
 
     def put(self, request, *args, **kwargs):
 
-        obj: Optional[Task] = None
-
-        # Getting Task
-        queryset = Task.objects.filter(id=kwargs.get("id"))
-
-        # If queryset exists getting first instance
-        if queryset.exists():
-
-            obj = queryset.first()
-        
-        # If object is not None and 
-        # object's sub_task_next is not None or 
-        # length of sub_task_next is greater than 0 and 
-        # Checking if current tasks all children's task_status and 
-        # sub_task_status is Completed
-        
-        if obj and obj.sub_task_next is not None and len(obj.sub_task_next) > 0 and not Task.objects.filter(
-            code__contains=obj.code.split(",")[-1]
-        ).exclude(code__endswith=obj.code.split(",")[-1]).exclude(
-            task_status=StatusChoices.COMPLETED,
-            sub_task_status=StatusChoices.COMPLETED
-        ).exists():
-            
-            for sub_next_data in obj.sub_task_next:
-                
-                # getting url
-                url: str = sub_next_data["url"]
+        # Getting Task, the children counters make the completion check a single row read.
+        obj: Optional[Task] = Task.objects.filter(id=kwargs.get("id")).first()
 
-                # getting method
-                method: str = sub_next_data["method"]
+        if obj is None:
 
-                # getting headers
-                headers = obj.response["headers"]
+            return Response(data={"detail": "This task's sub-tasks are still pending."}, status=status.HTTP_200_OK)
 
-                # getting payload
-                payload = {}
+        try:
 
-                if sub_next_data["input_type"] == SubTaskInputTypeChoices.NONE:
+            result = check_task(obj)
 
-                    payload = None
+        except TaskConflict as exc:
 
-                # getting the payload from response of current instance
-                if sub_next_data["input_type"] == SubTaskInputTypeChoices.CURRENT_RESPONSE:
+            # non 2xx status makes Cloud Tasks retry the check.
+            raise ConcurrentUpdate(exc)
 
-                    payload = obj.response["data"]
+        # If Obj's parent_task is not None then calling check for parent task.
+        if result.state == COMPLETED and not result.dispatch_errors and obj.parent_task_id is not None:
 
-                # getting the payload from sub_task response
-                elif sub_next_data["input_type"] == SubTaskInputTypeChoices.SUB_TASK_RESPONSE:
+            schedule_check(obj.my_user_id, obj.parent_task_id)
 
-                    payload = obj.sub_task.all().values_list("response", flat=True)
+        return self.result_response(obj, result)
 
-                # getting the payload from current response and sub task response
-                elif sub_next_data["input_type"] == SubTaskInputTypeChoices.CURRENT_AND_SUB_TASK_RESPONSE:
+    def result_response(self, obj: Task, result: CheckResult) -> Response:
 
-                    payload = [obj.response] + obj.sub_task.all().values_list("response", flat=True)
+        if result.dispatch_errors:
 
-                # getting the payload from custom_input of sub_task_data
-                elif sub_next_data["input_type"] == SubTaskInputTypeChoices.CUSTOM_INPUT:
+            # non 2xx status makes Cloud Tasks retry the check, which only re-sends the remaining entries.
+            return Response(data={"detail": "Some of the current task's sub_task_next could not be enqueued, they will be retried with this check.", "dispatch_errors": result.dispatch_errors}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-                    payload = sub_next_data["custom_input"]
-                create_http_task(url, payload, headers=headers, method=method, in_seconds=5)
+        if result.state == COMPLETED:
 
-            obj.sub_task_next = []
-
-            obj.save()
-
-        # If obj is not None and obj's sub_task_next is not None and length of sub_task_next is 0 and Checking if current tasks all children's task_status and sub_task_status is Completed
-        elif obj and (
-            (
-                obj.sub_task_next is not None and len(obj.sub_task_next) == 0
-            ) or (
-                obj.sub_task_next is None
-            )
-        ) and not Task.objects.filter(
-            code__contains=obj.code.split(",")[-1]
-        ).exclude(code__endswith=obj.code.split(",")[-1]).exclude(
-            task_status=StatusChoices.COMPLETED,
-            sub_task_status=StatusChoices.COMPLETED
-        ).exists():
-            
-            # setting sub_task_status as Completed
-            obj.sub_task_status = StatusChoices.COMPLETED
-            
-            obj.save()
-
-            # If Obj's parent_task is not None then calling check for parent task.
             if obj.parent_task_id is not None:
-                
-                # getting url for check endpoint
-                url = reverse("task-check", kwargs={"my_user":obj.my_user_id,"id": obj.parent_task_id})
-                
-                create_http_task(settings.CURRENT_HOST + url, payload={}, method="PUT", in_seconds=5)
-                
+
                 return Response(data={"detail": "The current task's sub-tasks have been completed. Now we are initiating the same check for current task's parent_task."}, status=status.HTTP_200_OK)
-            
-            # If obj is Root Node then we will delete the instance
-            elif obj.parent_task_id is None:
-                
-                obj.delete()
 
             return Response(data={"detail": "This task's sub-tasks have been completed."}, status=status.HTTP_200_OK)
 
@@ -6,10 +6,10 @@ from drf_spectacular.utils import extend_schema, extend_schema_view, inline_seri
 from rest_framework import serializers
 from task_services.choices import StatusChoices, ImmediateInputTypeChoices, SubTaskInputTypeChoices
 from task_services.serializers.task import ChoicesSerializer
+from task_services.views import read_doc
 
 
-with open('./task_services/views/docs/choices/choices.md') as f:
-    task_choice = f.read()
+task_choice = read_doc('./task_services/views/docs/choices/choices.md')
 
 @extend_schema_view(
     get=extend_schema(
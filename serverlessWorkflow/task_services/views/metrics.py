@@ -0,0 +1,30 @@
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import AllowAny
+
+from drf_spectacular.utils import extend_schema, extend_schema_view, inline_serializer
+from rest_framework import serializers
+from serverlessWorkflow.metrics import counters
+from task_services.views import read_doc
+
+
+metrics = read_doc('./task_services/views/docs/metrics/metrics.md')
+
+@extend_schema_view(
+    get=extend_schema(
+        tags=['Metrics'],
+        summary='List the Counters of the current Instance',
+        description=metrics,
+        request=None,
+        responses=inline_serializer(name='MetricsAPISerializer', fields={
+            'counters': serializers.DictField(child=serializers.IntegerField()),
+        }),
+    ),
+)
+class MetricsAPIView(APIView):
+    permission_classes: tuple = (AllowAny,)
+
+    def get(self, request, *args, **kwargs):
+
+        return Response(data={"counters": counters.snapshot()}, status=status.HTTP_200_OK)
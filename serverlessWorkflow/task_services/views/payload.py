@@ -0,0 +1,65 @@
+from django.core import signing
+from django.http import FileResponse, StreamingHttpResponse
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.views import APIView
+from rest_framework.permissions import AllowAny
+
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiTypes
+
+from serverlessWorkflow.payload_store import check_signature, get_payload_store, iter_payload, split_name
+from task_services.exceptions import ObjectNotFound
+from task_services.views import read_doc
+
+
+payload = read_doc('./task_services/views/docs/payload/payload.md')
+
+@extend_schema_view(
+    get=extend_schema(
+        tags=['Payload'],
+        summary='Download an offloaded Payload',
+        description=payload,
+        request=None,
+        parameters=[OpenApiParameter("signature", OpenApiTypes.STR, OpenApiParameter.QUERY, required=True, description="Signature of the envelope's url.")],
+        responses={(200, 'application/octet-stream'): OpenApiTypes.BINARY},
+    ),
+)
+class PayloadAPIView(APIView):
+    # the receivers of Cloud Tasks have no token, the signed url of the envelope is their permission.
+    permission_classes: tuple = (AllowAny,)
+
+    def get(self, request, *args, **kwargs):
+
+        name: str = kwargs.get("name")
+
+        try:
+
+            check_signature(name, request.query_params.get("signature", ""))
+
+        except signing.BadSignature as exc:
+
+            raise PermissionDenied(f"The url of payload {name} is not signed or has expired.") from exc
+
+        store = get_payload_store()
+
+        try:
+
+            _, encoding = split_name(name)
+
+            if not store.exists(name):
+
+                raise FileNotFoundError(f"Payload {name} does not exist.")
+
+        except (ValueError, FileNotFoundError) as exc:
+
+            raise ObjectNotFound(exc)
+
+        # the stored bytes are already a valid gzip response body.
+        if encoding == "gzip" and "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+
+            response = FileResponse(store.open(name), content_type="application/json")
+
+            response["Content-Encoding"] = "gzip"
+
+            return response
+
+        return StreamingHttpResponse(iter_payload(name), content_type="application/json")
@@ -5,13 +5,12 @@ from django.db import transaction
 from drf_spectacular.utils import extend_schema, extend_schema_view
 from task_services.models import User
 from task_services.serializers.profile import UserProfileSerializer
+from task_services.views import read_doc
 
 
-with open('./task_services/views/docs/profile/profile_create.md') as f:
-    user_profile_create = f.read()
+user_profile_create = read_doc('./task_services/views/docs/profile/profile_create.md')
 
-with open('./task_services/views/docs/profile/profile_destroy.md') as f:
-    user_profile_destroy = f.read()
+user_profile_destroy = read_doc('./task_services/views/docs/profile/profile_destroy.md')
 
 @extend_schema_view(
     post=extend_schema(
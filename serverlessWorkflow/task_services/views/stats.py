@@ -0,0 +1,67 @@
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import AllowAny
+
+from django.core.exceptions import ObjectDoesNotExist
+
+from drf_spectacular.utils import extend_schema, extend_schema_view, inline_serializer
+from rest_framework import serializers
+
+from task_services.exceptions import ObjectNotFound
+from task_services.models import UserStats, WorkflowStats
+from task_services.views import read_doc
+
+from uuid import UUID
+
+
+
+task_stats = read_doc('./task_services/views/docs/task/task_stats.md')
+
+@extend_schema_view(
+    get=extend_schema(
+        tags=['Task'],
+        summary='Count the Tasks of a User or of a Workflow by Status',
+        description=task_stats,
+        request=None,
+        responses=inline_serializer(name='TaskStatsAPISerializer', fields={
+            'tasks': serializers.IntegerField(read_only=True),
+            'workflows': serializers.IntegerField(read_only=True),
+            'counts': serializers.DictField(child=serializers.IntegerField(), read_only=True),
+        }),
+    ),
+)
+class TaskStatsAPIView(APIView):
+    permission_classes: tuple = (AllowAny,)
+
+    def get(self, request, *args, **kwargs):
+
+        try:
+
+            my_user_id  = UUID(kwargs.get("my_user"))
+            root_id     = UUID(kwargs["root_id"]) if kwargs.get("root_id") else None
+
+        except ValueError as exc:
+
+            raise ObjectNotFound(exc)
+
+        if root_id is None:
+
+            # one counts row per user, never a count over the workflows or the task table.
+            stats = UserStats.objects.filter(my_user=my_user_id).first() or UserStats(my_user_id=my_user_id)
+
+            return Response(data=stats.totals(), status=status.HTTP_200_OK)
+
+        totals = WorkflowStats.objects.filter(my_user=my_user_id, root__id=root_id).totals()
+
+        try:
+
+            if totals["workflows"] == 0:
+
+                raise WorkflowStats.DoesNotExist(f"Workflow with root task id: {root_id} does not exist.")
+
+        except ObjectDoesNotExist as exc:
+
+            raise ObjectNotFound(exc)
+
+        return Response(data=totals, status=status.HTTP_200_OK)
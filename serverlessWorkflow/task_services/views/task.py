@@ -1,26 +1,46 @@
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.generics import CreateAPIView, UpdateAPIView, ListAPIView, DestroyAPIView
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny
-from rest_framework.pagination import CursorPagination
-from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.exceptions import APIException, ValidationError
 
 from django.core.exceptions import FieldDoesNotExist, FieldError, ObjectDoesNotExist, MultipleObjectsReturned
 from django.db import IntegrityError, transaction
+from django.db.models import F
 from django.db.models.deletion import ProtectedError
 from django.db.transaction import TransactionManagementError
 
-from drf_spectacular.utils import extend_schema, extend_schema_view
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from drf_spectacular.utils import extend_schema, extend_schema_view, inline_serializer
 from querybuilder import querybuilder
-from serverlessWorkflow.task import create_http_task
-from task_services.exceptions import ServerError, ObjectNotFound, CannotDelete
-from task_services.models import Task, User
-from task_services.serializers.task import InitTaskSerializer, CompleteTaskSerializer, ListTaskSerializer
+from serverlessWorkflow.task import create_http_task, dispatch_many, dispatch_errors, dispatch_on_commit
+from task_services.exceptions import ServerError, ObjectNotFound, CannotDelete, ConcurrentUpdate
+from task_services.models import Task, TaskConflict, User, WorkflowStats
+from task_services.pagination import KeysetPagination
+from task_services.parsers import NDJSONParser
+from task_services.renderers import NDJSONRenderer
+from task_services.checks import schedule_check
+from task_services.choices import StatusChoices
+from task_services.serializers.task import InitTaskSerializer, BulkInitTaskSerializer, CompleteTaskSerializer, BulkCompleteTaskSerializer, ListTaskSerializer, apply_completion, immediate_next_calls, without_delivered
+from task_services.views import read_doc
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from uuid import UUID, uuid4
+import json
+
 
-from uuid import uuid4
+UNIQUE_VIOLATION = "23505"
 
 
-with open('./task_services/views/docs/task/task_list.md') as f:
-    task_list = f.read()
+task_list = read_doc('./task_services/views/docs/task/task_list.md')
 
 @extend_schema_view(
     get=extend_schema(
@@ -32,7 +52,7 @@ with open('./task_services/views/docs/task/task_list.md') as f:
 class TaskListAPIView(ListAPIView):
     serializer_class            = ListTaskSerializer
     permission_classes: tuple   = (AllowAny,)
-    pagination_class            = CursorPagination
+    pagination_class            = KeysetPagination
     valid_pairs                 = {
         "id"                        : ["in"],
         "parent_task"               : ["in","isnull"],
@@ -40,7 +60,35 @@ class TaskListAPIView(ListAPIView):
         "code"                      : ["icontains", "contains", "in", "exact", "iexact", "startswith", "endswith"],
         "created_at"                : ["lte", "gte", "gt", "lt", "range", "in", "contains", "icontains"],
     }
-    ordering: tuple             = ('-created_at',)
+    # (created_at, id) is unique, pages never skip nor repeat tasks created at the same instant.
+    ordering: tuple             = ('-created_at', '-id')
+    non_filter_params: tuple    = ("fields", "raw")
+    projection: Optional[List[str]] = None
+
+    def get_projection(self, only: Any) -> Optional[List[str]]:
+        """
+        Fields asked with `?fields=id,task_status`, or by the `only` of querybuilder, in the order
+        of the serializer. None when every field is asked.
+        """
+
+        names = self.request.GET.get("fields") or only
+
+        if not names:
+
+            return None
+
+        if isinstance(names, str):
+
+            names = names.split(",")
+
+        names   = {name.strip() for name in names if name.strip()}
+        unknown = names - set(ListTaskSerializer.Meta.fields)
+
+        if unknown:
+
+            raise ValidationError({"fields": [f"Unknown fields: {', '.join(sorted(unknown))}."]})
+
+        return [name for name in ListTaskSerializer.Meta.fields if name in names]
 
     def get_queryset(self):
 
@@ -48,24 +96,163 @@ class TaskListAPIView(ListAPIView):
 
             queryset    = Task.objects.filter(my_user=self.kwargs.get('my_user'))
 
-            queries     = querybuilder(queryset, self.request.GET, self.valid_pairs)
+            # the projection and the render mode are not filters.
+            params      = self.request.GET.copy()
+
+            for name in self.non_filter_params:
+
+                params.pop(name, None)
+
+            queries     = querybuilder(queryset, params, self.valid_pairs)
 
             if queries is False:
 
                 raise APIException(detail="Invalid QueryParams!!", code=status.HTTP_400_BAD_REQUEST)
 
-            self.only = queries.get("only")
+            self.only       = queries.get("only")
+            self.projection = self.get_projection(self.only)
+
+            queryset = queries.get("queryset")
 
-            return queries.get("queryset")
+            if self.projection is not None:
+
+                # created_at is the cursor of the pagination.
+                queryset = queryset.only(*set(self.projection) | {"created_at"})
+
+            return queryset
 
         except (FieldDoesNotExist, FieldError) as exc:
 
             raise ServerError(exc)
 
+    def get_serializer(self, *args, **kwargs):
+
+        kwargs.setdefault("fields", self.projection)
+
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+
+        if request.GET.get("raw") not in ("1", "true"):
+
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+
+        # the page is found with the pagination columns only, then every task of it is rendered by Postgres.
+        page: List[Task] = self.paginate_queryset(queryset.only("id", "created_at"))
+
+        rows = Task.objects.json_rows([task.id for task in page], self.projection or ListTaskSerializer.Meta.fields)
+
+        body = '{"next":%s,"previous":%s,"results":[%s]}' % (
+            json.dumps(self.paginator.get_next_link()),
+            json.dumps(self.paginator.get_previous_link()),
+            ",".join(rows),
+        )
+
+        return HttpResponse(body, content_type="application/json")
+
+
+
+task_export = read_doc('./task_services/views/docs/task/task_export.md')
+
+@extend_schema_view(
+    get=extend_schema(
+        tags=['Task'],
+        summary='Export All Tasks as NDJSON',
+        description=task_export,
+        responses={(200, 'application/x-ndjson'): ListTaskSerializer},
+    ),
+)
+class TaskExportAPIView(TaskListAPIView):
+    pagination_class            = None
+    renderer_classes: tuple     = (JSONRenderer, NDJSONRenderer)
+
+    def list(self, request, *args, **kwargs):
+
+        # oldest first, the export never holds more than one chunk of rows.
+        queryset = self.get_queryset().order_by("created_at", "id")
+
+        response = StreamingHttpResponse(queryset.iter_ndjson(self.projection or ListTaskSerializer.Meta.fields, chunk_size=settings.TASK_EXPORT_CHUNK_SIZE), content_type="application/x-ndjson")
+
+        response["Content-Disposition"] = f'attachment; filename="tasks-{self.kwargs.get("my_user")}.ndjson"'
 
+        return response
 
-with open('./task_services/views/docs/task/task_init.md') as f:
-    task_init = f.read()
+
+
+task_tree = read_doc('./task_services/views/docs/task/task_tree.md')
+
+@extend_schema_view(
+    get=extend_schema(
+        tags=['Task'],
+        summary='Retrieve the Tree of a Workflow',
+        description=task_tree,
+        responses=inline_serializer(
+            name="TaskTree",
+            fields={
+                "nodes": serializers.IntegerField(help_text="Number of Tasks in the subtree, the ones below the depth limit included."),
+                "counts": serializers.DictField(child=serializers.IntegerField(), help_text="Number of Tasks of the subtree by task_status."),
+                "tree": serializers.JSONField(help_text="The Task with its `counts` and its `children`, nested the same way."),
+            },
+        ),
+    ),
+)
+class TaskTreeAPIView(TaskListAPIView):
+    pagination_class            = None
+
+    def get_depth(self) -> Optional[int]:
+
+        depth = self.request.GET.get("depth")
+
+        if depth is None or depth == "":
+
+            return None
+
+        try:
+
+            depth = int(depth)
+
+        except ValueError:
+
+            depth = -1
+
+        if depth < 0:
+
+            raise ValidationError({"depth": ["A non negative integer is required."]})
+
+        return depth
+
+    def list(self, request, *args, **kwargs):
+
+        try:
+
+            task_id     = UUID(self.kwargs.get("root_id"))
+            my_user_id  = UUID(self.kwargs.get("my_user"))
+
+        except ValueError as exc:
+
+            raise ObjectNotFound(exc)
+
+        projection = self.get_projection(None)
+
+        body = Task.objects.tree_json(task_id, my_user_id, projection or ListTaskSerializer.Meta.fields, max_depth=self.get_depth())
+
+        try:
+
+            if body is None:
+
+                raise Task.DoesNotExist(f"Task with id: {task_id} does not exist.")
+
+        except ObjectDoesNotExist as exc:
+
+            raise ObjectNotFound(exc)
+
+        return HttpResponse(body, content_type="application/json")
+
+
+
+task_init = read_doc('./task_services/views/docs/task/task_init.md')
 
 @extend_schema_view(
     post=extend_schema(
@@ -77,6 +264,8 @@ with open('./task_services/views/docs/task/task_init.md') as f:
 class TaskInitAPIView(CreateAPIView):
     serializer_class            = InitTaskSerializer
     permission_classes:tuple    = (AllowAny,)
+    renderer_classes: tuple     = (JSONRenderer,)
+    parser_classes: tuple       = (JSONParser,)
     
     def get_queryset(self):
         
@@ -92,26 +281,198 @@ class TaskInitAPIView(CreateAPIView):
 
                     code = serializer.validated_data.get("code")
 
+                    parent_task: Optional[Task] = serializer.validated_data.get("parent_task")
+
+                    # path of ancestor node ids, used for the indexed subtree queries
+                    task = Task(id=UUID(serializer.validated_data.get("id")), node_id=serializer.validated_data.get("node_id"))
+
+                    task.build_path(parent_task)
+
                     # checking if parent_task is not None
-                    if serializer.validated_data.get("parent_task"):
+                    if parent_task:
 
                         # updating parent_code
-                        parent_codes: str = serializer.validated_data.get("parent_task").code
-                    
+                        parent_codes: str = parent_task.code
+
                         # concating string
                         code = parent_codes + f",{uuid4()}"
                     
                     # save model
-                    return serializer.save(code=code)
+                    task = serializer.save(code=code, path=task.path, depth=task.depth)
+
+                    # registering the child on its parent's counters
+                    Task.record_child_transition(task.parent_task_id, None, (task.task_status, task.sub_task_status))
+
+                    WorkflowStats.objects.record(task.my_user_id, [(task.path[0], None, task.task_status)], workflows=1 if parent_task is None else 0)
+
+                    return task
 
-        except (FieldDoesNotExist, FieldError, TransactionManagementError, IntegrityError, AttributeError) as exc:
+        except IntegrityError as exc:
+
+            # a concurrent init inserted the same id after the validation query.
+            if getattr(exc.__cause__, "pgcode", None) == UNIQUE_VIOLATION:
+
+                raise ValidationError({"id": [f"Task with id: {serializer.validated_data.get('id')} already exists."]})
+
+            raise ServerError(exc)
+
+        except (FieldDoesNotExist, FieldError, TransactionManagementError, AttributeError) as exc:
 
             raise ServerError(exc)
 
 
 
-with open('./task_services/views/docs/task/task_completed.md') as f:
-    task_completed = f.read()
+task_bulk_init = read_doc('./task_services/views/docs/task/task_bulk_init.md')
+
+@extend_schema_view(
+    post=extend_schema(
+        tags=['Task'],
+        summary='Register Initialization of many Children of a Task',
+        description=task_bulk_init,
+        request=BulkInitTaskSerializer(many=True),
+        responses=inline_serializer(name='TaskBulkInitAPISerializer', fields={
+            'created': serializers.IntegerField(read_only=True),
+            'results': serializers.ListField(child=serializers.DictField(), read_only=True),
+        }),
+    ),
+)
+class TaskBulkInitAPIView(APIView):
+    permission_classes: tuple   = (AllowAny,)
+    parser_classes: tuple       = (JSONParser, NDJSONParser)
+
+    def parse_pk(self, name: str) -> UUID:
+
+        try:
+
+            return UUID(self.kwargs.get(name))
+
+        except ValueError:
+
+            raise ValidationError({name: [PrimaryKeyRelatedField.default_error_messages["does_not_exist"].format(pk_value=self.kwargs.get(name))]})
+
+    def post(self, request, *args, **kwargs):
+
+        items = request.data
+
+        if not isinstance(items, list):
+
+            raise ValidationError({"non_field_errors": ["Expected a list of tasks."]})
+
+        if len(items) > settings.TASK_BULK_INIT_MAX_ITEMS:
+
+            raise ValidationError({"non_field_errors": [f"At most {settings.TASK_BULK_INIT_MAX_ITEMS} tasks can be registered at once."]})
+
+        my_user_id      = self.parse_pk("my_user")
+        parent_task_id  = self.parse_pk("parent_task")
+
+        results: Dict[int, Dict[str, Any]] = {}
+        valid: Dict[int, OrderedDict] = {}
+        seen = set()
+
+        # one serializer validates every item, its fields are only built once.
+        serializer = BulkInitTaskSerializer()
+
+        for index, item in enumerate(items):
+
+            try:
+
+                data = serializer.run_validation(item)
+
+            except ValidationError as exc:
+
+                results[index] = {"index": index, "id": item.get("id") if isinstance(item, dict) else None, "status": status.HTTP_400_BAD_REQUEST, "errors": exc.detail}
+
+                continue
+
+            task_id = UUID(data["id"])
+
+            if task_id in seen:
+
+                results[index] = {"index": index, "id": str(task_id), "status": status.HTTP_400_BAD_REQUEST, "errors": {"id": [f"Task with id: {task_id} is repeated in the request."]}}
+
+                continue
+
+            seen.add(task_id)
+
+            valid[index] = data
+
+        # the user, the parent and every id are checked with one query.
+        context = Task.objects.validation_context(list(seen), my_user_id, parent_task_id, nodes=len(seen))
+
+        if not context["user_exists"]:
+
+            raise ValidationError({"my_user": [PrimaryKeyRelatedField.default_error_messages["does_not_exist"].format(pk_value=my_user_id)]})
+
+        parent_task: Optional[Task] = context["parent_task"]
+
+        if parent_task is None:
+
+            raise ValidationError({"parent_task": [PrimaryKeyRelatedField.default_error_messages["does_not_exist"].format(pk_value=parent_task_id)]})
+
+        if parent_task.my_user_id != my_user_id:
+
+            raise ValidationError("Parent Task of Current task is not valid")
+
+        tasks = []
+
+        # allocated by the validation query, one per id.
+        node_ids = iter(context["node_ids"])
+
+        for index, data in valid.items():
+
+            task_id = UUID(data["id"])
+
+            if task_id in context["existing_ids"]:
+
+                results[index] = {"index": index, "id": str(task_id), "status": status.HTTP_400_BAD_REQUEST, "errors": {"id": [f"Task with id: {task_id} already exists."]}}
+
+                continue
+
+            task = Task(
+                id              = task_id,
+                parent_task_id  = parent_task.id,
+                my_user_id      = my_user_id,
+                task_status     = data["task_status"],
+                sub_task_status = data["sub_task_status"],
+                request         = data["request"],
+                # same code as a single init
+                code            = parent_task.code + f",{uuid4()}",
+                node_id         = next(node_ids),
+            )
+
+            task.build_path(parent_task)
+
+            tasks.append(task)
+
+            results[index] = {"index": index, "id": str(task_id), "status": status.HTTP_201_CREATED}
+
+        try:
+
+            with transaction.atomic():
+
+                Task.objects.bulk_create(tasks, batch_size=settings.TASK_BULK_INIT_BATCH_SIZE)
+
+                # registering every child on its parent's counters with one update
+                Task.record_children_transitions(parent_task.id, [(None, (task.task_status, task.sub_task_status)) for task in tasks])
+
+                WorkflowStats.objects.record(my_user_id, [(task.path[0], None, task.task_status) for task in tasks])
+
+        except IntegrityError as exc:
+
+            # a concurrent init inserted one of the ids after the validation query.
+            if getattr(exc.__cause__, "pgcode", None) == UNIQUE_VIOLATION:
+
+                raise ValidationError({"non_field_errors": ["One of the tasks has been registered concurrently, nothing has been registered."]})
+
+            raise ServerError(exc)
+
+        data = {"created": len(tasks), "results": [results[index] for index in sorted(results)]}
+
+        return Response(data=data, status=status.HTTP_201_CREATED if len(tasks) == len(items) else status.HTTP_207_MULTI_STATUS)
+
+
+
+task_completed = read_doc('./task_services/views/docs/task/task_completed.md')
 
 @extend_schema_view(
     put=extend_schema(
@@ -123,6 +484,8 @@ with open('./task_services/views/docs/task/task_completed.md') as f:
 class TaskCompletedAPIView(UpdateAPIView):
     serializer_class            = CompleteTaskSerializer
     permission_classes: tuple   = (AllowAny,)
+    renderer_classes: tuple     = (JSONRenderer,)
+    parser_classes: tuple       = (JSONParser,)
     http_method_names           = ['put', 'head', 'option']
 
     def get_queryset(self):
@@ -154,14 +517,218 @@ class TaskCompletedAPIView(UpdateAPIView):
                     # save model
                     return serializer.save()
 
+        except TaskConflict as exc:
+
+            raise ConcurrentUpdate(exc)
+
         except Exception as exc:
             print(exc)
             raise ServerError(exc)
 
 
 
-with open('./task_services/views/docs/task/task_retry.md') as f:
-    task_retry = f.read()
+task_bulk_completed = read_doc('./task_services/views/docs/task/task_bulk_completed.md')
+
+@extend_schema_view(
+    put=extend_schema(
+        tags=['Task'],
+        summary='Register Completion of many Tasks',
+        description=task_bulk_completed,
+        request=BulkCompleteTaskSerializer(many=True),
+        responses=inline_serializer(name='TaskBulkCompleteAPISerializer', fields={
+            'completed': serializers.IntegerField(read_only=True),
+            'results': serializers.ListField(child=serializers.DictField(), read_only=True),
+        }),
+    ),
+)
+class TaskBulkCompleteAPIView(APIView):
+    permission_classes: tuple   = (AllowAny,)
+    parser_classes: tuple       = (JSONParser, NDJSONParser)
+
+    def put(self, request, *args, **kwargs):
+
+        items = request.data
+
+        if not isinstance(items, list):
+
+            raise ValidationError({"non_field_errors": ["Expected a list of tasks."]})
+
+        if len(items) > settings.TASK_BULK_COMPLETE_MAX_ITEMS:
+
+            raise ValidationError({"non_field_errors": [f"At most {settings.TASK_BULK_COMPLETE_MAX_ITEMS} tasks can be completed at once."]})
+
+        try:
+
+            my_user_id = UUID(self.kwargs.get("my_user"))
+
+        except ValueError:
+
+            raise ValidationError({"my_user": [PrimaryKeyRelatedField.default_error_messages["does_not_exist"].format(pk_value=self.kwargs.get("my_user"))]})
+
+        results: Dict[int, Dict[str, Any]] = {}
+        valid: Dict[int, OrderedDict] = {}
+        seen = set()
+
+        # one serializer validates every item, its fields are only built once.
+        serializer = BulkCompleteTaskSerializer()
+
+        for index, item in enumerate(items):
+
+            try:
+
+                data = serializer.run_validation(item)
+
+            except ValidationError as exc:
+
+                results[index] = {"index": index, "id": item.get("id") if isinstance(item, dict) else None, "status": status.HTTP_400_BAD_REQUEST, "errors": exc.detail}
+
+                continue
+
+            task_id = UUID(data["id"])
+
+            if task_id in seen:
+
+                results[index] = {"index": index, "id": str(task_id), "status": status.HTTP_400_BAD_REQUEST, "errors": {"id": [f"Task with id: {task_id} is repeated in the request."]}}
+
+                continue
+
+            seen.add(task_id)
+
+            valid[index] = data
+
+        try:
+
+            with transaction.atomic():
+
+                # locking the rows in id order, concurrent batches cannot deadlock on each other.
+                tasks = {
+                    task.id: task for task in
+                    Task.objects.select_for_update().filter(my_user=my_user_id, id__in=seen).only("id", "parent_task_id", "my_user_id", "task_status", "sub_task_status", "response", "immediate_next", "sub_task_next").annotate(root_node_id=F("path__0")).order_by("id")
+                }
+
+                completed: Dict[int, Task]  = {}
+                no_immediate_next           = set()
+                transitions                 = {}
+                status_transitions          = []
+                now                         = timezone.now()
+
+                for index, data in valid.items():
+
+                    task = tasks.get(UUID(data["id"]))
+
+                    if task is None:
+
+                        results[index] = {"index": index, "id": data["id"], "status": status.HTTP_404_NOT_FOUND, "errors": {"id": [f"Task with id: {data['id']} does not exists."]}}
+
+                        continue
+
+                    before = (task.task_status, task.sub_task_status)
+
+                    if apply_completion(task, data):
+
+                        no_immediate_next.add(task.id)
+
+                    task.updated_at = now
+
+                    transitions.setdefault(task.parent_task_id, []).append((before, (task.task_status, task.sub_task_status)))
+
+                    status_transitions.append((task.root_node_id, before[0], task.task_status))
+
+                    completed[index] = task
+
+                # one UPDATE ... FROM unnest(...) per chunk, writing only the columns of a completion
+                Task.objects.bulk_set(list(completed.values()), ["task_status", "sub_task_status", "response", "immediate_next", "sub_task_next", "updated_at"], batch_size=settings.TASK_BULK_COMPLETE_BATCH_SIZE)
+
+                # one counters update per distinct parent, in id order like the rows of the tasks
+                for parent_task_id in sorted(parent_task_id for parent_task_id in transitions if parent_task_id is not None):
+
+                    Task.record_children_transitions(parent_task_id, transitions[parent_task_id])
+
+                WorkflowStats.objects.record(my_user_id, status_transitions)
+
+                # the immediate_next of every completed task are sent together
+                calls   = []
+                offsets = {}
+
+                for index, task in completed.items():
+
+                    if task.id not in no_immediate_next and task.task_status == StatusChoices.COMPLETED:
+
+                        offsets[index]  = len(calls)
+                        calls          += immediate_next_calls(task)
+
+                for index, task in completed.items():
+
+                    results[index] = {
+                        "index": index,
+                        "id": str(task.id),
+                        "status": status.HTTP_200_OK,
+                        "task_status": task.task_status,
+                        "sub_task_status": task.sub_task_status,
+                        "dispatch_errors": [],
+                    }
+
+                # one check per distinct parent, and one per completed root
+                checks = dict.fromkeys(task.parent_task_id if task.parent_task_id is not None else task.id for task in completed.values() if task.id in no_immediate_next)
+
+                def schedule_checks():
+
+                    for task_id in checks:
+
+                        schedule_check(my_user_id, task_id)
+
+                # Cloud Tasks is only called once the completions are committed and their row locks released,
+                # outbox rows are written in this transaction.
+                dispatch_on_commit(lambda: self.send_immediate_next(completed, calls, offsets, results))
+                dispatch_on_commit(schedule_checks)
+
+        except (FieldDoesNotExist, FieldError, TransactionManagementError, IntegrityError) as exc:
+
+            raise ServerError(exc)
+
+        data = {"completed": len(completed), "results": [results[index] for index in sorted(results)]}
+
+        return Response(data=data, status=status.HTTP_200_OK if len(completed) == len(items) else status.HTTP_207_MULTI_STATUS)
+
+    def send_immediate_next(self, completed: Dict[int, Task], calls: List[Dict[str, Any]], offsets: Dict[int, int], results: Dict[int, Dict[str, Any]]):
+        """
+        Sends the immediate_next `calls` of the `completed` tasks, `offsets` is the index of the
+        first call of each task, and removes the enqueued entries from their rows. The entries
+        which could not be enqueued stay and are listed in the `dispatch_errors` of their result.
+        """
+
+        dispatched  = dispatch_many(calls)
+        delivered   = {}
+
+        for index, offset in offsets.items():
+
+            task = completed[index]
+
+            task_calls      = calls[offset:offset + len(task.immediate_next)]
+            task_results    = [result._replace(index=result.index - offset) for result in dispatched[offset:offset + len(task.immediate_next)]]
+
+            results[index]["dispatch_errors"] = dispatch_errors(task_calls, task_results)
+
+            delivered[task.id] = [next_data for next_data, result in zip(task.immediate_next, task_results) if result.ok]
+
+        if not any(delivered.values()):
+
+            return
+
+        with transaction.atomic():
+
+            # the rows as they are now, locked in id order like the completion.
+            tasks = list(Task.objects.select_for_update().filter(id__in=delivered).only("id", "immediate_next").order_by("id"))
+
+            for task in tasks:
+
+                task.immediate_next = without_delivered(task.immediate_next, delivered[task.id])
+
+            Task.objects.bulk_set(tasks, ["immediate_next"], batch_size=settings.TASK_BULK_COMPLETE_BATCH_SIZE)
+
+
+
+task_retry = read_doc('./task_services/views/docs/task/task_retry.md')
 
 @extend_schema_view(
     delete=extend_schema(
@@ -207,10 +774,23 @@ class TaskRetryAPIView(DestroyAPIView):
         if error_tasks.exists():
             
             task = error_tasks.first()
+
+            # the request is checked before anything is deleted, a task which cannot be re-sent stays as it is.
+            if not isinstance(task.request, dict) or any(key not in task.request for key in ("url", "payload", "headers", "method")):
+
+                raise ValidationError({"request": [f"Task {task.id} has no request to re-send, it cannot be retried."]})
             
             try:
         
-                task.delete()
+                with transaction.atomic():
+
+                    # the deleted child is registered again when its request is re-sent.
+                    Task.record_child_transition(task.parent_task_id, (task.task_status, task.sub_task_status), None)
+
+                    # the task and its descendants are deleted, the counts of a retried root go away with it.
+                    WorkflowStats.objects.record(task.my_user_id, [(task.path[0], task_status, None) for task_status in task.subtree().values_list("task_status", flat=True)], workflows=-1 if task.parent_task_id is None else 0)
+
+                    task.delete()
 
             except ProtectedError as exc:
                 
@@ -228,8 +808,7 @@ class TaskRetryAPIView(DestroyAPIView):
 
 
 
-with open('./task_services/views/docs/task/task_delete.md') as f:
-    task_delete = f.read()
+task_delete = read_doc('./task_services/views/docs/task/task_delete.md')
 
 @extend_schema_view(
     delete=extend_schema(
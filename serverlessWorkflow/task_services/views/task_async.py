@@ -0,0 +1,191 @@
+from rest_framework import status
+from rest_framework.response import Response
+
+from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
+from django.db import transaction
+
+from asgiref.sync import sync_to_async
+from drf_spectacular.utils import extend_schema, extend_schema_view, inline_serializer
+from rest_framework import serializers
+from serverlessWorkflow.task import adispatch_many, get_dispatcher
+from task_services.checks import acheck_task, aschedule_check, COMPLETED
+from task_services.exceptions import ServerError, ObjectNotFound, ConcurrentUpdate
+from task_services.models import Task, TaskConflict
+from task_services.serializers.task import CompleteTaskSerializer, immediate_next_calls
+from task_services.views.check import TaskCheckAPIView, task_check
+from task_services.views.task import TaskCompletedAPIView, task_completed
+
+from typing import Optional
+import asyncio
+import functools
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAPIViewMixin:
+    """
+    Serves the handlers of an APIView as coroutines under ASGI, Django awaits the view once every
+    handler is async. `initial`, which may read the database for authentication, permissions and
+    throttling, runs in a worker thread; exceptions are handled by `handle_exception` and the
+    response by `finalize_response`, like `APIView.dispatch`.
+
+    With the outbox dispatcher the handlers fall back to their synchronous version, the outbox
+    rows must be written in the transaction of the task update.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+
+        view = super().as_view(**initkwargs)
+
+        # Django 4.0 only awaits a view which is a coroutine function, View.as_view returns a plain one.
+        async def async_view(request, *args, **kwargs):
+
+            return await view(request, *args, **kwargs)
+
+        return functools.update_wrapper(async_view, view)
+
+    async def dispatch(self, request, *args, **kwargs):
+
+        self.args       = args
+        self.kwargs     = kwargs
+        self.request    = self.initialize_request(request, *args, **kwargs)
+        self.headers    = self.default_response_headers
+
+        try:
+
+            await sync_to_async(self.initial)(self.request, *args, **kwargs)
+
+            method  = self.request.method.lower()
+            handler = getattr(self, method, self.http_method_not_allowed) if method in self.http_method_names else self.http_method_not_allowed
+
+            # OPTIONS and the rejected methods are answered by the synchronous handlers of DRF.
+            response = handler(self.request, *args, **kwargs)
+
+            if asyncio.iscoroutine(response):
+
+                response = await response
+
+        except Exception as exc:
+
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(self.request, response, *args, **kwargs)
+
+        return self.response
+
+
+@extend_schema_view(
+    put=extend_schema(
+        tags=['Task'],
+        summary='Register Completion of Task from Node',
+        description=task_completed,
+    ),
+)
+class AsyncTaskCompletedAPIView(AsyncAPIViewMixin, TaskCompletedAPIView):
+
+    async def aget_object(self) -> Task:
+
+        try:
+
+            # the async ORM of Django 4.0 has no query methods yet, the read runs in a worker thread.
+            return await sync_to_async(self.get_queryset().get)(id=self.kwargs.get("id"))
+
+        except ObjectDoesNotExist as exc:
+
+            raise ObjectNotFound(exc)
+
+        except MultipleObjectsReturned as exc:
+
+            raise ServerError(exc)
+
+    def record_completion(self, serializer: CompleteTaskSerializer) -> bool:
+
+        with transaction.atomic():
+
+            return serializer.record_completion(serializer.instance, serializer.validated_data)
+
+    async def put(self, request, *args, **kwargs):
+
+        if get_dispatcher().transactional:
+
+            return await sync_to_async(super().put)(request, *args, **kwargs)
+
+        instance    = await self.aget_object()
+        serializer  = self.get_serializer(instance, data=request.data)
+
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+
+        try:
+
+            no_immediate_next = await sync_to_async(self.record_completion)(serializer)
+
+            if no_immediate_next:
+
+                # 8001
+                await aschedule_check(instance.my_user_id, instance.parent_task_id if instance.parent_task_id is not None else instance.id)
+
+            elif serializer.sends_immediate_next(instance):
+
+                calls = immediate_next_calls(instance)
+
+                # sending requests concurrently, no thread waits on Cloud Tasks
+                results = await adispatch_many(calls)
+
+                await sync_to_async(serializer.keep_undelivered_immediate_next)(instance, calls, results)
+
+        except TaskConflict as exc:
+
+            raise ConcurrentUpdate(exc)
+
+        except Exception as exc:
+
+            logger.exception("Completion of task %s failed.", instance.id)
+
+            raise ServerError(exc)
+
+        return Response(await sync_to_async(lambda: serializer.data)())
+
+
+@extend_schema_view(
+    put=extend_schema(
+        tags=['Task'],
+        summary='Trigger Status Check on a Task',
+        description=task_check,
+        request=None,
+        responses=inline_serializer(name='TaskCheckAPISerializer', fields={
+           'detail': serializers.CharField(read_only=True),
+           'dispatch_errors': serializers.ListField(child=serializers.DictField(), required=False, read_only=True),
+        }),
+    ),
+)
+class AsyncTaskCheckAPIView(AsyncAPIViewMixin, TaskCheckAPIView):
+
+    async def put(self, request, *args, **kwargs):
+
+        if get_dispatcher().transactional:
+
+            return await sync_to_async(super().put)(request, *args, **kwargs)
+
+        obj: Optional[Task] = await sync_to_async(Task.objects.filter(id=kwargs.get("id")).first)()
+
+        if obj is None:
+
+            return Response(data={"detail": "This task's sub-tasks are still pending."}, status=status.HTTP_200_OK)
+
+        try:
+
+            result = await acheck_task(obj)
+
+        except TaskConflict as exc:
+
+            # non 2xx status makes Cloud Tasks retry the check.
+            raise ConcurrentUpdate(exc)
+
+        if result.state == COMPLETED and not result.dispatch_errors and obj.parent_task_id is not None:
+
+            await aschedule_check(obj.my_user_id, obj.parent_task_id)
+
+        return self.result_response(obj, result)
@@ -9,13 +9,12 @@ from drf_spectacular.utils import extend_schema, extend_schema_view
 from task_services.exceptions import ServerError
 from task_services.models import User
 from task_services.serializers.user import UserSerializer, UserListSerializer, UserUpdateSerializer
+from task_services.views import read_doc
 
 
-with open('./task_services/views/docs/user/user_list.md') as f:
-    user_list = f.read()
+user_list = read_doc('./task_services/views/docs/user/user_list.md')
 
-with open('./task_services/views/docs/user/user_create.md') as f:
-    user_create = f.read()
+user_create = read_doc('./task_services/views/docs/user/user_create.md')
 
 @extend_schema_view(
     post=extend_schema(
@@ -64,14 +63,11 @@ class UserListCreateAPIView(ListCreateAPIView):
 
 
 
-with open('./task_services/views/docs/user/user_retrieve.md') as f:
-    user_retrieve = f.read()
+user_retrieve = read_doc('./task_services/views/docs/user/user_retrieve.md')
 
-with open('./task_services/views/docs/user/user_update.md') as f:
-    user_update = f.read()
+user_update = read_doc('./task_services/views/docs/user/user_update.md')
 
-with open('./task_services/views/docs/user/user_delete.md') as f:
-    user_delete = f.read()
+user_delete = read_doc('./task_services/views/docs/user/user_delete.md')
 
 @extend_schema_view(
     get=extend_schema(